@@ -23,15 +23,31 @@
 
 """The main module for TKEditor."""
 
-import json
 import sys
 
-import app
-from constants import *
-
-appinfo = json.load(open(JSON_APPINFO))
-print("%s %s" % (appinfo["program_name"], appinfo["version"]))
+import startup
 
 if __name__ == "__main__":
-    app = app.App()
-    app.run(sys.argv)
\ No newline at end of file
+
+    # Time the startup if we were asked to
+    profiler = startup.StartupProfiler(enabled="--profile-startup" in sys.argv)
+    argv = [a for a in sys.argv if a != "--profile-startup"]
+
+    # Hand our files to the running instance, if there is one, instead of
+    # starting a new one
+    single_instance = "--new-instance" not in argv
+    argv = [a for a in argv if a != "--new-instance"]
+    if single_instance:
+        import instance
+        if instance.send_to_running(argv):
+            sys.exit(0)
+
+    with profiler.phase("config"):
+        import config
+        appinfo = config.get().appinfo
+    print("%s %s" % (appinfo["program_name"], appinfo["version"]))
+
+    with profiler.phase("imports"):
+        import app
+    app = app.App(profiler=profiler)
+    app.run(argv, single_instance=single_instance)
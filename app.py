@@ -20,36 +20,125 @@
 
 import time
 import tkinter
+import tkinter.messagebox
 from tkinter.constants import *
 
+import autosave
+import fileio
+import instance
+import settings
+import startup
+import watcher
 import widgets
-import widgets.dialogs
-import widgets.filedialogs
 from constants import *
 
 class App:
     """An application manager for TKEditor."""
 
-    def __init__(self):
+    def __init__(self, profiler=None):
         
+        # The startup profiler
+        if profiler is None:
+            profiler = startup.StartupProfiler()
+        self.profiler = profiler
+
         # The list of windows
         self.windows = []
 
+        # The journal keeper for unsaved pages
+        self.autosave = autosave.Autosave()
+
+        # The server receiving the files of new invocations
+        self.server = None
+
+        # The symbol index of each project, created when a Python file in it
+        # is opened
+        self.symbol_indexes = {}
+
+        # The watcher noticing when open files change on disk, and when the
+        # highlighting theme or the settings are edited
+        self.watcher = watcher.FileWatcher(
+            interval=settings.get()["performance"]["watch_interval"]
+        )
+        self.watcher.add(JSON_COLORS)
+        self.watcher.add(JSON_SETTINGS)
+        settings.subscribe(self)
+
     def do_window_close(self, window):
         """Close WINDOW."""
         self.windows.pop(self.windows.index(window))
         window.destroy()
     
-    def run(self, argv):
-        """Run the app."""
+    def get_symbol_index(self, file):
+        """Return the symbol index of the project containing FILE, starting
+        to build it if needed, or None if FILE isn't in a project."""
+        import symbols
+        root = symbols.find_project_root(file)
+        if root is None:
+            return None
+        if root not in self.symbol_indexes:
+            self.symbol_indexes[root] = symbols.SymbolIndex(root)
+        return self.symbol_indexes[root]
+
+    def on_file_changed(self, path):
+        """Let all the windows handle the change of the file at PATH."""
+        if path == os.path.abspath(JSON_COLORS):
+            import widgets.themes
+            widgets.themes.reload()
+            return
+        if path == os.path.abspath(JSON_SETTINGS):
+            settings.reload()
+            return
+        for window in self.windows:
+            window.on_file_changed(path)
+
+    def open_argv(self, argv):
+        """Open the files in ARGV, sent by a new invocation, in a new tab of the
+        last window. If there are no files, open a new window instead."""
+        files = [a for a in argv[1:] if os.path.exists(a)]
+        if files == [] or self.windows == []:
+            self.windows.append(AppWindow(application=self, className="TKEditor"))
+        window = self.windows[len(self.windows) - 1]
+        for file in files:
+            window.load_file(file)
+
+        # Bring the window to the front
+        window.deiconify()
+        window.lift()
+        window.focus_force()
+
+    def set_settings(self, settings, changed):
+        """Use the CHANGED settings from SETTINGS."""
+        if "performance.watch_interval" in changed:
+            self.watcher.interval = settings["performance"]["watch_interval"]
+
+    def run(self, argv, single_instance=False):
+        """Run the app. If SINGLE_INSTANCE is True, new invocations open their
+        files in this app instead of starting their own."""
+
+        # Listen for new invocations
+        if single_instance:
+            self.server = instance.InstanceServer()
+            if not self.server.start():
+                self.server = None
 
         # Create a new window
-        self.windows.append(AppWindow(application=self, className="TKEditor"))
+        with self.profiler.phase("window"):
+            self.windows.append(AppWindow(application=self, className="TKEditor"))
 
         # Open all the files in the window
-        for a in argv[1:]:
-            if os.path.exists(a):
-                self.windows[len(self.windows) - 1].load_file(a)
+        with self.profiler.phase("files"):
+            for a in argv[1:]:
+                if os.path.exists(a):
+                    self.windows[len(self.windows) - 1].load_file(a)
+
+        # Draw the window for the first time
+        with self.profiler.phase("first draw"):
+            self.windows[len(self.windows) - 1].update()
+        self.profiler.report()
+
+        # Offer to recover the pages left behind by a crash
+        self.windows[len(self.windows) - 1].recover_journals()
 
         # Run the main loop
         self.main()
@@ -68,6 +157,30 @@ class App:
                 window.update()
                 
                 time.sleep(0.01)
+
+            # Open the files sent by new invocations
+            if self.server is not None:
+                for argv in self.server.poll():
+                    self.open_argv(argv)
+
+            # Write the journals of recently edited pages
+            self.autosave.poll()
+
+            # Handle the open files changed by other programs
+            for path in self.watcher.poll():
+                self.on_file_changed(path)
+
+            # Take in the updates of the symbol indexes
+            for index in self.symbol_indexes.values():
+                index.poll()
+
+        # Write any pending journal changes and stop listening before exiting
+        if self.server is not None:
+            self.server.close()
+        self.watcher.close()
+        for index in self.symbol_indexes.values():
+            index.cancel()
+        self.autosave.close()
         exit()
 
 class AppWindow(tkinter.Tk):
@@ -79,6 +192,15 @@ class AppWindow(tkinter.Tk):
         # The App instance running this window
         self.app = application
 
+        # The find in files dialog, if it's open
+        self.find_in_files_dialog = None
+
+        # The outline panel, created the first time it's shown
+        self.outline = None
+
+        # The Performance window, if it's open
+        self.performance_window = None
+
         # Set the window's main attributes
         self.wm_title("TKEditor")
 
@@ -103,7 +225,20 @@ class AppWindow(tkinter.Tk):
             ("_Edit",
                 (
                     ("_Undo", "<<undo-action>>", "Ctrl+Z", "<Control-z>"),
-                    ("_Redo", "<<redo-action>>", "Control+Shift+Z", "<Control-Z>")
+                    ("_Redo", "<<redo-action>>", "Control+Shift+Z", "<Control-Z>"),
+                    None,
+                    ("_Find", "<<find>>", "Ctrl+F", "<Control-f>"),
+                    ("Find and R_eplace", "<<replace>>", "Ctrl+H", "<Control-h>"),
+                    ("Find in Fi_les", "<<find-in-files>>", "Ctrl+Shift+F", "<Control-F>")
+                )
+            ),
+            ("_View",
+                (
+                    ("_Outline", "<<outline>>", "Ctrl+Shift+O", "<Control-O>"),
+                    ("Go to _Definition", "<<goto-definition>>", "F12", "<F12>"),
+                    None,
+                    ("_Performance", "<<performance>>", "", ""),
+                    ("Start or Stop Pro_filing", "<<profile>>", "Ctrl+Alt+P", "<Control-Alt-p>")
                 )
             ),
             ("_Help",
@@ -135,10 +270,11 @@ class AppWindow(tkinter.Tk):
 
         # Compare the page's file with the text and return True if they match
         if os.path.exists(page.file):
-            with open(page.file) as f:
-                fcontents = f.read()
-                f.close()
-            if fcontents.strip() != page.text.get_all().strip():
+            try:
+                fcontents, file_format = fileio.read_file(page.file)
+            except (OSError, fileio.BinaryFileError):
+                return False
+            if fcontents != page.text.get(1.0, "end-1c"):
                 return False
             else:
                 return True
@@ -155,6 +291,8 @@ class AppWindow(tkinter.Tk):
         """Close the window."""
         for tab in self.get_current_notebook().tabs:
             self.close_tab(tab=tab, actually_close=False)
+            self.app.autosave.unregister(tab.child)
+            self.app.watcher.remove(tab.child.file)
         self.app.do_window_close(self)
 
     def close_current_tab(self, event=None):
@@ -192,6 +330,8 @@ class AppWindow(tkinter.Tk):
                     self.file_save_as()
 
         if actually_close:
+            self.app.autosave.unregister(tab.child)
+            self.app.watcher.remove(tab.child.file)
             return True
         else:
             return False
@@ -269,13 +409,23 @@ class AppWindow(tkinter.Tk):
         self.bind("<<tab-close>>", self.close_current_tab)
         self.bind("<<quit>>", self.close)
         self.bind("<<about>>", self.show_about)
+        self.bind("<<find>>", self.show_find)
+        self.bind("<<replace>>", self.show_replace)
+        self.bind("<<find-in-files>>", self.show_find_in_files)
+        self.bind("<<outline>>", self.toggle_outline)
+        self.bind("<<goto-definition>>", self.goto_definition)
+        self.bind("<<performance>>", self.show_performance)
+        self.bind("<<profile>>", self.toggle_profiling)
 
     def file_new(self, event=None):
         """Create a new file."""
-        self.get_current_notebook().add_page(widgets.Page(self.get_current_notebook().frame))
+        page = widgets.Page(self.get_current_notebook().frame)
+        self.app.autosave.register(page)
+        self.get_current_notebook().add_page(page)
 
     def file_open(self, event=None):
         """Open an existing file."""
+        import widgets.filedialogs
         response, file = widgets.filedialogs.Open(self).show()
         if response:
             self.load_file(file)
@@ -295,6 +445,7 @@ class AppWindow(tkinter.Tk):
 
     def file_save_as(self, event=None):
         """Save the current file under a different name."""
+        import widgets.filedialogs
         response, file = widgets.filedialogs.SaveAs(self).show()
         if response:
             tab = self.get_current_notebook().get_current_tab()
@@ -303,49 +454,298 @@ class AppWindow(tkinter.Tk):
     def get_current_notebook(self):
         return self.notebooks[0]
 
-    def load_file(self, file):
-        """Insert the contents of FILE into the text widget."""
+    def goto_definition(self, event=None):
+        """Go to the definition of the name under the cursor, looking in the
+        current file first and then in the rest of it's project. If there are
+        several, let the user choose one from a menu."""
+        import symbols
+        if self.get_current_notebook().get_current_tab() is None:
+            return
+        page = self.get_current_notebook().get_current_page()
+        name = page.text.get("insert wordstart", "insert wordend").strip()
+        if not name.isidentifier():
+            return
+
+        # The current file's definitions come from it's text as it is now
+        definitions = []
+        try:
+            for symbol in symbols.extract_symbols(page.text.get(1.0, "end-1c")):
+                if symbol[0] == name:
+                    definitions.append((page.file, symbol[2]))
+        except (SyntaxError, ValueError):
+            pass
+        index = None
+        if os.path.exists(page.file):
+            index = self.app.get_symbol_index(page.file)
+        if index is not None:
+            current = os.path.abspath(page.file)
+            for path, line, kind, container in index.find(name):
+                if path != current:
+                    definitions.append((path, line))
+
+        if definitions == []:
+            page.show_banner('No definition of "%s" was found.' % name)
+        elif len(definitions) == 1:
+            self.open_file_at(*definitions[0])
+        else:
+            menu = tkinter.Menu(self, tearoff=False)
+            for path, line in definitions:
+                menu.add_command(
+                    label="%s:%s" % (os.path.basename(path), line),
+                    command=lambda path=path, line=line: self.open_file_at(path, line)
+                )
+            x, y, width, height = page.text.bbox(INSERT) or (0, 0, 0, 0)
+            menu.tk_popup(
+                page.text.winfo_rootx() + x,
+                page.text.winfo_rooty() + y + height
+            )
 
-        # Load the contents of the file
-        with open(file) as f:
-            fcontents = f.read()
-            f.close()
+    def load_file(self, file):
+        """Insert the contents of FILE into the text widget, and return the new
+        Page instance."""
+
+        # Load the contents of the file, refusing binary files
+        try:
+            fcontents, file_format = fileio.read_file(file)
+        except (OSError, fileio.BinaryFileError) as e:
+            tkinter.messagebox.showerror(
+                "Can't open file",
+                'Can\'t open "%s": %s.' % (os.path.basename(file), e),
+                parent=self
+            )
+            return None
 
         # Create a new Page instance and load the file to it
         page = widgets.Page(self.get_current_notebook().frame)
-        page.load_string(fcontents, file)
+        page.load_string(fcontents, file, file_format)
         page.file = file
+        self.app.autosave.register(page)
+        self.app.watcher.add(file)
+
+        # Start indexing the project of Python files for go to definition
+        if page.text.language == "python":
+            self.app.get_symbol_index(file)
 
         # Add the page to a new tab in the notebook
         self.get_current_notebook().add_page(page)
+        return page
+
+    def open_file_at(self, file, line):
+        """Show FILE at LINE, opening it if it isn't open yet."""
+        notebook = self.get_current_notebook()
+        for tab in notebook.tabs:
+            if os.path.abspath(tab.child.file) == os.path.abspath(file):
+                notebook._select_command(tab)
+                page = tab.child
+                break
+        else:
+            page = self.load_file(file)
+            if page is None:
+                return
+        page.goto_line(line)
+        self.lift()
+
+    def on_file_changed(self, path):
+        """Reload the pages showing the file at PATH, which was changed by
+        another program, if they have no unsaved changes. Otherwise, let the
+        user decide."""
+        for tab in self.get_current_notebook().tabs:
+            page = tab.child
+            if os.path.abspath(page.file) != path:
+                continue
+
+            if not os.path.exists(path):
+                page.show_banner(
+                    '"%s" was deleted or moved by another program.' % page.title
+                )
+            elif page.dirty:
+                page.show_banner(
+                    '"%s" was changed by another program.' % page.title,
+                    (
+                        ("Reload", lambda page=page: self.reload_page(page)),
+                        ("Keep My Changes", lambda: None)
+                    )
+                )
+            elif self.reload_page(page):
+                # Files touched or saved with the same contents aren't worth
+                # telling about
+                page.show_banner(
+                    '"%s" was changed by another program and has been reloaded.' % page.title,
+                    (("Undo Reload", page.undo_reload),)
+                )
+
+    def recover_journals(self):
+        """Ask the user whether to recover the pages left behind by a crash, and
+        open them in new tabs if so."""
+        journals = self.app.autosave.find_recoverable()
+        if journals == []:
+            return
+
+        response = tkinter.messagebox.askyesno(
+            "Recover unsaved files?",
+            "TKEditor did not close properly. Recover %s unsaved file(s)?" % len(journals),
+            parent=self
+        )
+        for journal in journals:
+            if not response:
+                self.app.autosave.remove(journal["journal"])
+                continue
+
+            # Restore the page, keeping it's journal until it is saved or closed
+            page = widgets.Page(self.get_current_notebook().frame)
+            page.load_string(
+                journal["text"],
+                journal["file"],
+                fileio.read_format(journal["file"])
+            )
+            page.file = journal["file"]
+            self.app.autosave.register(page, journal=journal["journal"])
+            if os.path.exists(page.file):
+                self.app.watcher.add(page.file)
+            self.get_current_notebook().add_page(page)
+            page.dirty = True
 
     def reload_file(self, event=None):
         """Reload the contents of the currently open file and redisplay them in
         the text widget."""
+        self.reload_page(self.get_current_notebook().get_current_page())
+
+    def reload_page(self, page):
+        """Reload the contents of PAGE's file, changing only the lines that
+        differ. Return True if the text changed, which can then be undone with
+        page.undo_reload()."""
 
         # Load the contents of the file
-        with open(self.get_current_notebook().get_current_page().file) as f:
-            fcontents = f.read()
-            f.close()
+        try:
+            fcontents, file_format = fileio.read_file(page.file)
+        except (OSError, fileio.BinaryFileError) as e:
+            page.show_banner('Can\'t reload "%s": %s.' % (page.title, e))
+            return False
 
-        # Reinsert the text
-        text = self.get_current_notebook().get_current_page().text
-        text.replace(1.0, END, fcontents)
+        # Apply only the lines that changed
+        changed = page.reload_string(fcontents, file_format)
+        self.app.autosave.clear(page)
+        self.app.watcher.update(page.file)
+        return changed
 
     def save_file(self, tab, file):
         """Save the contents of TAB's Text instance to FILE."""
 
-        # Write the contents of TAB's Page instance to the page's file
-        with open(file, "w") as f:
-            f.write(tab.child.text.get(1.0, END))
-            f.close()
+        # Write the contents of TAB's Page instance to the page's file, in the
+        # format it was loaded in
+        text = tab.child.text.get(1.0, "end-1c")
+        try:
+            fileio.write_file(file, text, tab.child.file_format)
+        except UnicodeEncodeError:
+            tkinter.messagebox.showwarning(
+                "Saving as UTF-8",
+                'The text can\'t be saved as %s, so "%s" will be saved as UTF-8.' % (
+                    tab.child.file_format.encoding.upper(),
+                    os.path.basename(file)
+                ),
+                parent=self
+            )
+            tab.child.set_file_format(tab.child.file_format._replace(encoding="utf-8", bom=b""))
+            fileio.write_file(file, text, tab.child.file_format)
+
+        # Watch the new file instead of the old one, and don't report our own
+        # save as a change
+        if os.path.abspath(tab.child.file) != os.path.abspath(file):
+            self.app.watcher.remove(tab.child.file)
+            self.app.watcher.add(file)
+        else:
+            self.app.watcher.update(file)
 
         # Set the tab's file and label to the new file
         tab.file = file
         tab.child.file = file
         tab.set_text(os.path.basename(file))
+        tab.child.update_language()
+
+        # Update the saved file's symbols for go to definition
+        if tab.child.text.language == "python":
+            index = self.app.get_symbol_index(file)
+            if index is not None:
+                index.reindex(file)
+
+        # The saved file no longer needs it's journal
+        tab.child.dirty = False
+        self.app.autosave.clear(tab.child)
+
+    def show_find(self, event=None):
+        """Show the current page's find bar."""
+        if self.get_current_notebook().get_current_tab() is not None:
+            self.get_current_notebook().get_current_page().show_find_bar()
+
+    def show_replace(self, event=None):
+        """Show the current page's find and replace bar."""
+        if self.get_current_notebook().get_current_tab() is not None:
+            self.get_current_notebook().get_current_page().show_find_bar(replace=True)
+
+    def show_find_in_files(self, event=None):
+        """Show the find in files dialog."""
+        import widgets.dialogs
+
+        if self.find_in_files_dialog is not None and self.find_in_files_dialog.winfo_exists():
+            self.find_in_files_dialog.lift()
+            self.find_in_files_dialog.pattern_entry.focus_set()
+            return
+
+        # Search in the current file's directory by default
+        initialdir = os.getcwd()
+        if self.get_current_notebook().get_current_tab() is not None:
+            file = self.get_current_notebook().get_current_page().file
+            if os.path.exists(file):
+                initialdir = os.path.dirname(os.path.abspath(file))
+
+        self.find_in_files_dialog = widgets.dialogs.FindInFilesDialog(
+            self,
+            initialdir=initialdir,
+            className="TKEditor"
+        )
+        self.find_in_files_dialog.bind_open(self.open_file_at)
+
+    def show_performance(self, event=None):
+        """Show the Performance window, timing the hot paths while it is
+        open."""
+        import widgets.performance
+        if self.performance_window is None or not self.performance_window.winfo_exists():
+            self.performance_window = widgets.performance.PerformanceWindow(self)
+        self.performance_window.lift()
+
+    def toggle_profiling(self, event=None):
+        """Start profiling, or stop and save the profile."""
+        import perf
+        path = perf.toggle_profiling()
+        if path is None:
+            self.wm_title("TKEditor (Profiling)")
+        else:
+            self.wm_title("TKEditor")
+            tkinter.messagebox.showinfo(
+                "Profile saved",
+                'The profile was saved to "%s".' % path,
+                parent=self
+            )
+
+    def toggle_outline(self, event=None):
+        """Show or hide the outline panel."""
+        if self.outline is None:
+            import widgets.outline
+            self.outline = widgets.outline.Outline(self.paned_window)
+            self.outline.bind_get_page(self._get_outline_page)
+
+        if str(self.outline) in [str(pane) for pane in self.paned_window.panes()]:
+            self.paned_window.forget(self.outline)
+        else:
+            self.paned_window.add(self.outline, before=self.notebooks[0], width=220)
+
+    def _get_outline_page(self):
+        if self.get_current_notebook().get_current_tab() is None:
+            return None
+        return self.get_current_notebook().get_current_page()
 
     def show_about(self, event=None):
         """Show the about dialog."""
+        import widgets.dialogs
 
         dialog = widgets.dialogs.AboutDialog(self, className="TKEditor")
\ No newline at end of file
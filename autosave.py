@@ -0,0 +1,197 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Crash-safe autosaving of unsaved pages."""
+
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import tkinter
+import uuid
+
+from constants import *
+
+class Autosave:
+    """Keep a compressed journal of every modified page in AUTOSAVE_DIR, so
+    that unsaved work can be recovered after a crash.
+
+    Journals are only written after the pages have been edited, and all the
+    compressing and writing is done in a background thread so that it never
+    blocks typing."""
+
+    def __init__(self, directory=AUTOSAVE_DIR, delay=AUTOSAVE_DELAY):
+
+        # Where to keep the journals, and how long to wait after the first
+        # edit before writing them
+        self.directory = directory
+        self.delay = delay
+
+        # The registered pages, keyed by their journal names
+        self.pages = {}
+
+        # The pages that have been edited since the last flush, and the time
+        # of the first of those edits
+        self.dirty = set()
+        self.dirty_since = None
+
+        # The writer thread and it's job queue
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _get_journal_path(self, journal):
+        """Return the path of the journal file named JOURNAL."""
+        return "%s%s.json.gz" % (self.directory, journal)
+
+    def _pid_running(self, pid):
+        """Return True if a process with PID is running."""
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _remove_journal(self, path):
+        """Remove the journal file at PATH, if it exists."""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _write_journal(self, path, record):
+        """Compress RECORD and write it to PATH, replacing the old journal only
+        once the new one is completely written."""
+        os.makedirs(self.directory, exist_ok=True)
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(record, f)
+            f.close()
+        os.replace(path + ".tmp", path)
+
+    def _write_loop(self):
+        """Run the writer thread's jobs until we get the None job."""
+        while True:
+            job = self.queue.get()
+            if job is None:
+                break
+
+            path, record = job
+            try:
+                if record is None:
+                    self._remove_journal(path)
+                else:
+                    self._write_journal(path, record)
+            except OSError as e:
+                print("Autosave failed for %s: %s" % (path, e))
+
+    def clear(self, page):
+        """Remove PAGE's journal, for example after it has been saved."""
+        self.dirty.discard(page.journal)
+        self.queue.put((self._get_journal_path(page.journal), None))
+
+    def close(self):
+        """Write all the pending journals and stop the writer thread."""
+        self.flush()
+        self.queue.put(None)
+        self.thread.join()
+
+    def find_recoverable(self):
+        """Return a list of the journals left behind by TKEditor instances that
+        are no longer running."""
+        journals = []
+        if not os.path.isdir(self.directory):
+            return journals
+
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json.gz"):
+                continue
+            path = self.directory + name
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    record = json.load(f)
+                    f.close()
+            except (OSError, ValueError) as e:
+                print("Ignoring unreadable journal %s: %s" % (path, e))
+                continue
+
+            # Skip the journals belonging to other running instances
+            if record["pid"] != os.getpid() and self._pid_running(record["pid"]):
+                continue
+
+            record["journal"] = name[:-len(".json.gz")]
+            journals.append(record)
+        return journals
+
+    def flush(self):
+        """Queue a new journal for every page edited since the last flush."""
+        for journal in self.dirty:
+            page = self.pages.get(journal)
+            if page is None:
+                continue
+            try:
+                contents = page.text.get(1.0, "end-1c")
+            except tkinter.TclError:
+                # The page has already been destroyed
+                continue
+            record = {
+                "file": page.file,
+                "pid": os.getpid(),
+                "time": time.time(),
+                "text": contents
+            }
+            self.queue.put((self._get_journal_path(journal), record))
+
+        self.dirty = set()
+        self.dirty_since = None
+
+    def mark_dirty(self, page):
+        """Remember that PAGE has been edited."""
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic()
+        self.dirty.add(page.journal)
+
+    def poll(self):
+        """Flush the journals if the first unflushed edit is old enough. This is
+        meant to be called regularly from the main loop."""
+        if self.dirty_since is not None:
+            if time.monotonic() - self.dirty_since >= self.delay:
+                self.flush()
+
+    def register(self, page, journal=None):
+        """Start journaling PAGE's edits. JOURNAL is the name of an existing
+        journal to reuse, for pages restored from one."""
+        if journal is None:
+            journal = uuid.uuid4().hex
+        page.journal = journal
+        self.pages[journal] = page
+        page.bind_modified(lambda: self.mark_dirty(page))
+
+    def remove(self, journal):
+        """Remove the journal named JOURNAL."""
+        self.queue.put((self._get_journal_path(journal), None))
+
+    def unregister(self, page):
+        """Stop journaling PAGE and remove it's journal."""
+        if self.pages.pop(page.journal, None) is not None:
+            self.clear(page)
@@ -0,0 +1,30 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Benchmarks of TKEditor's editing, file and dialog code, run on a virtual X
+server.
+
+Run them from the main app directory with:
+
+    python3 -m benchmarks [--quick] [--output results.json] [case ...]
+
+Each case runs in it's own process, so that it's peak memory use can be
+measured, and the results are printed or written as JSON to compare them
+between commits."""
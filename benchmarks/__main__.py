@@ -0,0 +1,179 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Run the benchmarks and report their results as JSON."""
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# The main app directory, which the cases import the app from
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where the fixtures are generated by default
+FIXTURES_DIR = os.path.join(tempfile.gettempdir(), "tkeditor-benchmark-fixtures")
+
+# How long to wait for Xvfb to start, in seconds
+XVFB_TIMEOUT = 10.0
+
+def get_commit():
+    """Return the commit being benchmarked, or None outside of git."""
+    try:
+        return subprocess.run(
+            ("git", "rev-parse", "HEAD"),
+            cwd=ROOT_PATH,
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def start_xvfb():
+    """Start Xvfb on a free display and return it's process and display name.
+    Raise OSError if it isn't installed or doesn't start."""
+    if shutil.which("Xvfb") is None:
+        raise OSError("Xvfb is not installed")
+
+    # Let Xvfb pick the display, and write it's number to a pipe once it's
+    # ready
+    read_fd, write_fd = os.pipe()
+    process = subprocess.Popen(
+        ("Xvfb", "-displayfd", str(write_fd), "-screen", "0", "1920x1080x24", "-nolisten", "tcp"),
+        pass_fds=(write_fd,),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    os.close(write_fd)
+    deadline = time.monotonic() + XVFB_TIMEOUT
+    number = b""
+    with os.fdopen(read_fd, "rb") as pipe:
+        while not number.endswith(b"\n") and time.monotonic() < deadline:
+            data = pipe.read(1)
+            if not data:
+                break
+            number += data
+        pipe.close()
+    if not number.strip():
+        process.kill()
+        raise OSError("Xvfb didn't start")
+    return process, ":%s" % number.strip().decode()
+
+def run_case(name, fixtures_dir):
+    """Run the case NAME in this process and print it's results, with the
+    peak memory use, as a line of JSON."""
+    sys.path.insert(0, ROOT_PATH)
+    from . import cases
+    result = cases.CASES[name](fixtures_dir)
+    result["peak_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps(result))
+
+def run_all(names, fixtures_dir, display):
+    """Run each case in NAMES in a new process on DISPLAY and return the
+    dictionary of their results."""
+    results = {}
+    with tempfile.TemporaryDirectory() as home:
+
+        # Keep the app's config, journals and symbol caches out of the user's
+        # home directory
+        env = dict(os.environ, DISPLAY=display, HOME=home)
+        for name in names:
+            print("Running %s..." % name, file=sys.stderr)
+            process = subprocess.run(
+                (
+                    sys.executable, "-m", "benchmarks",
+                    "--run-case", name,
+                    "--fixtures", fixtures_dir
+                ),
+                cwd=ROOT_PATH,
+                env=env,
+                capture_output=True,
+                text=True
+            )
+            lines = process.stdout.strip().splitlines()
+            if process.returncode != 0 or lines == []:
+                results[name] = {"error": process.stderr.strip().splitlines()[-1:]}
+                continue
+            results[name] = json.loads(lines[-1])
+    return results
+
+def main():
+    from . import cases
+
+    parser = argparse.ArgumentParser(prog="python3 -m benchmarks")
+    parser.add_argument("cases", nargs="*", help="the cases to run, all of them by default")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="where to generate the fixtures")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--quick", action="store_true", help="skip the slowest cases")
+    parser.add_argument("--display", help="use this X display instead of starting Xvfb")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case is not None:
+        run_case(args.run_case, args.fixtures)
+        return
+
+    names = args.cases or list(cases.CASES)
+    unknown = [name for name in names if name not in cases.CASES]
+    if unknown != []:
+        parser.error("unknown cases: %s" % ", ".join(unknown))
+    if args.quick:
+        names = [name for name in names if name not in cases.SLOW_CASES]
+
+    xvfb = None
+    display = args.display
+    if display is None:
+        try:
+            xvfb, display = start_xvfb()
+        except OSError as e:
+            parser.exit(1, "Can't start the virtual X server: %s\n" % e)
+    try:
+        results = run_all(names, args.fixtures, display)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+            xvfb.wait()
+
+    report = json.dumps(
+        {
+            "commit": get_commit(),
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        },
+        indent=4
+    )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+            f.close()
+    else:
+        print(report)
+
+if __name__ == "__main__":
+    main()
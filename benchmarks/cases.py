@@ -0,0 +1,199 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The benchmark cases. Each one is a function taking the fixtures directory
+and returning a dictionary of it's measurements, in milliseconds."""
+
+import os
+import tempfile
+import time
+
+from . import fixtures
+
+# How many keystrokes to time in the typing cases
+KEYSTROKES = 300
+
+# How many times to redraw the line numbers
+REDRAWS = 200
+
+# The keys typed, as keysyms
+TYPED_KEYS = ("a", "b", "c", "space", "d", "e", "f", "Return")
+
+def get_percentiles(samples):
+    """Return the percentiles, mean and maximum of the durations SAMPLES, in
+    seconds, in milliseconds."""
+    samples = sorted(samples)
+    def percentile(p):
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))] * 1000
+    return {
+        "count": len(samples),
+        "mean": sum(samples) / len(samples) * 1000,
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": samples[-1] * 1000,
+    }
+
+def _create_window():
+    """Return a new App and it's AppWindow, drawn for the first time."""
+    import app
+    application = app.App()
+    window = app.AppWindow(application=application, className="TKEditor")
+    application.windows.append(window)
+    window.update()
+    return application, window
+
+def _close_window(application, window):
+    application.watcher.close()
+    application.autosave.close()
+    window.destroy()
+
+def _time(func, *args):
+    """Return how long calling FUNC with ARGS takes, in seconds."""
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+def _type_keys(window, page, line):
+    """Type KEYSTROKES keys at LINE of PAGE and return how long each took,
+    from the key event until the text and line numbers were redrawn."""
+    text = page.text
+    text.focus_force()
+    text.mark_set("insert", "%s.0" % line)
+    text.see("insert")
+    window.update()
+
+    # The text redraws it's accessories a little after each key press, so
+    # note when that has happened
+    redraws = []
+    update_accessories = text.update_accessories
+    def note_redraw(event=None):
+        update_accessories(event)
+        redraws.append(True)
+    text.update_accessories = note_redraw
+
+    samples = []
+    try:
+        for i in range(KEYSTROKES):
+            keysym = TYPED_KEYS[i % len(TYPED_KEYS)]
+            redraws.clear()
+            start = time.perf_counter()
+            text.event_generate("<KeyPress>", keysym=keysym, when="now")
+            text.event_generate("<KeyRelease>", keysym=keysym, when="now")
+
+            # Wait for the redraw, and for Tk to paint it when it's idle
+            while redraws == []:
+                window.update()
+            window.update_idletasks()
+            samples.append(time.perf_counter() - start)
+    finally:
+        del text.update_accessories
+    return samples
+
+def _load_and_save(fixtures_dir, name):
+    """Time loading the fixture NAME until it is drawn, and saving it."""
+    path = fixtures.get(fixtures_dir, name)
+    application, window = _create_window()
+    load = _time(lambda: (window.load_file(path), window.update()))
+
+    tab = window.get_current_notebook().get_current_tab()
+    with tempfile.TemporaryDirectory() as directory:
+        save = _time(window.save_file, tab, os.path.join(directory, name))
+    _close_window(application, window)
+    return {"load": load * 1000, "save": save * 1000}
+
+def _typing(fixtures_dir, name):
+    """Time typing in the middle of the fixture NAME."""
+    path = fixtures.get(fixtures_dir, name)
+    application, window = _create_window()
+    page = window.load_file(path)
+    window.update()
+    last = int(page.text.index("end-1c").split(".")[0])
+    result = {"keystroke": get_percentiles(_type_keys(window, page, last // 2))}
+    _close_window(application, window)
+    return result
+
+def load_save_1mb(fixtures_dir):
+    return _load_and_save(fixtures_dir, "text_1mb")
+
+def load_save_100mb(fixtures_dir):
+    return _load_and_save(fixtures_dir, "text_100mb")
+
+def load_save_python(fixtures_dir):
+    return _load_and_save(fixtures_dir, "python_100k.py")
+
+def typing_1mb(fixtures_dir):
+    return _typing(fixtures_dir, "text_1mb")
+
+def typing_python(fixtures_dir):
+    return _typing(fixtures_dir, "python_100k.py")
+
+def typing_new_page(fixtures_dir):
+    """Time typing in a new, empty page."""
+    import widgets
+    application, window = _create_window()
+    notebook = window.get_current_notebook()
+    page = widgets.Page(notebook.frame)
+    notebook.add_page(page)
+    window.update()
+    result = {"keystroke": get_percentiles(_type_keys(window, page, 1))}
+    _close_window(application, window)
+    return result
+
+def line_numbers_redraw(fixtures_dir):
+    """Time redrawing the line numbers at places all over the Python
+    fixture."""
+    path = fixtures.get(fixtures_dir, "python_100k.py")
+    application, window = _create_window()
+    page = window.load_file(path)
+    window.update()
+
+    last = int(page.text.index("end-1c").split(".")[0])
+    samples = []
+    for i in range(REDRAWS):
+        page.text.yview("%s.0" % (1 + last * i // REDRAWS))
+        page.text.update_idletasks()
+        samples.append(_time(page.line_numbers.redraw))
+    _close_window(application, window)
+    return {"redraw": get_percentiles(samples)}
+
+def file_dialog_50k(fixtures_dir):
+    """Time listing the 50,000 entry directory in the open dialog."""
+    import widgets.filedialogs
+    path = fixtures.get(fixtures_dir, "directory_50k") + "/"
+    application, window = _create_window()
+    dialog = widgets.filedialogs.Open(window, initialdir=path)
+    show = _time(lambda: (dialog._show_directory(path), dialog.update()))
+    dialog.destroy()
+    _close_window(application, window)
+    return {"show_directory": show * 1000}
+
+# The cases in the order they run, and the ones skipped by --quick
+CASES = {
+    "typing_new_page": typing_new_page,
+    "typing_1mb": typing_1mb,
+    "typing_python": typing_python,
+    "line_numbers_redraw": line_numbers_redraw,
+    "load_save_1mb": load_save_1mb,
+    "load_save_python": load_save_python,
+    "load_save_100mb": load_save_100mb,
+    "file_dialog_50k": file_dialog_50k,
+}
+SLOW_CASES = ("load_save_100mb",)
@@ -0,0 +1,115 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The generated files and directories the benchmarks work on. They are
+created once in the fixtures directory and reused by later runs."""
+
+import os
+import random
+
+# The seed of the generated contents, so that every run works on the same ones
+SEED = 1
+
+# The words of the generated prose
+WORDS = (
+    "the", "editor", "window", "buffer", "line", "number", "text", "widget",
+    "file", "save", "load", "quick", "brown", "fox", "jumps", "over", "lazy",
+    "dog", "lorem", "ipsum", "dolor", "sit", "amet", "consectetur",
+)
+
+def _write_prose(path, size):
+    """Write about SIZE bytes of lines of random words to PATH."""
+    rng = random.Random(SEED)
+    written = 0
+    with open(path, "w") as f:
+        while written < size:
+            lines = []
+            for i in range(1000):
+                lines.append(" ".join(rng.choice(WORDS) for j in range(rng.randint(0, 14))))
+            chunk = "\n".join(lines) + "\n"
+            f.write(chunk)
+            written += len(chunk)
+        f.close()
+
+def _write_python(path, lines):
+    """Write a Python module of about LINES lines to PATH."""
+    rng = random.Random(SEED)
+    parts = ['"""A generated module."""\n\nimport os\nimport sys\n']
+    count = 5
+    number = 0
+    while count < lines:
+        name = "Class%s" % number
+        parts.append(
+            "\nclass %s:\n"
+            '    """The generated class number %s."""\n\n'
+            "    def __init__(self, value=%s):\n"
+            "        self.value = value\n"
+            "        self.items = []\n\n" % (name, number, number)
+        )
+        count += 8
+        for i in range(rng.randint(3, 8)):
+            parts.append(
+                "    def method_%s(self, argument, *args, **kwargs):\n"
+                "        # Add up the items\n"
+                "        total = 0\n"
+                "        for item in self.items:\n"
+                "            if item > argument:\n"
+                '                total += item * %s  # "%s"\n'
+                "            else:\n"
+                "                total -= 1.5e3\n"
+                "        return total\n\n" % (i, i, WORDS[i])
+            )
+            count += 10
+        number += 1
+    with open(path, "w") as f:
+        f.write("".join(parts))
+        f.close()
+
+def _make_directory(path, entries):
+    """Fill the directory PATH with ENTRIES empty files and directories."""
+    os.makedirs(path, exist_ok=True)
+    for i in range(entries):
+        if i % 50 == 0:
+            os.makedirs(os.path.join(path, "directory%05d" % i), exist_ok=True)
+        else:
+            open(os.path.join(path, "file%05d.txt" % i), "w").close()
+
+# The name, function and arguments of each fixture
+FIXTURES = {
+    "text_1mb": (_write_prose, 1024 * 1024),
+    "text_100mb": (_write_prose, 100 * 1024 * 1024),
+    "python_100k.py": (_write_python, 100000),
+    "directory_50k": (_make_directory, 50000),
+}
+
+def get(directory, name):
+    """Return the path of the fixture NAME in DIRECTORY, generating it if it
+    doesn't exist yet."""
+    path = os.path.join(directory, name)
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        func, argument = FIXTURES[name]
+
+        # Generate to a temporary name first, so that an interrupted run
+        # doesn't leave half a fixture behind
+        temporary = path + ".partial"
+        func(temporary, argument)
+        os.rename(temporary, path)
+    return path
@@ -0,0 +1,94 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The application's JSON configuration, loaded once and shared."""
+
+import json
+
+from constants import *
+
+class ConfigError(Exception):
+    """Raised when a configuration file is missing required values."""
+
+class Config:
+    """All of TKEditor's JSON configuration files, loaded and validated."""
+
+    # The required keys of each file and their types
+    APPINFO_KEYS = {
+        "authors": list,
+        "program_name": str,
+        "version": str,
+        "copyright": str,
+        "license": str
+    }
+    HIGHLIGHTING_KEYS = {
+        "colors": dict,
+        "keywords": dict
+    }
+
+    def __init__(self):
+        self.appinfo = self._load(JSON_APPINFO, self.APPINFO_KEYS)
+        self.highlighting = self._load_highlighting()
+
+    def _load(self, file, keys):
+        """Load the JSON object in FILE and check that it has all of KEYS."""
+        with open(file) as f:
+            data = json.load(f)
+            f.close()
+
+        for key, keytype in keys.items():
+            if not isinstance(data.get(key), keytype):
+                raise ConfigError(
+                    '%s: "%s" must be a %s' % (file, key, keytype.__name__)
+                )
+        return data
+
+    def _load_highlighting(self):
+        """Load the highlighting configuration and check it's keywords."""
+        highlighting = self._load(JSON_COLORS, self.HIGHLIGHTING_KEYS)
+
+        # The colors of the lexers' token kinds are optional
+        tokens = highlighting.setdefault("tokens", {})
+        if not isinstance(tokens, dict):
+            raise ConfigError('%s: "tokens" must be a dict' % JSON_COLORS)
+
+        # Make sure every keyword and token kind uses a color that actually
+        # exists
+        colors = highlighting["colors"]
+        for name, color in list(highlighting["keywords"].items()) + list(tokens.items()):
+            if color not in colors:
+                raise ConfigError(
+                    '%s: "%s" uses unknown color "%s"' % (JSON_COLORS, name, color)
+                )
+        return highlighting
+
+    def reload_highlighting(self):
+        """Reload the highlighting configuration from it's file."""
+        self.highlighting = self._load_highlighting()
+
+# The shared Config instance
+_config = None
+
+def get():
+    """Return the shared Config instance, loading it the first time."""
+    global _config
+    if _config is None:
+        _config = Config()
+    return _config
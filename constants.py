@@ -27,6 +27,7 @@ ROOT_PATH = os.path.dirname(__file__) + "/"
 # Json files
 JSON_APPINFO = ROOT_PATH + "data/appinfo.json"
 JSON_COLORS = ROOT_PATH + "data/highlighting.json"
+JSON_SETTINGS_DEFAULT = ROOT_PATH + "data/settings-default.json"
 
 # Error messages for handling
 ERROR_CLOSE = """can't invoke "update" command: \
@@ -40,4 +41,27 @@ IMAGE_FILE = ROOT_PATH + "icons/application/16x16file.png"
 
 # Other file paths
 BOOKMARKS = os.environ["HOME"] + "/.config/gtk-3.0/bookmarks"
-USER_DIRS = os.environ["HOME"] + "/.config/user-dirs.dirs"
\ No newline at end of file
+USER_DIRS = os.environ["HOME"] + "/.config/user-dirs.dirs"
+
+# The user's configuration directory
+CONFIG_DIR = os.environ["HOME"] + "/.tkeditor/"
+JSON_SETTINGS = CONFIG_DIR + "settings.json"
+
+# Autosave
+AUTOSAVE_DIR = CONFIG_DIR + "autosave/"
+AUTOSAVE_DELAY = 1.0 # Seconds to wait after an edit before writing journals
+
+# File watching
+WATCH_INTERVAL = 1.0 # Seconds between the modification time checks without inotify
+WATCH_BATCH = 256 # The most files to check each time
+
+# Symbol index
+SYMBOLS_DIR = CONFIG_DIR + "symbols/"
+
+# Performance
+PERF_SAMPLES = 1000 # The durations kept of each timed method, for the percentiles
+PROFILES_DIR = CONFIG_DIR + "profiles/"
+PROFILE_PRINT_COUNT = 30 # The functions printed after profiling
+LATENCY_BUCKETS = (1, 2, 4, 8, 16, 33, 50, 100, 250) # The keystroke latency histogram's buckets, in milliseconds
+SLOW_FRAME_TIME = 33 # Milliseconds from a key press to the repaint after which a frame is logged as slow
+SLOW_FRAME_LOG = 50 # The slow frames kept
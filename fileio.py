@@ -0,0 +1,174 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Reading and writing files, keeping their encoding, byte order mark and
+newlines as they were so that saving an unchanged file gives back the same
+bytes."""
+
+import codecs
+import collections
+
+# How many bytes at the start of a file are used to detect it's format
+SNIFF_SIZE = 8192
+
+# How many bytes to decode at a time
+CHUNK_SIZE = 1024 * 1024
+
+# The byte order marks, longest first since the UTF-32 LE mark starts with the
+# UTF-16 LE one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+
+# The encodings tried in order for files without a BOM. latin-1 decodes
+# anything, so it always comes last.
+ENCODINGS = ("utf-8", "cp1252", "latin-1")
+
+class BinaryFileError(Exception):
+    """Raised when a file doesn't look like text."""
+    pass
+
+class FileFormat(collections.namedtuple("FileFormat", ("encoding", "bom", "newline"))):
+    """How a file's text is stored: it's ENCODING, the BOM bytes it starts
+    with, and the NEWLINE it uses. NEWLINE is "" if the file mixes several
+    kinds of newlines, which are then loaded and saved untouched."""
+
+    __slots__ = ()
+
+    def describe(self):
+        """Return a short description of the format, like "UTF-8 CRLF"."""
+        names = {"\n": "LF", "\r\n": "CRLF", "\r": "CR", "": "Mixed"}
+        name = self.encoding.upper()
+        if self.bom != b"":
+            name += " BOM"
+        return "%s %s" % (name, names[self.newline])
+
+# The format of new files
+DEFAULT_FORMAT = FileFormat("utf-8", b"", "\n")
+
+def _detect_newline(text):
+    """Return the first kind of newline in TEXT, or "\\n" if there is none."""
+    for i, char in enumerate(text):
+        if char == "\n":
+            return "\n"
+        if char == "\r":
+            return "\r\n" if text[i + 1:i + 2] == "\n" else "\r"
+    return "\n"
+
+def detect_format(head):
+    """Return the FileFormat of a file starting with the bytes HEAD, a guess
+    that is checked while the whole file is decoded. Raise BinaryFileError if
+    HEAD doesn't look like text."""
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            break
+    else:
+        bom = b""
+        if b"\0" in head:
+            raise BinaryFileError("The file contains NUL bytes")
+        for encoding in ENCODINGS:
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                decoder.decode(head, final=False)
+                break
+            except UnicodeDecodeError:
+                continue
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    newline = _detect_newline(decoder.decode(head[len(bom):], final=False))
+    return FileFormat(encoding, bom, newline)
+
+def _decode_stream(f, encoding):
+    """Decode the rest of the open binary file F with ENCODING, a chunk at a
+    time, and return the text."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    parts = []
+    while True:
+        data = f.read(CHUNK_SIZE)
+        if not data:
+            break
+        parts.append(decoder.decode(data))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts)
+
+def read_file(path):
+    """Return the text of the file at PATH, with it's newlines turned into
+    "\\n", and it's FileFormat."""
+    with open(path, "rb") as f:
+        head = f.read(SNIFF_SIZE)
+        file_format = detect_format(head)
+
+        # Decode the file, trying the next encoding if the guess turns out to
+        # be wrong further into it
+        if file_format.bom != b"":
+            encodings = [file_format.encoding]
+        else:
+            encodings = ENCODINGS[ENCODINGS.index(file_format.encoding):]
+        for encoding in encodings:
+            f.seek(len(file_format.bom))
+            try:
+                text = _decode_stream(f, encoding)
+                break
+            except UnicodeDecodeError:
+                if encoding == encodings[-1]:
+                    raise BinaryFileError("The file is not valid %s" % encoding)
+        f.close()
+
+    if file_format.bom == b"" and "\0" in text:
+        raise BinaryFileError("The file contains NUL bytes")
+    file_format = file_format._replace(encoding=encoding)
+
+    # Keep files that mix several kinds of newlines exactly as they are
+    crlf = text.count("\r\n")
+    cr = text.count("\r") - crlf
+    lf = text.count("\n") - crlf
+    kinds = (crlf > 0) + (cr > 0) + (lf > 0)
+    if kinds > 1:
+        return text, file_format._replace(newline="")
+    if crlf > 0:
+        return text.replace("\r\n", "\n"), file_format._replace(newline="\r\n")
+    if cr > 0:
+        return text.replace("\r", "\n"), file_format._replace(newline="\r")
+    return text, file_format
+
+def read_format(path):
+    """Return the FileFormat of the file at PATH, from it's first bytes only,
+    or DEFAULT_FORMAT if it can't be read."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(SNIFF_SIZE)
+            f.close()
+        return detect_format(head)
+    except (OSError, BinaryFileError):
+        return DEFAULT_FORMAT
+
+def write_file(path, text, file_format=DEFAULT_FORMAT):
+    """Write TEXT to the file at PATH in FILE_FORMAT. Raise UnicodeEncodeError
+    if TEXT can't be encoded with the format's encoding."""
+    if file_format.newline not in ("\n", ""):
+        text = text.replace("\n", file_format.newline)
+    data = file_format.bom + text.encode(file_format.encoding)
+    with open(path, "wb") as f:
+        f.write(data)
+        f.close()
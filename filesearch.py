@@ -0,0 +1,366 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Searching all the files in a directory tree with a pool of worker processes.
+
+This module doesn't import tkinter, so that the worker processes start
+quickly."""
+
+import concurrent.futures
+import mmap
+import multiprocessing
+import os
+import queue
+import re
+import threading
+
+# Files bigger than this many bytes are mapped into memory instead of read
+MMAP_THRESHOLD = 1024 * 1024
+
+# How many bytes at the start of a file to check for NUL bytes, which mark it
+# as binary
+BINARY_CHECK_SIZE = 8192
+
+# How many files each worker job searches
+CHUNK_SIZE = 64
+
+# The most matches to report for a single file
+MAX_FILE_MATCHES = 1000
+
+# The worker processes, shared by all the searches of the session and by the
+# outline
+_executor = None
+
+def get_executor(workers=None):
+    """Return the shared pool of worker processes, starting it the first
+    time."""
+    global _executor
+    if _executor is None:
+        # Use new processes instead of forking the Tk process
+        _executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+def _translate_ignore_pattern(pattern):
+    """Translate the glob part of a .gitignore PATTERN to a regular expression
+    matching paths relative to the .gitignore's directory."""
+    i = 0
+    regex = ""
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            regex += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            regex += "[^/]"
+            i += 1
+        elif pattern[i] == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                regex += re.escape("[")
+                i += 1
+            else:
+                regex += "[%s]" % pattern[i + 1:end].replace("!", "^", 1)
+                i = end + 1
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+class GitIgnore:
+    """The ignore rules of a single .gitignore file."""
+
+    def __init__(self, directory, lines):
+        self.directory = directory
+
+        # The (regex, negated, directories only) rules, in file order
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n").rstrip()
+            if line == "" or line.startswith("#"):
+                continue
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+
+            # Patterns without a slash match a name at any depth
+            if "/" in line:
+                regex = _translate_ignore_pattern(line.lstrip("/"))
+            else:
+                regex = "(?:.*/)?" + _translate_ignore_pattern(line)
+            self.rules.append((re.compile(regex + "$"), negated, dir_only))
+
+    def match(self, path, is_dir):
+        """Return True if PATH is ignored, False if it is explicitly included,
+        and None if no rule matches it."""
+        relative = os.path.relpath(path, self.directory)
+        result = None
+        for regex, negated, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(relative):
+                result = not negated
+        return result
+
+def walk(root, cancelled=None):
+    """Yield the paths of all the files under ROOT, skipping the ones ignored
+    by .gitignore files and the .git directories. Stop early if the
+    threading.Event CANCELLED is set."""
+
+    # The stack of (directory, the .gitignore rules that apply to it)
+    stack = [(root, [])]
+    while stack:
+        if cancelled is not None and cancelled.is_set():
+            return
+        directory, ignores = stack.pop()
+
+        # Add this directory's own .gitignore
+        try:
+            with open(os.path.join(directory, ".gitignore")) as f:
+                ignores = ignores + [GitIgnore(directory, f)]
+                f.close()
+        except (OSError, UnicodeDecodeError):
+            pass
+
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+
+        directories = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if not is_dir and not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if is_dir and entry.name == ".git":
+                continue
+
+            # The deepest .gitignore with a matching rule decides
+            ignored = False
+            for ignore in reversed(ignores):
+                result = ignore.match(entry.path, is_dir)
+                if result is not None:
+                    ignored = result
+                    break
+            if ignored:
+                continue
+
+            if is_dir:
+                directories.append(entry.path)
+            else:
+                yield entry.path
+
+        # Visit the subdirectories in alphabetical order
+        directories.sort(reverse=True)
+        stack.extend((d, ignores) for d in directories)
+
+# The compiled pattern of each worker process, cached between jobs
+_worker_pattern = None
+
+def _search_data(data, regex, path):
+    """Return the (path, line number, line) of every match of REGEX in DATA,
+    which are both bytes or both strings."""
+    newline = b"\n" if isinstance(regex.pattern, bytes) else "\n"
+    results = []
+    line_number = 1
+    counted_to = 0
+    last_line_start = -1
+    for match in regex.finditer(data):
+        start = match.start()
+        line_number += data[counted_to:start].count(newline)
+        counted_to = start
+
+        # Report each line only once
+        line_start = data.rfind(newline, 0, start) + 1
+        if line_start == last_line_start:
+            continue
+        last_line_start = line_start
+
+        line_end = data.find(newline, start)
+        if line_end == -1:
+            line_end = len(data)
+        line = data[line_start:min(line_end, line_start + 500)]
+        if newline == b"\n":
+            line = bytes(line).decode("utf-8", "replace")
+        results.append((path, line_number, line.strip()))
+        if len(results) >= MAX_FILE_MATCHES:
+            break
+    return results
+
+def search_files(paths, pattern):
+    """Search the files at PATHS for PATTERN, a (source, flags) tuple. This is
+    run in the worker processes. Return a tuple of the number of files searched
+    and the list of results.
+
+    A bytes source is searched for in the raw bytes of the files, mapping the
+    big ones into memory. A string source is searched for in the decoded
+    text, so that case folding and character classes work for all of
+    Unicode."""
+    global _worker_pattern
+    if _worker_pattern is None or _worker_pattern.pattern != pattern[0] or _worker_pattern.flags != pattern[1]:
+        _worker_pattern = re.compile(*pattern)
+    regex = _worker_pattern
+    raw = isinstance(regex.pattern, bytes)
+
+    results = []
+    for path in paths:
+        try:
+            with open(path, "rb") as f:
+
+                # Skip binary files
+                head = f.read(BINARY_CHECK_SIZE)
+                if b"\0" in head:
+                    continue
+
+                size = os.fstat(f.fileno()).st_size
+                if size == 0:
+                    continue
+                if not raw:
+                    f.seek(0)
+                    data = f.read().decode("utf-8", "replace")
+                    results.extend(_search_data(data, regex, path))
+                elif size > MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                        results.extend(_search_data(data, regex, path))
+                else:
+                    f.seek(0)
+                    results.extend(_search_data(f.read(), regex, path))
+                f.close()
+        except (OSError, ValueError):
+            continue
+    return len(paths), results
+
+class FileSearch:
+    """Search all the files under ROOT for the compiled REGEX, from
+    widgets.search.compile_pattern, in the pool of worker processes. The
+    results can be collected with poll().
+
+    If LITERAL is True and REGEX is a case-sensitive plain ASCII string, the
+    files' bytes are searched for it's UTF-8 encoding
+    without decoding them, which gives the same matches. Case-insensitive
+    searches always decode the files, since ASCII letters like "k" and "s"
+    also match non-ASCII ones like "\u212a" and "\u017f"."""
+
+    def __init__(self, root, regex, literal=False, workers=None):
+        self.root = root
+        self.regex = regex
+        if literal and regex.pattern.isascii() and not regex.flags & re.IGNORECASE:
+            self._pattern = (regex.pattern.encode("ascii"), regex.flags & ~re.UNICODE)
+        else:
+            self._pattern = (regex.pattern, regex.flags)
+
+        # The number of files found and searched so far
+        self.files_found = 0
+        self.files_searched = 0
+        self.done = False
+
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._pending = 0
+        self._walk_done = False
+        self._lock = threading.Lock()
+
+        # Our jobs that may not have started, to cancel them
+        self._futures = set()
+        self._executor = get_executor(workers)
+
+        self._thread = threading.Thread(target=self._submit_loop, daemon=True)
+        self._thread.start()
+
+    def _on_job_done(self, future):
+        """Hand a finished job's results to the UI thread."""
+        with self._lock:
+            self._pending -= 1
+            self._futures.discard(future)
+            finished = self._walk_done and self._pending == 0
+        if self._cancelled.is_set():
+            return
+        if not future.cancelled() and future.exception() is None:
+            self._queue.put(future.result())
+        if finished:
+            self._queue.put(None)
+
+    def _submit(self, paths):
+        with self._lock:
+            self._pending += 1
+            future = self._executor.submit(search_files, paths, self._pattern)
+            self._futures.add(future)
+        future.add_done_callback(self._on_job_done)
+
+    def _submit_loop(self):
+        """Walk the directory tree and submit the files in chunks."""
+        chunk = []
+        try:
+            for path in walk(self.root, self._cancelled):
+                self.files_found += 1
+                chunk.append(path)
+                if len(chunk) >= CHUNK_SIZE:
+                    self._submit(chunk)
+                    chunk = []
+            if chunk != [] and not self._cancelled.is_set():
+                self._submit(chunk)
+        except RuntimeError:
+            # The executor was shut down when the interpreter exited
+            pass
+
+        with self._lock:
+            self._walk_done = True
+            finished = self._pending == 0
+        if finished:
+            self._queue.put(None)
+
+    def cancel(self):
+        """Stop searching, dropping all the jobs that haven't started. The
+        worker processes are kept for the next search."""
+        self._cancelled.set()
+        with self._lock:
+            futures = list(self._futures)
+        for future in futures:
+            future.cancel()
+        self.done = True
+
+    def poll(self, limit=500):
+        """Return a list of the new (path, line number, line) results, taking
+        the results of about LIMIT matches at a time."""
+        results = []
+        while len(results) < limit and not self.done:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.done = True
+                break
+            searched, found = item
+            self.files_searched += searched
+            results.extend(found)
+        return results
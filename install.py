@@ -72,12 +72,15 @@ if "linux" in sys.platform.lower():
         print("Installing config directory in %s..." % config_dir, end="")
         if not os.path.exists(config_dir):
             os.mkdir(config_dir)
-        with open("%sdata/settings-default.json" % APPLICATION_DIR) as f:
-            default_settings = f.read()
-            f.close()
-        with open("%ssettings.json" % config_dir, "w") as f:
-            f.write(default_settings)
-            f.close()
+
+        # Keep the user's settings when updating
+        if not os.path.exists("%ssettings.json" % config_dir):
+            with open("%sdata/settings-default.json" % APPLICATION_DIR) as f:
+                default_settings = f.read()
+                f.close()
+            with open("%ssettings.json" % config_dir, "w") as f:
+                f.write(default_settings)
+                f.close()
         print("Done")
         print("Successfully installed TKEditor %s" % current_version)
 
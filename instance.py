@@ -0,0 +1,210 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Single-instance support, so that new invocations of TKEditor can hand their
+files to the instance that is already running instead of starting up."""
+
+import errno
+import json
+import os
+import queue
+import socket
+import stat
+import threading
+
+def get_socket_path():
+    """Return the path of the running instance's socket, in a directory only
+    the user can use."""
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        directory = os.path.join(runtime_dir, "tkeditor")
+    else:
+        directory = "/tmp/tkeditor-%s" % os.getuid()
+    return os.path.join(directory, "instance.sock")
+
+def _is_private(path, kind):
+    """Return True if PATH is a file of KIND, like stat.S_ISDIR, that belongs
+    to the user and that nobody else can use. Symbolic links are never
+    followed."""
+    try:
+        info = os.lstat(path)
+    except OSError:
+        return False
+    return kind(info.st_mode) and info.st_uid == os.getuid() and info.st_mode & 0o077 == 0
+
+def _make_private_directory(path):
+    """Create the directory PATH with only the user allowed in it, if it
+    doesn't exist. Raise OSError if it belongs to someone else or others can
+    use it."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    if not _is_private(path, stat.S_ISDIR):
+        raise OSError("%s is not a private directory of this user" % path)
+
+def send_to_running(argv, path=None):
+    """Send ARGV to the running instance. Return True if it was received, and
+    False if there is no running instance."""
+    if path is None:
+        path = get_socket_path()
+
+    # Make the file paths absolute, since the running instance has it's own
+    # working directory
+    argv = argv[:1] + [os.path.abspath(a) for a in argv[1:]]
+
+    # Never send our files to a socket someone else could have made
+    if not (_is_private(os.path.dirname(path), stat.S_ISDIR) and
+        _is_private(path, stat.S_ISSOCK)):
+        return False
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(2.0)
+            s.connect(path)
+            s.sendall(json.dumps(argv).encode("utf-8"))
+            s.shutdown(socket.SHUT_WR)
+            return s.recv(2) == b"ok"
+    except OSError:
+        return False
+
+class InstanceServer:
+    """Listen on a Unix domain socket for the argv lists of new invocations."""
+
+    def __init__(self, path=None):
+        if path is None:
+            path = get_socket_path()
+        self.path = path
+
+        # The received argv lists, waiting to be handled by the main loop
+        self.queue = queue.Queue()
+
+        self.socket = None
+        self.thread = None
+
+        # The device and inode of the socket file we made, so that we never
+        # remove one made by another instance
+        self.identity = None
+
+    def _accept_loop(self):
+        """Receive argv lists until the socket is closed."""
+        listener = self.socket
+        while True:
+            try:
+                connection, address = listener.accept()
+            except OSError:
+                break
+
+            with connection:
+                try:
+                    connection.settimeout(2.0)
+                    data = b""
+                    while True:
+                        chunk = connection.recv(65536)
+                        if not chunk:
+                            break
+                        data += chunk
+
+                    # Another instance checking that we are running
+                    if data == b"":
+                        continue
+                    self.queue.put(json.loads(data.decode("utf-8")))
+                    connection.sendall(b"ok")
+                except (OSError, ValueError) as e:
+                    print("Ignoring bad request from new instance: %s" % e)
+
+    def close(self):
+        """Stop listening and remove the socket file."""
+        if self.socket is not None:
+            try:
+                self.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.socket.close()
+            self.socket = None
+            try:
+                info = os.lstat(self.path)
+                if (info.st_dev, info.st_ino) == self.identity:
+                    os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            self.identity = None
+
+    def _bind(self):
+        """Bind our socket to our path, with only the user allowed to use
+        it from the start."""
+        umask = os.umask(0o077)
+        try:
+            self.socket.bind(self.path)
+        finally:
+            os.umask(umask)
+        info = os.lstat(self.path)
+        self.identity = (info.st_dev, info.st_ino)
+
+    def _is_stale(self):
+        """Return True if the socket file at our path was left behind by an
+        instance that is no longer running."""
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.settimeout(2.0)
+            try:
+                s.connect(self.path)
+            except (ConnectionRefusedError, FileNotFoundError):
+                return True
+            except OSError:
+                return False
+        return False
+
+    def poll(self):
+        """Return a list of the argv lists received since the last poll."""
+        received = []
+        while True:
+            try:
+                received.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return received
+
+    def start(self):
+        """Start listening. Return False if the socket could not be created."""
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            _make_private_directory(os.path.dirname(self.path))
+            try:
+                self._bind()
+            except OSError as e:
+                if e.errno != errno.EADDRINUSE:
+                    raise
+
+                # Only replace the socket of an instance that crashed, and
+                # leave the one of an instance that is running alone
+                if not (_is_private(self.path, stat.S_ISSOCK) and self._is_stale()):
+                    raise
+                os.remove(self.path)
+                self._bind()
+            self.socket.listen()
+        except OSError as e:
+            print("Could not start the single-instance server: %s" % e)
+            self.socket.close()
+            self.socket = None
+            return False
+
+        self.thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.thread.start()
+        return True
@@ -0,0 +1,227 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Timing of TKEditor's hot paths, for finding out what makes it slow.
+
+Instrumentation is turned on by wrapping the timed methods in their classes,
+and off by putting the original methods back, so it costs nothing at all
+while it is off. While it is on, the latency of every keystroke is traced from
+the key press until the text and it's accessories are repainted."""
+
+import bisect
+import cProfile
+import collections
+import functools
+import importlib
+import os
+import pstats
+import time
+import tkinter
+
+from constants import *
+
+# The (module, class, method) of every timed method
+TIMED_METHODS = (
+    ("widgets", "Text", "_on_key_press"),
+    ("widgets", "Text", "_on_edit"),
+    ("widgets", "Text", "update_accessories"),
+    ("widgets", "TextLineNumbers", "redraw"),
+    ("widgets.syntax_highlighting", "Highlighter", "update"),
+    ("app", "AppWindow", "load_file"),
+    ("app", "AppWindow", "reload_page"),
+    ("app", "AppWindow", "save_file"),
+    ("widgets.filedialogs", "_FileDialog", "_show_directory"),
+)
+
+# The timed methods that start a keystroke's frame, and that redraw after it
+KEY_PRESS_METHOD = "Text._on_key_press"
+REDRAW_METHOD = "Text.update_accessories"
+
+class Timer:
+    """The number of calls of a timed method, and the durations of the latest
+    of them."""
+
+    def __init__(self, size=PERF_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def get_percentile(self, percent):
+        """Return the PERCENT percentile of the latest durations, in
+        seconds."""
+        if not self.samples:
+            return 0.0
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100))]
+
+class LatencyTracer:
+    """The latencies of keystrokes, from the key press until the next idle
+    point after the text's accessories were redrawn, when Tk has painted the
+    changes. Frames slower than SLOW_FRAME_TIME are logged with the timed
+    methods that ran during them."""
+
+    def __init__(self):
+        self.timer = Timer()
+
+        # The number of latencies below each of LATENCY_BUCKETS, and above
+        # all of them
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+        # The (latency, [(method, seconds)]) of the latest slow frames
+        self.slow_frames = collections.deque(maxlen=SLOW_FRAME_LOG)
+
+        # The start times of the keystrokes waiting to be painted, the timed
+        # methods run since the first of them, and whether the end of the
+        # frame is scheduled
+        self._starts = []
+        self._handlers = []
+        self._finishing = False
+
+    def _finish(self):
+        """End the frame of the waiting keystrokes."""
+        self._finishing = False
+        now = time.perf_counter()
+        latency = 0.0
+        for start in self._starts:
+            latency = max(latency, now - start)
+            self.timer.add(now - start)
+            self.histogram[bisect.bisect(LATENCY_BUCKETS, (now - start) * 1000)] += 1
+        if latency * 1000 > SLOW_FRAME_TIME:
+            self.slow_frames.append((latency, self._handlers))
+            print("Slow frame: %.1f ms (%s)" % (
+                latency * 1000,
+                ", ".join("%s %.1f ms" % (name, seconds * 1000) for name, seconds in self._handlers)
+            ))
+        self._starts = []
+        self._handlers = []
+
+    def handler_ran(self, name, start, seconds, widget):
+        """Note that the timed method NAME ran on WIDGET at START for SECONDS,
+        starting a frame if it handled a key press and ending it at the next
+        idle point if it redrew."""
+        if name == KEY_PRESS_METHOD:
+            self._starts.append(start)
+        if self._starts == []:
+            return
+        self._handlers.append((name, seconds))
+        if name == REDRAW_METHOD and not self._finishing:
+            try:
+                widget.after_idle(self._finish)
+                self._finishing = True
+            except tkinter.TclError:
+                # The widget was destroyed
+                self._finish()
+
+    def reset(self):
+        self.__init__()
+
+# The Timer of each timed method, the original methods while they are wrapped,
+# the number of enable() calls not yet matched by disable(), and the running
+# profiler
+_timers = {}
+_originals = {}
+_users = 0
+_profiler = None
+
+# The keystroke latency tracer
+tracer = LatencyTracer()
+
+def _wrap(name, func):
+    """Return FUNC timed under NAME."""
+    timer = _timers.setdefault(name, Timer())
+
+    @functools.wraps(func)
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            timer.add(seconds)
+            tracer.handler_ran(name, start, seconds, args[0])
+    return timed
+
+def disable():
+    """Undo a call of enable(), and stop timing, putting back the original
+    methods, once every call is undone."""
+    global _users
+    if _users == 0:
+        return
+    _users -= 1
+    if _users > 0:
+        return
+    for (cls, method), func in _originals.items():
+        setattr(cls, method, func)
+    _originals.clear()
+
+def enable():
+    """Start timing the methods in TIMED_METHODS, until disable() is called as
+    many times as this."""
+    global _users
+    _users += 1
+    if is_enabled():
+        return
+    for module_name, class_name, method in TIMED_METHODS:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        func = cls.__dict__[method]
+        _originals[(cls, method)] = func
+        setattr(cls, method, _wrap("%s.%s" % (class_name, method), func))
+
+def get_timers():
+    """Return the sorted list of the (name, Timer) of the timed methods."""
+    return sorted(_timers.items())
+
+def is_enabled():
+    return _originals != {}
+
+def reset():
+    """Forget all the timings."""
+    for timer in _timers.values():
+        timer.__init__(timer.samples.maxlen)
+    tracer.reset()
+
+def is_profiling():
+    return _profiler is not None
+
+def toggle_profiling():
+    """Start profiling everything with cProfile, or stop and save the profile
+    to PROFILES_DIR and print it's slowest functions. Return the saved
+    profile's path, or None if profiling was started."""
+    global _profiler
+    if _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        return None
+
+    _profiler.disable()
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    path = PROFILES_DIR + time.strftime("profile-%Y%m%d-%H%M%S.prof")
+    _profiler.dump_stats(path)
+    stats = pstats.Stats(_profiler)
+    _profiler = None
+
+    print("Profile saved to %s" % path)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_PRINT_COUNT)
+    return path
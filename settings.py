@@ -0,0 +1,187 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The user's settings, from settings.json on top of the defaults, shared by
+all the widgets and reloaded when the file changes."""
+
+import json
+import os
+import re
+import weakref
+
+from config import ConfigError
+from constants import *
+
+# The names of the types of settings, for the error messages
+TYPE_NAMES = {bool: "boolean", float: "number", int: "whole number", list: "list", str: "string"}
+
+# The forms of the colors, "#rgb" to "#rrrrggggbbbb" or a color name. Tk
+# checks the names when they are used.
+COLOR_REGEX = re.compile(r"#(?:[0-9a-fA-F]{3}){1,4}|[A-Za-z][A-Za-z0-9 ]*")
+
+# The smallest value of each numeric setting that works, by dotted name.
+# Numbers that aren't here can't be negative.
+MINIMUMS = {
+    "tab_width": 1,
+    "performance.long_line_threshold": 1,
+    "performance.long_line_column_limit": 1,
+    "performance.highlight_chunk_lines": 1,
+    "performance.highlight_budget": 0.001,
+    "performance.highlight_background_budget": 0.001,
+    "performance.fold_budget": 0.001,
+    "performance.statistics_interval": 0.01,
+    "performance.statistics_budget": 0.001,
+    "performance.undo_memory_limit": 65536,
+    "performance.watch_interval": 0.1
+}
+
+def _merge(defaults, values, path=""):
+    """Return VALUES laid over DEFAULTS, checking that VALUES only has keys
+    that DEFAULTS has, with values of the same type. PATH is the dotted name
+    of DEFAULTS, for the error messages."""
+    if not isinstance(values, dict):
+        raise ConfigError('"%s" must be an object' % path.rstrip("."))
+
+    merged = dict(defaults)
+    for key, value in values.items():
+        name = path + key
+        if key not in defaults:
+            raise ConfigError('unknown setting "%s"' % name)
+        default = defaults[key]
+        if isinstance(default, dict):
+            merged[key] = _merge(default, value, name + ".")
+            continue
+
+        # Whole numbers are fine where fractions are expected, but booleans
+        # aren't numbers here
+        if isinstance(default, float) and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        if type(value) is not type(default):
+            raise ConfigError(
+                '"%s" must be a %s' % (name, TYPE_NAMES[type(default)])
+            )
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            minimum = MINIMUMS.get(name, 0)
+            if value < minimum:
+                raise ConfigError('"%s" must be at least %s' % (name, minimum))
+        if path == "colors." and not COLOR_REGEX.fullmatch(value):
+            raise ConfigError('"%s" must be a color name or "#rrggbb"' % name)
+        merged[key] = value
+    return merged
+
+def _get_changes(old, new, path=""):
+    """Return the set of the dotted names of the settings that differ between
+    OLD and NEW."""
+    changed = set()
+    for key, value in new.items():
+        if isinstance(value, dict):
+            changed.update(_get_changes(old.get(key, {}), value, path + key + "."))
+        elif old.get(key) != value:
+            changed.add(path + key)
+    return changed
+
+class Settings:
+    """The defaults in DEFAULTS_FILE with the user's settings in FILE laid
+    over them, once they are loaded. A missing FILE means all the
+    defaults."""
+
+    def __init__(self, file=JSON_SETTINGS, defaults_file=JSON_SETTINGS_DEFAULT):
+        self.file = file
+        with open(defaults_file) as f:
+            self.defaults = json.load(f)
+            f.close()
+        self.values = _merge(self.defaults, {})
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def get(self, name):
+        """Return the setting with the dotted NAME, like
+        "performance.highlight_budget"."""
+        value = self.values
+        for key in name.split("."):
+            value = value[key]
+        return value
+
+    def load(self):
+        """Return the merged and validated settings from the files. Raise
+        ConfigError or OSError if the user's file is broken."""
+        if not os.path.exists(self.file):
+            return _merge(self.defaults, {})
+        with open(self.file) as f:
+            contents = f.read()
+            f.close()
+
+        # An empty file, like the one older versions installed, has no
+        # settings
+        if contents.strip() == "":
+            return _merge(self.defaults, {})
+        try:
+            values = json.loads(contents)
+        except ValueError as e:
+            raise ConfigError("%s: %s" % (self.file, e))
+        try:
+            return _merge(self.defaults, values)
+        except ConfigError as e:
+            raise ConfigError("%s: %s" % (self.file, e))
+
+# The shared Settings, and the objects to tell when they change
+_settings = None
+_subscribers = weakref.WeakSet()
+
+def get():
+    """Return the shared Settings, loading them the first time. Broken user
+    settings are reported and replaced by the defaults."""
+    global _settings
+    if _settings is None:
+        _settings = Settings()
+        try:
+            _settings.values = _settings.load()
+        except (OSError, ConfigError) as e:
+            print("Using the default settings: %s" % e)
+    return _settings
+
+def reload():
+    """Reload the settings from their file and pass the changes to all the
+    subscribers. Return False and keep the old settings if the file is
+    broken."""
+    settings = get()
+    try:
+        values = settings.load()
+    except (OSError, ConfigError) as e:
+        print("Not reloading the settings: %s" % e)
+        return False
+
+    changed = _get_changes(settings.values, values)
+    settings.values = values
+    if changed:
+        for subscriber in list(_subscribers):
+            subscriber.set_settings(settings, changed)
+    return True
+
+def subscribe(subscriber):
+    """Call SUBSCRIBER.set_settings(settings, set of changed dotted names)
+    whenever the settings change. Only a weak reference to SUBSCRIBER is
+    kept."""
+    _subscribers.add(subscriber)
+
+def unsubscribe(subscriber):
+    """Stop telling SUBSCRIBER about the changes of the settings."""
+    _subscribers.discard(subscriber)
@@ -0,0 +1,89 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Timing of TKEditor's startup, for the --profile-startup switch."""
+
+import builtins
+import contextlib
+import sys
+import time
+
+class StartupProfiler:
+    """Time the phases of startup and, if ENABLED, every module import."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+
+        # The (name, seconds) of every finished phase
+        self.phases = []
+
+        # The (name, cumulative seconds, own seconds) of every import, and the
+        # time spent in nested imports for each import in progress
+        self.imports = []
+        self._child_times = []
+
+        self.start_time = time.perf_counter()
+
+        # Replace the import function with our timed one
+        self._import = builtins.__import__
+        if self.enabled:
+            builtins.__import__ = self._timed_import
+
+    def _timed_import(self, name, *args, **kwargs):
+        """Import NAME like __import__, timing it if it hasn't been imported."""
+        if name in sys.modules:
+            return self._import(name, *args, **kwargs)
+
+        self._child_times.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._import(name, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._child_times.pop()
+            if self._child_times:
+                self._child_times[-1] += elapsed
+            self.imports.append((name, elapsed, elapsed - children))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Time the code run in the with block as the phase NAME."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, count=20):
+        """Print the phase times and the COUNT slowest imports, and stop timing
+        imports."""
+        if not self.enabled:
+            return
+        builtins.__import__ = self._import
+
+        print("Startup phases:")
+        for name, seconds in self.phases:
+            print("  %-24s %8.1f ms" % (name, seconds * 1000))
+        print("  %-24s %8.1f ms" % ("total", (time.perf_counter() - self.start_time) * 1000))
+
+        print("Slowest imports (cumulative, own):")
+        imports = sorted(self.imports, key=lambda i: i[1], reverse=True)
+        for name, cumulative, own in imports[:count]:
+            print("  %-24s %8.1f ms %8.1f ms" % (name, cumulative * 1000, own * 1000))
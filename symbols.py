@@ -0,0 +1,355 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The index of the classes and functions defined in the Python files of a
+project, for the outline and go to definition.
+
+The index is built from the files' syntax trees in a pool of worker processes
+and saved in the user's configuration directory, keyed by each file's
+modification time and hash, so only the files that changed since the last run
+are parsed again. Like filesearch, this module doesn't import tkinter."""
+
+import ast
+import concurrent.futures
+import gzip
+import hashlib
+import json
+import multiprocessing
+import os
+import queue
+import threading
+
+import filesearch
+from constants import *
+
+# The version of the saved index format
+INDEX_VERSION = 1
+
+# How many files each worker job indexes
+CHUNK_SIZE = 64
+
+def extract_symbols(source):
+    """Return the (name, kind, line, column, container) tuple of every class
+    and function defined in the Python SOURCE, in the order they appear.
+    CONTAINER is the dotted name of the enclosing definitions, or "". Raise
+    SyntaxError or ValueError if SOURCE can't be parsed."""
+    symbols = []
+    kinds = {}
+
+    def visit(node, container):
+        for child in ast.iter_child_nodes(node):
+            if isinstance(child, ast.ClassDef):
+                kind = "class"
+            elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                kind = "method" if container != "" and kinds.get(container) == "class" else "function"
+            else:
+                visit(child, container)
+                continue
+            symbols.append((child.name, kind, child.lineno, child.col_offset, container))
+            name = child.name if container == "" else "%s.%s" % (container, child.name)
+            kinds[name] = kind
+            visit(child, name)
+
+    visit(ast.parse(source), "")
+    return symbols
+
+def extract_symbols_later(source):
+    """Return a concurrent.futures.Future of extract_symbols(SOURCE), run in
+    filesearch's pool of worker processes, so that parsing a big file doesn't
+    block the UI."""
+    return filesearch.get_executor().submit(extract_symbols, source)
+
+def find_project_root(path):
+    """Return the directory of the git repository containing PATH, or None if
+    it isn't in one."""
+    current = os.path.dirname(os.path.abspath(path))
+    while True:
+        if os.path.isdir(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+def index_files(jobs):
+    """Index the files of JOBS, a list of (path, cached hash) tuples. This is
+    run in the worker processes. Return a list of (path, mtime, size, hash,
+    symbols) tuples, where SYMBOLS is None if the file's hash is still the
+    cached one."""
+    results = []
+    for path, cached_hash in jobs:
+        try:
+            with open(path, "rb") as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+                f.close()
+        except OSError:
+            continue
+
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == cached_hash:
+            results.append((path, stat.st_mtime_ns, stat.st_size, digest, None))
+            continue
+        try:
+            symbols = extract_symbols(data)
+        except (SyntaxError, ValueError, RecursionError):
+            symbols = []
+        results.append((path, stat.st_mtime_ns, stat.st_size, digest, symbols))
+    return results
+
+class SymbolIndex:
+    """The symbols of all the Python files under ROOT. Loading the saved
+    index and updating it happen in the background; the results are taken in
+    with poll()."""
+
+    def __init__(self, root, cache_dir=SYMBOLS_DIR, workers=None):
+        self.root = root
+        self.cache_path = os.path.join(
+            cache_dir,
+            hashlib.sha1(root.encode("utf-8", "replace")).hexdigest()[:16] + ".json.gz"
+        )
+        self.workers = workers
+
+        # The {mtime, size, hash, symbols} of each indexed file, and the
+        # (path, line, kind, container) definitions of each name
+        self.files = {}
+        self.names = {}
+
+        # Whether the update is finished, and whether the index changed since
+        # it was saved
+        self.done = False
+        self.changed = False
+
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._executor = None
+        self._pending = 0
+        self._walk_done = False
+        self._lock = threading.Lock()
+
+        # Only one thread writes the saved index at a time
+        self._save_lock = threading.Lock()
+
+        self._known = {}
+        self._thread = threading.Thread(target=self._update_loop, daemon=True)
+        self._thread.start()
+
+    def _add_names(self, path, symbols):
+        for name, kind, line, column, container in symbols:
+            self.names.setdefault(name, []).append((path, line, kind, container))
+
+    def _load(self):
+        """Return the files of the index saved by a previous run, or {} if
+        there is none. This is run in the update thread."""
+        try:
+            with gzip.open(self.cache_path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+                f.close()
+        except (OSError, ValueError, EOFError):
+            return {}
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return {}
+        return data["files"]
+
+    def _on_job_done(self, future):
+        with self._lock:
+            self._pending -= 1
+            finished = self._walk_done and self._pending == 0
+        if not future.cancelled() and future.exception() is None:
+            self._queue.put(("indexed", future.result()))
+        if finished:
+            self._queue.put(None)
+
+    def _reindex_file(self, path, cached_hash):
+        self._queue.put(("indexed", index_files([(path, cached_hash)])))
+
+    def _remove_names(self, path):
+        entry = self.files.get(path)
+        if entry is None:
+            return
+        for name, kind, line, column, container in entry["symbols"]:
+            definitions = self.names.get(name, [])
+            self.names[name] = [d for d in definitions if d[0] != path]
+            if self.names[name] == []:
+                del self.names[name]
+
+    def _submit(self, jobs):
+        if self._executor is None:
+            # Use new processes instead of forking the Tk process
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        with self._lock:
+            self._pending += 1
+        future = self._executor.submit(index_files, jobs)
+        future.add_done_callback(self._on_job_done)
+
+    def _update_loop(self):
+        """Load the saved index, find the Python files that changed since they
+        were indexed, and index them in the worker processes."""
+        files = self._load()
+        if files != {}:
+            self._queue.put(("loaded", files))
+        self._known = {
+            path: (entry["mtime"], entry["size"], entry["hash"])
+            for path, entry in files.items()
+        }
+
+        seen = set()
+        jobs = []
+        try:
+            for path in filesearch.walk(self.root, self._cancelled):
+                if not path.endswith((".py", ".pyw")):
+                    continue
+                seen.add(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                known = self._known.get(path)
+                if known is not None and known[:2] == (stat.st_mtime_ns, stat.st_size):
+                    continue
+                jobs.append((path, None if known is None else known[2]))
+                if len(jobs) >= CHUNK_SIZE:
+                    self._submit(jobs)
+                    jobs = []
+            if jobs != [] and not self._cancelled.is_set():
+                self._submit(jobs)
+        except RuntimeError:
+            # The executor was shut down by cancel()
+            pass
+
+        # Forget the files that were deleted
+        if not self._cancelled.is_set():
+            self._queue.put(("removed", set(self._known) - seen))
+
+        with self._lock:
+            self._walk_done = True
+            finished = self._pending == 0
+        if finished:
+            self._queue.put(None)
+
+    def _write(self, files):
+        """Write FILES to the saved index. This is run in a background
+        thread."""
+        data = {"version": INDEX_VERSION, "root": self.root, "files": files}
+        temp_path = self.cache_path + ".tmp"
+        with self._save_lock:
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                with gzip.open(temp_path, "wt", encoding="utf-8") as f:
+                    json.dump(data, f)
+                    f.close()
+                os.replace(temp_path, self.cache_path)
+            except OSError as e:
+                print("Saving the symbol index of %s failed: %s" % (self.root, e))
+
+    def cancel(self):
+        """Stop updating the index."""
+        self._cancelled.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.done = True
+
+    def find(self, name):
+        """Return the list of (path, line, kind, container) definitions of
+        NAME."""
+        return list(self.names.get(name, []))
+
+    def poll(self):
+        """Take in the results of the update and of reindex() so far, and save
+        the index once the update is finished."""
+        while not self._cancelled.is_set():
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if item is None:
+                self.done = True
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                continue
+
+            kind, data = item
+            if kind == "loaded":
+                # Files reindexed before the saved index was loaded are
+                # newer than it
+                for path, entry in data.items():
+                    if path not in self.files:
+                        self.files[path] = entry
+                        self._add_names(path, entry["symbols"])
+                continue
+            if kind == "removed":
+                for path in data:
+                    self._remove_names(path)
+                    self.files.pop(path, None)
+                    self.changed = True
+                continue
+
+            for path, mtime, size, digest, symbols in data:
+                entry = self.files.get(path)
+                if symbols is None and entry is None:
+                    # The file was forgotten since it was compared with it's
+                    # old hash, so index it again from scratch
+                    self.reindex(path)
+                    continue
+                if symbols is None:
+                    # Only the modification time changed. The entry is
+                    # replaced instead of changed, since the index may be
+                    # being saved.
+                    self.files[path] = dict(entry, mtime=mtime, size=size)
+                else:
+                    self._remove_names(path)
+                    symbols = [list(symbol) for symbol in symbols]
+                    self.files[path] = {
+                        "mtime": mtime,
+                        "size": size,
+                        "hash": digest,
+                        "symbols": symbols
+                    }
+                    self._add_names(path, symbols)
+                self.changed = True
+
+        if self.done and self.changed and not self._cancelled.is_set():
+            self.save()
+
+    def reindex(self, path):
+        """Index the Python file at PATH again in the background, after it was
+        saved."""
+        path = os.path.abspath(path)
+        if not path.startswith(os.path.join(self.root, "")):
+            return
+        entry = self.files.get(path)
+        threading.Thread(
+            target=self._reindex_file,
+            args=(path, None if entry is None else entry["hash"]),
+            daemon=True
+        ).start()
+
+    def save(self):
+        """Save the index for the next run, in a background thread."""
+        self.changed = False
+        threading.Thread(
+            target=self._write,
+            args=(dict(self.files),),
+            daemon=True
+        ).start()
@@ -0,0 +1,213 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Noticing when the open files are changed by other programs.
+
+All the files are watched with a single inotify instance where it's available,
+and by checking their modification times in batches everywhere else. Nothing
+runs in the background: the main loop calls FileWatcher.poll()."""
+
+import ctypes
+import ctypes.util
+import os
+import struct
+import time
+
+from constants import *
+
+# The inotify flags and event masks, from <sys/inotify.h>
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+# The events that may mean a watched file was changed, replaced or removed
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_DELETE
+
+# The header of each event read from the inotify file descriptor
+EVENT_HEADER = struct.Struct("iIII")
+
+def _load_inotify():
+    """Return the C library with the inotify functions, or None if they aren't
+    available."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+    libc.inotify_rm_watch.argtypes = (ctypes.c_int, ctypes.c_int)
+    return libc
+
+def _get_signature(path):
+    """Return what identifies the current version of the file at PATH, or None
+    if it doesn't exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+class FileWatcher:
+    """Watch a set of files for changes made by other programs. The files'
+    directories are watched instead of the files themselves, so that files
+    replaced by renaming a new version over them are noticed too."""
+
+    def __init__(self, interval=WATCH_INTERVAL, batch=WATCH_BATCH, use_inotify=True):
+
+        # How often the polling fallback checks files, and how many files it
+        # checks each time
+        self.interval = interval
+        self.batch = batch
+
+        # The signature of each watched file when we last saw it, and how many
+        # times it was added
+        self.signatures = {}
+        self.counts = {}
+
+        # The inotify file descriptor, and the watch descriptor and watched
+        # file names of each directory
+        self.fd = None
+        self.libc = _load_inotify() if use_inotify else None
+        self.watches = {}
+        self.directories = {}
+        if self.libc is not None:
+            fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self.fd = fd
+
+        # The files to check at the next poll, and the state of the polling
+        # fallback
+        self._pending = set()
+        self._poll_queue = []
+        self._last_poll = 0.0
+
+    def _read_events(self):
+        """Add the watched files named in the waiting inotify events to the
+        pending set."""
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except (BlockingIOError, InterruptedError):
+                return
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+
+                # Events were lost, so check everything
+                if mask & IN_Q_OVERFLOW:
+                    self._pending.update(self.signatures)
+                    continue
+                directory = self.directories.get(wd)
+                if directory is not None:
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if path in self.signatures:
+                        self._pending.add(path)
+
+    def _watch_directory(self, directory):
+        if self.fd is None or directory in self.watches:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.watches[directory] = wd
+            self.directories[wd] = directory
+
+    def _unwatch_directory(self, directory):
+        if directory not in self.watches:
+            return
+        if any(os.path.dirname(path) == directory for path in self.signatures):
+            return
+        wd = self.watches.pop(directory)
+        del self.directories[wd]
+        self.libc.inotify_rm_watch(self.fd, wd)
+
+    def add(self, path):
+        """Start watching the file at PATH."""
+        path = os.path.abspath(path)
+        self.counts[path] = self.counts.get(path, 0) + 1
+        if self.counts[path] == 1:
+            self.signatures[path] = _get_signature(path)
+            self._watch_directory(os.path.dirname(path))
+
+    def close(self):
+        """Stop watching all the files."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        self.watches.clear()
+        self.directories.clear()
+
+    def is_native(self):
+        """Return True if inotify is used instead of polling."""
+        return self.fd is not None
+
+    def poll(self):
+        """Return the list of the watched files that changed since they were
+        last seen."""
+        if self.fd is not None:
+            self._read_events()
+        else:
+            # Check the next batch of files, at most once every interval
+            now = time.monotonic()
+            if now - self._last_poll >= self.interval:
+                self._last_poll = now
+                if self._poll_queue == []:
+                    self._poll_queue = list(self.signatures)
+                self._pending.update(self._poll_queue[:self.batch])
+                del self._poll_queue[:self.batch]
+
+        if not self._pending:
+            return []
+        changed = []
+        for path in self._pending:
+            if path not in self.signatures:
+                continue
+            signature = _get_signature(path)
+            if signature != self.signatures[path]:
+                self.signatures[path] = signature
+                changed.append(path)
+        self._pending.clear()
+        return changed
+
+    def remove(self, path):
+        """Stop watching the file at PATH, once it has been removed as many
+        times as it was added."""
+        path = os.path.abspath(path)
+        if path not in self.counts:
+            return
+        self.counts[path] -= 1
+        if self.counts[path] == 0:
+            del self.counts[path]
+            del self.signatures[path]
+            self._pending.discard(path)
+            self._unwatch_directory(os.path.dirname(path))
+
+    def update(self, path):
+        """Remember the current version of PATH as seen, for example after we
+        saved or reloaded it ourselves."""
+        path = os.path.abspath(path)
+        if path in self.signatures:
+            self.signatures[path] = _get_signature(path)
@@ -20,7 +20,6 @@
 
 """Widgets for the application."""
 
-import json
 import os
 import sys
 import tkinter
@@ -30,7 +29,18 @@ from tkinter.constants import *
 # Add the main app directory to sys.path so we can import constants.py
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from . import syntax_highlighting
+from . import brackets
+from . import completion
+from . import indentation
+from . import lexers
+from . import lineinfo
+from . import multicursor
+from . import statistics
+from . import tcl
+from . import undo
+import config
+import fileio
+import settings
 from constants import *
 
 class _NotebookTab(tkinter.LabelFrame):
@@ -278,6 +288,57 @@ class Notebook(tkinter.Frame):
     def control_o_func(self):
         return "break"
 
+class Banner(tkinter.Frame):
+    """A bar showing a message above the status bar, with buttons for the
+    actions the user can take about it. It doesn't block anything, and goes
+    away when one of the buttons is clicked."""
+
+    def __init__(self, *args, **kwargs):
+        kwargs["relief"] = RAISED
+        kwargs["background"] = "#ffe08a"
+        tkinter.Frame.__init__(self, *args, **kwargs)
+
+        # The message label
+        self.label = tkinter.Label(self, background="#ffe08a", anchor=W)
+        self.label.pack(side=LEFT, fill=X, expand=True)
+
+        # The close button
+        self.close_button = tkinter.Button(
+            self,
+            text="X",
+            relief=FLAT,
+            command=self.hide
+        )
+        self.close_button.pack(side=RIGHT)
+
+        # The buttons of the current actions
+        self.buttons = []
+
+    def _run_action(self, func):
+        self.hide()
+        func()
+
+    def hide(self):
+        """Hide the banner."""
+        self.grid_remove()
+
+    def show(self, message, actions=()):
+        """Show MESSAGE, with a button for each of the (label, function)
+        ACTIONS."""
+        self.label.config(text=message)
+        for button in self.buttons:
+            button.destroy()
+        self.buttons = []
+        for label, func in actions:
+            button = tkinter.Button(
+                self,
+                text=label,
+                command=lambda func=func: self._run_action(func)
+            )
+            button.pack(side=LEFT, padx=2)
+            self.buttons.append(button)
+        self.grid()
+
 class StatusBar(tkinter.Frame):
     """The status widget at the bottom of the window."""
 
@@ -286,7 +347,7 @@ class StatusBar(tkinter.Frame):
         tkinter.Frame.__init__(self, *args, **kwargs)
 
         # The application info
-        self.appinfo = json.load(open(JSON_APPINFO))
+        self.appinfo = config.get().appinfo
 
         # The version label
         self.version_label = tkinter.Label(self, text=self.appinfo["version"])
@@ -295,6 +356,13 @@ class StatusBar(tkinter.Frame):
         sep = tkinter.ttk.Separator(self, orient=VERTICAL)
         sep.pack(padx=3, side=RIGHT, fill=Y)
 
+        # The line, word and character counts label
+        self.statistics_label = tkinter.Label(self, text="Lines: 1 Words: 0 Chars: 0")
+        self.statistics_label.pack(side=RIGHT)
+
+        sep = tkinter.ttk.Separator(self, orient=VERTICAL)
+        sep.pack(padx=3, side=RIGHT, fill=Y)
+
         # The line/column label
         self.index_label = tkinter.Label(self, text="Ln: 1 Col: 0")
         self.index_label.pack(side=RIGHT)
@@ -302,6 +370,16 @@ class StatusBar(tkinter.Frame):
         sep = tkinter.ttk.Separator(self, orient=VERTICAL)
         sep.pack(padx=3, side=RIGHT, fill=Y)
 
+        # The file format label
+        self.format_label = tkinter.Label(
+            self,
+            text=fileio.DEFAULT_FORMAT.describe()
+        )
+        self.format_label.pack(side=RIGHT)
+
+        sep = tkinter.ttk.Separator(self, orient=VERTICAL)
+        sep.pack(padx=3, side=RIGHT, fill=Y)
+
         # The tab size label
         self.tab_size_label = tkinter.Label(
             self,
@@ -316,14 +394,33 @@ class StatusBar(tkinter.Frame):
 
     def set_tab_size(self, event=None):
         """Set the tab size."""
-        tabsize = self.set_tab_size_func()
-        self.tab_size_label.config(text="Spaces: %s" % tabsize)
+        self.update_tab_size_label(self.set_tab_size_func())
+
+    def update_format_label(self, file_format):
+        """Show FILE_FORMAT in the format label."""
+        self.format_label.config(text=file_format.describe())
 
     def update_index_label(self, line, column):
         """Update the index label."""
         label = "Ln: %s Col: %s" % (line, column)
         self.index_label.config(text=label)
 
+    def update_statistics_label(self, lines, words, characters, selected):
+        """Show the numbers of LINES, WORDS and CHARACTERS, and of SELECTED
+        characters if there are any. WORDS is None while they are counted."""
+        label = "Lines: %s Words: %s Chars: %s" % (
+            lines,
+            "?" if words is None else words,
+            characters
+        )
+        if selected > 0:
+            label += " Sel: %s" % selected
+        self.statistics_label.config(text=label)
+
+    def update_tab_size_label(self, tabsize):
+        """Show TABSIZE in the tab size label."""
+        self.tab_size_label.config(text="Spaces: %s" % tabsize)
+
     # Placeholders for unbound methods
 
     def set_tab_size_func(self):
@@ -346,23 +443,36 @@ class Page(tkinter.Frame):
         self.line_numbers = TextLineNumbers(self, width=10, height=1000)
         self.line_numbers.grid(row=0, column=0, sticky=W)
 
+        # The minimap, if it's turned on in the settings
+        self.minimap = None
+
         # The text widget
         self.text = Text(
             self,
             line_numbers=self.line_numbers,
             xscrollcommand=self.xscrollbar.set,
-            yscrollcommand=self.yscrollbar.set
+            yscrollcommand=self._on_yscroll
         )
         self.text.bind_update(self.update_accessories)
         self.text.grid(row=0, column=1, sticky=NSEW)
 
         self.xscrollbar.config(command=self.text.xview)
         self.yscrollbar.config(command=self.text.yview)
+        self.set_minimap(settings.get()["minimap"])
+
+        # The find bar, created the first time it's shown
+        self.find_bar = None
+
+        # The banner for messages, like the file changing on disk
+        self.banner = Banner(self)
+        self.banner.grid(row=3, column=0, columnspan=4, sticky=EW)
+        self.banner.hide()
 
         # The status bar
         self.status_bar = StatusBar(self)
         self.status_bar.bind_set_tab_size(self.set_tab_size)
-        self.status_bar.grid(row=2, column=0, columnspan=3, sticky=EW)
+        self.status_bar.update_tab_size_label(self.text.tabwidth)
+        self.status_bar.grid(row=4, column=0, columnspan=4, sticky=EW)
 
         self.columnconfigure(1, weight=1)
         self.rowconfigure(0, weight=1)
@@ -370,32 +480,164 @@ class Page(tkinter.Frame):
         # Bind the events
         self.text.bind("<Control-z>", self.undo)
         self.text.bind("<Control-Z>", self.redo)
+        self.text.bind("<<Modified>>", self._on_modified)
+        self.text.bind("<<Selection>>", lambda event: self.schedule_statistics(), add=True)
         self.yscrollbar.bind("<Button-1>", self.on_scroll_press)
 
-        # The file we currently have open
+        # Whether the text has been edited since it was last loaded or saved,
+        # and a count of the edits to tell when the text has changed
+        self.dirty = False
+        self.version = 0
+
+        # The file we currently have open, and the encoding and newlines it is
+        # saved with
         self.file = "Untitled"
+        self.file_format = fileio.DEFAULT_FORMAT
 
         # Our title
         self.title = os.path.basename(self.file)
 
+        # The undo step of the last reload
+        self.reload_step = None
+
+        # The pending update of the status bar's statistics
+        self._statistics_after = None
+
+        # Follow the changes of the settings
+        settings.subscribe(self)
+
+    def _check_long_lines(self, string):
+        """Turn on the text's long-line mode and tell the user about it if
+        STRING has any lines longer than the long_line_threshold setting."""
+        performance = settings.get()["performance"]
+        threshold = performance["long_line_threshold"]
+        if self.text.long_lines or len(string) <= threshold:
+            return
+        if max(map(len, string.split("\n"))) > threshold:
+            self.text.set_long_line_mode(True)
+            self.show_banner(
+                "This file has very long lines, so they are wrapped and only "
+                "their first %s columns are highlighted." % performance["long_line_column_limit"],
+                (("Turn Off", lambda: self.text.set_long_line_mode(False)),)
+            )
+
+    def _on_modified(self, event=None):
+        """Mark us as dirty, and reset the text's modified flag so that the next
+        edit generates a new <<Modified>> event."""
+        if self.text.edit_modified():
+            self.text.edit_modified(False)
+            self.dirty = True
+            self.version += 1
+            self.modified_func()
+
+    def _on_yscroll(self, first, last):
+        """Move the scrollbar and the minimap's view to the visible part of
+        the text."""
+        self.yscrollbar.set(first, last)
+        if self.minimap is not None:
+            self.minimap.update_view()
+
+    def _update_statistics(self):
+        """Count the lines that aren't counted yet for a while, and show the
+        statistics, coming back soon if there are more to count."""
+        self._statistics_after = None
+        try:
+            counts = self.text.statistics
+            counted = counts.count(settings.get()["performance"]["statistics_budget"])
+            self.status_bar.update_statistics_label(
+                counts.get_line_count(),
+                counts.words if counted else None,
+                counts.characters,
+                counts.get_selected_characters()
+            )
+        except tkinter.TclError:
+            # We were destroyed
+            return
+
+        # Count the rest as soon as Tk has handled it's events, like the
+        # highlighter does
+        if not counted:
+            self._statistics_after = self.after(1, self._update_statistics)
+
     def bind_control_o(self, func):
         self.text.bind_control_o(func)
 
-    def load_string(self, string, file):
-        """Load STRING into the text widget."""
+    def bind_modified(self, func):
+        """Bind every edit of the text to a call of FUNC."""
+        self.modified_func = func
+
+    def destroy(self):
+        """Stop following the settings before destroying the page."""
+        settings.unsubscribe(self)
+        if self._statistics_after is not None:
+            self.after_cancel(self._statistics_after)
+            self._statistics_after = None
+        tkinter.Frame.destroy(self)
+
+    def detect_indentation(self):
+        """Use the indentation width of our text as it's tab width, or the
+        tab_width setting if it can't be told, and show it in the status
+        bar."""
+        width = indentation.detect_indent_width(self.text)
+        if width is None:
+            width = settings.get()["tab_width"]
+            self.text.set_tab_width(width, from_settings=True)
+        else:
+            self.text.set_tab_width(width)
+        self.status_bar.update_tab_size_label(width)
+
+    def goto_line(self, line):
+        """Move the cursor to the start of LINE and scroll to it."""
+        self.text.mark_set(INSERT, "%s.0" % line)
+        self.text.tag_remove("sel", 1.0, END)
+        self.text.see(INSERT)
+        self.text.focus_set()
+        self.text.update_accessories()
 
-        # Clear the old text and insert the new text
+    def load_string(self, string, file, file_format=fileio.DEFAULT_FORMAT):
+        """Load STRING, the text of FILE stored in FILE_FORMAT, into the text
+        widget."""
+
+        # Clear the old text and insert the new text, in long-line mode if it
+        # needs it
+        self._check_long_lines(string)
         self.text.delete(1.0, END)
         self.text.insert(1.0, string)
 
         # Reset the undo stack and redraw the line numbers
         self.text.edit_reset()
+        self.text.edit_modified(False)
+        self.dirty = False
+        self.version += 1
         self.line_numbers.redraw()
 
         # Set our file to be the currently open file, and set the title as such
+        self.set_file_format(file_format)
         self.file = file
         self.title = os.path.basename(file)
         self.set_title(self.title)
+        self.update_language()
+        self.detect_indentation()
+        self.schedule_statistics()
+
+    def reload_string(self, string, file_format=None):
+        """Change the text to STRING, the new contents of our file, editing
+        only the lines that changed. The cursor, the scroll position and the
+        undo history are kept, and the reload can be undone with
+        undo_reload(). Return True if the text changed, which recorded an
+        undo step."""
+        if file_format is not None:
+            self.set_file_format(file_format)
+        self._check_long_lines(string)
+        changed = self.text.set_contents(string)
+        self.text.edit_modified(False)
+        self.dirty = False
+        self.version += 1
+
+        # The undo step of the reload, to undo only it
+        if changed:
+            self.reload_step = self.text.history.undo_stack[-1]
+        return changed
 
     def on_scroll_press(self, *args):
         self.yscrollbar.bind("<B1-Motion>", self.line_numbers.redraw)
@@ -412,6 +654,39 @@ class Page(tkinter.Frame):
         self.after(2, self.line_numbers.redraw())
         return "break"
 
+    def schedule_statistics(self):
+        """Update the status bar's statistics after the statistics_interval
+        setting, unless an update is already waiting, so that typing fast
+        doesn't update them at every key press."""
+        if self._statistics_after is None:
+            interval = settings.get()["performance"]["statistics_interval"]
+            self._statistics_after = self.after(
+                int(interval * 1000),
+                self._update_statistics
+            )
+
+    def set_file_format(self, file_format):
+        """Set the encoding and newlines our file is saved with."""
+        self.file_format = file_format
+        self.status_bar.update_format_label(file_format)
+
+    def set_minimap(self, enabled):
+        """Show or hide the minimap."""
+        if enabled and self.minimap is None:
+            from . import minimap
+            self.minimap = minimap.Minimap(self, self.text)
+            self.minimap.grid(row=0, column=3, sticky=NS)
+        elif not enabled and self.minimap is not None:
+            self.minimap.destroy()
+            self.minimap = None
+
+    def set_settings(self, settings, changed):
+        """Use the CHANGED settings from SETTINGS."""
+        if "minimap" in changed:
+            self.set_minimap(settings["minimap"])
+        if "tab_width" in changed and self.text.tab_width_from_settings:
+            self.status_bar.update_tab_size_label(settings["tab_width"])
+
     def set_tab_size(self):
         """Get the tab size and set it."""
 
@@ -424,6 +699,19 @@ class Page(tkinter.Frame):
         self.text.set_tab_width(tab_size)
         return tab_size
 
+    def show_banner(self, message, actions=()):
+        """Show MESSAGE in the banner, with a button for each of the (label,
+        function) ACTIONS."""
+        self.banner.show(message, actions)
+
+    def show_find_bar(self, replace=False):
+        """Show the find bar, with the replace options if REPLACE is True."""
+        if self.find_bar is None:
+            from . import search
+            self.find_bar = search.FindBar(self, text=self.text)
+            self.find_bar.grid(row=2, column=0, columnspan=4, sticky=EW)
+        self.find_bar.show(replace=replace)
+
     def undo(self, event=None):
         """Undo the last action."""
         try:
@@ -433,12 +721,31 @@ class Page(tkinter.Frame):
         self.after(2, self.line_numbers.redraw())
         return "break"
 
+    def undo_reload(self):
+        """Undo the last reload, if it is still the last undo step, so that
+        the edits made since aren't undone instead."""
+        history = self.text.history
+        if history.can_undo() and history.undo_stack[-1] is self.reload_step:
+            self.undo()
+        self.reload_step = None
+
+    def update_language(self):
+        """Choose the highlighting language from our file's name, or from
+        it's shebang line."""
+        self.text.set_language(
+            lexers.get_language(self.file, self.text.get(1.0, "1.end"))
+        )
+
     def update_accessories(self):
         """Update all our accessories, like the status bar."""
         line, col = self.text.index(INSERT).split(".")
         self.status_bar.update_index_label(line, col)
+        self.schedule_statistics()
 
     # Placeholders for unbound methods
+    def modified_func(self):
+        pass
+
     def set_title(self, title):
         pass
 
@@ -554,43 +861,113 @@ class SetTabSizePopover(_Popover):
 class Text(tkinter.Text):
     """The text widget."""
 
-    def __init__(self, *args, line_numbers, tabwidth=4, **kwargs):
+    def __init__(self, *args, line_numbers, tabwidth=None, **kwargs):
 
-        # Configure all the keyword arguments to customize the widget
+        # Configure all the keyword arguments to customize the widget, with
+        # the font and colors from the settings, or the default ones if Tk
+        # doesn't know them
         kwargs["wrap"] = "none"
-        kwargs["background"] = "#000000"
-        kwargs["foreground"] = "#ffffff"
-        kwargs["insertbackground"] = "#ffffff"
-        kwargs["selectbackground"] = "#ffffff"
-        kwargs["selectforeground"] = "#000000"
-        kwargs["font"] = "LiberationMono 10"
-        kwargs["undo"] = True
-
-        # Initialize the widget and bind it's events
+        style = self._get_style(settings.get())
+        master = args[0] if args else kwargs["master"]
+        try:
+            for option, value in style.items():
+                if option == "font":
+                    master.tk.call("font", "actual", value)
+                else:
+                    master.winfo_rgb(value)
+        except tkinter.TclError as e:
+            print("Can't use the font and colors from the settings: %s" % e)
+            style = self._get_style(settings.get().defaults)
+        kwargs.update(style)
+
+        # The undo history is kept by us instead of by Tk
+        kwargs["undo"] = False
+
+        # Initialize the widget
         tkinter.Text.__init__(self, *args, **kwargs)
+
+        # Our tab width, and whether it's the tab_width setting and follows
+        # it's changes, instead of being detected or chosen by the user
+        self.tab_width_from_settings = tabwidth is None
+        if tabwidth is None:
+            tabwidth = settings.get()["tab_width"]
         self.tabwidth = tabwidth
+
+        # Bind our events
         self.bind("<Alt-Down>", self._move_line_down)
         self.bind("<Alt-Up>", self._move_line_up)
         self.bind("<ButtonPress>", self._on_button_press)
         self.bind("<Control-a>", self._select_all)
+        self.bind("<Control-braceleft>", self._fold)
+        self.bind("<Control-braceright>", self._unfold)
+        self.bind("<Control-f>", lambda event: self._generate_event("<<find>>"))
+        self.bind("<Control-h>", lambda event: self._generate_event("<<replace>>"))
         self.bind("<Control-K>", self._delete_current_line)
         self.bind("<Control-o>", self._event_handler)
         self.bind("<Control-Key-bracketright>", self._line_indent)
         self.bind("<Control-Key-bracketleft>", self._line_unindent)
         self.bind("<Control-Shift-Left>", self._ctrl_shift_left)
         self.bind("<Control-Shift-Right>", self._ctrl_shift_right)
-        self.bind("<KeyPress>", self._on_key_press)
+        self.bind("<KeyPress>", lambda event: self._on_key_press(event))
+        self.bind("<Return>", self._on_return)
         self.bind("<Key-Tab>", self._on_tab)
 
         self.columnconfigure(0, weight=1)
         self.rowconfigure(0, weight=1)
 
-        # Our syntax highlighting manager
-        self.syntax = syntax_highlighting.Python(self)
+        # Define the Tcl procedures for our batched operations, and send all
+        # our edits through the proxy so that we can record them. The key
+        # press and edit handlers are looked up on every call, so that perf
+        # can time them.
+        tcl.install(self)
+        self._edit_callback = self.register(lambda *args: self._on_edit(*args))
+        self.tk.call("::tkeditor::install_proxy", self._w, self._edit_callback)
+
+        # Our undo history, whether new edits should be recorded in it, and the
+        # functions to call with the edits
+        self.history = undo.UndoHistory(settings.get()["performance"]["undo_memory_limit"])
+        self._recording = True
+        self._last_edits = []
+        self.edit_listeners = []
+
+        # The functions to call with the main color of each newly highlighted
+        # line
+        self.highlight_listeners = []
+
+        # The pending idle update of the accessories
+        self._update_after = None
+
+        # Whether we are in long-line mode, and the number of columns of each
+        # line to highlight, or None for all of them
+        self.long_lines = False
+        self.highlight_column_limit = None
+
+        # Our syntax highlighter and it's language, set once we know what
+        # kind of file we show. Plain text has no highlighter.
+        self.syntax = None
+        self.language = None
+
+        # Our code folding, for the languages that have it
+        self.folding = None
+
+        # What we know about each line, and the bracket matching and
+        # indentation guides worked out from it
+        self.line_info = lineinfo.LineInfo(self)
+        self.brackets = brackets.Brackets(self)
+
+        # Our line, word and character counts
+        self.statistics = statistics.Statistics(self)
+
+        # Our word completion, and our extra cursors
+        self.completer = completion.Completer(self)
+        self.multi_cursor = multicursor.MultiCursor(self)
 
         # Our line numbers widget
         self.line_numbers = line_numbers
         self.line_numbers.attach(self)
+
+        # Follow the changes of the settings
+        settings.subscribe(self)
     
     def _ctrl_shift_left(self, event=None):
         self.control_shift_left_func()
@@ -601,119 +978,249 @@ class Text(tkinter.Text):
         return "break"
 
     def _delete_current_line(self, event=None):
-        """Delete the line where the cursor is."""
-        i = self.index(INSERT)
-        ilist = i.split(".")
-        line_start = ilist[0] + ".0"
-        line_end = ilist[0] + ".end+1c"
-
-        # Insert a separator in the undo stack, so that the user can undo the
-        # line deletion all by itself
-        self.edit_separator()
-        self.delete(line_start, line_end)
-        
+        """Delete the selected lines, or the line where the cursor is, as a
+        single undo step."""
+        first, last = self._get_selected_lines()
+
+        # Delete the newline after the lines, or before them if they are the
+        # last lines of the text
+        if last < self._get_last_line():
+            edit = ("%s.0" % first, "%s.0" % (last + 1), "")
+        elif first > 1:
+            edit = ("%s.end" % (first - 1), "%s.end" % last, "")
+        else:
+            edit = ("1.0", "%s.end" % last, "")
+        self.apply_edits([edit])
+        self.tag_remove("sel", 1.0, END)
+        self.schedule_update()
+        return "break"
+
     def _event_handler(self, event):
         """Prevent the widget from creating a new line when Ctrl+O is hit."""
         self.control_o_func()
         return "break"
 
-    def _get_line_above(self, index):
-        """Return a tuple of start and end indexes for the line above INDEX.
-        Return False if the line is line 1."""
-        index = str(index)
-        ilist = index.split(".")
-        if ilist[0] == "1":
-            return False
-        else:
-            return self._get_line_start_end(str(int(ilist[0]) - 1) + ".0")
-
-    def _get_line_below(self, index):
-        """Return a tuple of start and end indexes for the line below INDEX."""
-        index = str(index)
-        ilist = index.split(".")
-        return self._get_line_start_end(str(int(ilist[0]) + 1) + ".0")
-
-    def _get_line_last(self):
-        """Return the start index for the last line."""
-        return self._get_line_start_end(
-            float(self.index(END)) - 1.0
-        )[0]
-        
-    def _get_line_start_end(self, index):
-        """Return the start and end indexes for the line at INDEX."""
-        index = str(index)
-        ilist = index.split(".")
-        return ilist[0] + ".0", ilist[0] + ".end"
+    def _apply_history(self, edits):
+        """Apply the (start, end, chars) EDITS of an undo or redo without
+        recording them, and move the cursor to the end of the last one."""
+        if edits is None:
+            return
+        self._recording = False
+        self._last_edits = []
+        try:
+            self.apply_edits(edits)
+        finally:
+            self._recording = True
+        if self._last_edits != []:
+            edit = self._last_edits[-1]
+            self.mark_set(INSERT, "%s+%sc" % (edit.start, len(edit.inserted)))
+            self.see(INSERT)
+        self.schedule_update()
+
+    def _fold(self, event=None):
+        """Fold the innermost fold region around the cursor."""
+        if self.folding is not None:
+            self.folding.fold_at(int(self.index(INSERT).split(".")[0]))
+        return "break"
+
+    def _generate_event(self, sequence):
+        """Generate SEQUENCE instead of running the class binding for the key,
+        which would otherwise edit the text."""
+        self.event_generate(sequence)
+        return "break"
+
+    def _get_style(self, settings):
+        """Return the widget options for the font and colors in SETTINGS."""
+        colors = settings["colors"]
+        return {
+            "background": colors["background"],
+            "foreground": colors["foreground"],
+            "insertbackground": colors["insert"],
+            "selectbackground": colors["select_background"],
+            "selectforeground": colors["select_foreground"],
+            "font": settings["font"],
+        }
+
+    def _get_last_line(self):
+        """Return the number of the last line."""
+        return int(self.index("end-1c").split(".")[0])
+
+    def _get_selected_lines(self):
+        """Return the first and last numbers of the lines touched by the
+        selection, or of the cursor's line if nothing is selected."""
+        try:
+            first = self.index("sel.first")
+            last = self.index("sel.last")
+        except tkinter.TclError:
+            line = int(self.index(INSERT).split(".")[0])
+            return line, line
+
+        first_line = int(first.split(".")[0])
+        last_line, last_column = [int(i) for i in last.split(".")]
+
+        # A selection ending at the start of a line doesn't include that line
+        if last_column == 0 and last_line > first_line:
+            last_line -= 1
+        return first_line, last_line
 
     def _line_indent(self, event=None):
-        """Indent the current line."""
-        start, end = self._get_line_start_end(self.index(INSERT))
-        self.edit_separator()
-        self.insert(start, " " * self.tabwidth)
-        self.edit_separator()
-        self.update_accessories()
+        """Indent the selected lines, or the current line, as a single undo
+        step. Empty lines in a selection are left alone."""
+        first, last = self._get_selected_lines()
+        lines = self.get("%s.0" % first, "%s.end" % last).split("\n")
+        indent = " " * self.tabwidth
+
+        edits = []
+        for line in range(last, first - 1, -1):
+            if first == last or lines[line - first].strip() != "":
+                edits.append(("%s.0" % line, None, indent))
+        self.apply_edits(edits)
+        self.schedule_update()
+        return "break"
 
     def _line_unindent(self, event=None):
-        """Unindent the current line."""
-        start, end = self._get_line_start_end(self.index(INSERT))
+        """Unindent the selected lines, or the current line, as a single undo
+        step."""
+        first, last = self._get_selected_lines()
+        lines = self.get("%s.0" % first, "%s.end" % last).split("\n")
+
+        # Remove up to one indentation level of spaces from each line
+        edits = []
+        for line in range(last, first - 1, -1):
+            contents = lines[line - first]
+            spaces = len(contents) - len(contents.lstrip(" "))
+            spaces = min(spaces, self.tabwidth)
+            if spaces > 0:
+                edits.append(("%s.0" % line, "%s.%s" % (line, spaces), ""))
+        if edits != []:
+            self.apply_edits(edits)
+        self.schedule_update()
+        return "break"
 
-        # Check if the line is indented at all
-        line = self.get(start, end)
-        if line.startswith(" " * self.tabwidth):
-            line = line[self.tabwidth:]
-        
-        self.edit_separator()
-        self.replace(start, end, line)
-        self.edit_separator()
-        self.update_accessories()
+    def _move_lines(self, first, last, offset):
+        """Move the lines FIRST to LAST up (OFFSET -1) or down (OFFSET 1) by one
+        line, keeping the cursor and the selection on them."""
+        start = min(first, first + offset)
+        end = max(last, last + offset)
+        lines = self.get("%s.0" % start, "%s.end" % end).split("\n")
+        if offset < 0:
+            lines = lines[1:] + lines[:1]
+        else:
+            lines = lines[-1:] + lines[:-1]
+
+        # Remember the cursor and selection, since replacing the lines moves
+        # them
+        insert = self.index(INSERT)
+        try:
+            selection = (self.index("sel.first"), self.index("sel.last"))
+        except tkinter.TclError:
+            selection = None
+
+        self.apply_edits([("%s.0" % start, "%s.end" % end, "\n".join(lines))])
+
+        # Move the cursor and selection along with the lines
+        def moved(index):
+            line, column = index.split(".")
+            return "%s.%s" % (int(line) + offset, column)
+        self.mark_set(INSERT, moved(insert))
+        if selection is not None:
+            self.tag_add("sel", moved(selection[0]), moved(selection[1]))
+        self.see(INSERT)
+        self.schedule_update()
 
     def _move_line_down(self, event=None):
-        """Swap the places of the current line and the one below it."""
-        i = self.index(INSERT)
-        ilist = i.split(".")
-
-        # Make sure we can actually move up (that is, the current line is not
-        # the first)
-        if int(ilist[0]) < float(self._get_line_last()):
-            
-            # Get the contents of this line and the line above it
-            current_contents = self.get(*self._get_line_start_end(i))
-            above_contents = self.get(*self._get_line_below(i))
-
-            # Replace the lines
-            self.replace(*self._get_line_start_end(i), above_contents)
-            self.replace(*self._get_line_below(i), current_contents)
+        """Move the selected lines, or the current line, down by one line."""
+        first, last = self._get_selected_lines()
+        if last < self._get_last_line():
+            self._move_lines(first, last, 1)
+        return "break"
 
     def _move_line_up(self, event=None):
-        """Swap the places of the current line and the one above it."""
-        i = self.index(INSERT)
-        ilist = i.split(".")
-
-        # Make sure we can actually move up (that is, the current line is not
-        # the first)
-        if int(ilist[0]) > 1:
-            
-            # Get the contents of this line and the line above it
-            current_contents = self.get(*self._get_line_start_end(i))
-            above_contents = self.get(*self._get_line_above(i))
-
-            # Replace the lines
-            self.replace(*self._get_line_start_end(i), above_contents)
-            self.replace(*self._get_line_above(i), current_contents)
+        """Move the selected lines, or the current line, up by one line."""
+        first, last = self._get_selected_lines()
+        if first > 1:
+            self._move_lines(first, last, -1)
+        return "break"
 
     def _on_button_press(self, event=None):
         """Update the line numbers and syntax highlighting."""
         self.after(2, self.update_accessories)
 
+    def _on_edit(self, kind, *args):
+        """Handle a call from the Tcl proxy: KIND is "edits" or "group" with
+        flat (start, deleted, inserted) records of the edits just made, or
+        "edit" with the edit subcommand to run with our undo history."""
+        if kind == "edit":
+            command = args[0]
+            if command == "undo":
+                self._apply_history(self.history.undo())
+            elif command == "redo":
+                self._apply_history(self.history.redo())
+            elif command == "separator":
+                self.history.separate()
+            elif command == "reset":
+                self.history.clear()
+            elif command == "canundo":
+                return int(self.history.can_undo())
+            elif command == "canredo":
+                return int(self.history.can_redo())
+            return ""
+
+        edits = [
+            undo.Edit(*args[i:i + 3]) for i in range(0, len(args), 3)
+        ]
+        self._last_edits = edits
+        if self._recording:
+            self.history.record(edits, group=kind == "group")
+        for func in self.edit_listeners:
+            func(edits)
+        return ""
+
     def _on_key_press(self, event=None):
         """Update the line numbers and syntax highlighting."""
         self.after(2, self.update_accessories)
 
+    def _on_return(self, event=None):
+        """Start a new line, indented for what comes before it, replacing
+        the selection and the whitespace after the cursor, as a single undo
+        step."""
+        try:
+            start = self.index("sel.first")
+            end = self.index("sel.last")
+        except tkinter.TclError:
+            start = end = self.index(INSERT)
+        line, column = [int(i) for i in start.split(".")]
+        chars = "\n" + indentation.get_new_line_indent(self, line, column)
+
+        after = self.get(end, "%s lineend" % end)
+        end = self.index("%s+%sc" % (end, len(after) - len(after.lstrip(" \t"))))
+        if end == start:
+            end = None
+        self.apply_edits([(start, end, chars)])
+        self.mark_set(INSERT, "%s+%sc" % (start, len(chars)))
+        self.tag_remove("sel", 1.0, END)
+        self.see(INSERT)
+
+        # This binding replaces the <KeyPress> one, so run it's handler to
+        # update the accessories and to time the keystroke
+        self._on_key_press()
+        return "break"
+
     def _on_tab(self, event):
         self.insert(INSERT, " " * self.tabwidth)
-        self.update_accessories()
+        self._on_key_press()
+        return "break"
+
+    def _unfold(self, event=None):
+        """Unfold the fold regions on the cursor's line."""
+        if self.folding is not None:
+            self.folding.unfold_at(int(self.index(INSERT).split(".")[0]))
         return "break"
 
+    def _run_scheduled_update(self):
+        self._update_after = None
+        self.update_accessories()
+
     def _select_all(self, event=None):
         """Select all of the text."""
         self.tag_add("sel", 1.0, "end-1c")
@@ -721,6 +1228,28 @@ class Text(tkinter.Text):
         self.see(INSERT)
         return "break"
 
+    def apply_edits(self, edits):
+        """Apply EDITS, a list of (start, end, chars) tuples, in a single Tcl
+        call and as a single undo step. An END of None inserts CHARS at START,
+        and empty CHARS deletes from START to END. The edits are applied in
+        order, so they should go from the end of the text backwards."""
+        flat = []
+        for start, end, chars in edits:
+            if end is None:
+                end = ""
+            flat.extend((str(start), str(end), chars))
+        self.tk.call("::tkeditor::apply_edits", self._w, tuple(flat))
+
+    def add_edit_listener(self, func):
+        """Call FUNC with the list of undo.Edit records of every edit, after
+        it's made."""
+        self.edit_listeners.append(func)
+
+    def add_highlight_listener(self, func):
+        """Call FUNC with the first line and the list of the colors covering
+        most of each line, or None, whenever lines are highlighted."""
+        self.highlight_listeners.append(func)
+
     def bind_control_o(self, func):
         """Bind \<Control-o\> to a call of FUNC."""
         self.control_o_func = func
@@ -737,18 +1266,125 @@ class Text(tkinter.Text):
         """Bind a call of self.update_accessories to a call of FUNC."""
         self.update_accessories_func = func
 
+    def destroy(self):
+        """Stop following the settings and the theme, and give the widget it's
+        own command back before destroying it."""
+        settings.unsubscribe(self)
+        if self.syntax is not None:
+            self.syntax.stop()
+            self.syntax = None
+        if self.folding is not None:
+            self.folding.stop()
+            self.folding = None
+        self.completer.close()
+        try:
+            self.tk.call("::tkeditor::remove_proxy", self._w)
+        except tkinter.TclError:
+            pass
+        tkinter.Text.destroy(self)
+
     def get_all(self):
         """Return all our text."""
         return self.get(1.0, END)
 
-    def set_tab_width(self, width):
-        """Set the tab width to WIDTH."""
+    def get_undo_size(self):
+        """Return the estimated size of our undo history, in bytes."""
+        return self.history.get_size()
+
+    def schedule_update(self):
+        """Update the accessories once Tk is idle, instead of right away."""
+        if self._update_after is None:
+            self._update_after = self.after_idle(self._run_scheduled_update)
+
+    def set_contents(self, contents):
+        """Change our text to CONTENTS by replacing only the lines that
+        differ, as a single undo step, keeping the cursor and the view on the
+        same lines. Return False if nothing changed."""
+        from . import diff
+        line_diff = diff.LineDiff(self.get(1.0, "end-1c"), contents)
+        if line_diff.hunks == []:
+            return False
+
+        # Remember where the cursor and the view are
+        insert_line, insert_column = self.index(INSERT).split(".")
+        top_line = self.index("@0,0").split(".")[0]
+        xview = self.xview()[0]
+
+        self.apply_edits(line_diff.get_edits())
+
+        # Put them back on the lines they were on
+        self.mark_set(
+            INSERT,
+            "%s.%s" % (line_diff.map_line(int(insert_line)), insert_column)
+        )
+        self.yview("%s.0" % line_diff.map_line(int(top_line)))
+        self.xview_moveto(xview)
+        self.schedule_update()
+        return True
+
+    def set_language(self, language):
+        """Highlight our text with the lexer of LANGUAGE, or not at all if
+        LANGUAGE is None."""
+        if language == self.language:
+            return
+        if self.syntax is not None:
+            self.syntax.stop()
+            self.syntax = None
+        if self.folding is not None:
+            self.folding.stop()
+            self.folding = None
+        self.language = language
+
+        lexer = lexers.get_lexer(language)
+        if lexer is not None:
+            from . import syntax_highlighting
+            self.syntax = syntax_highlighting.Highlighter(self, lexer)
+        if language == "python":
+            from . import folding
+            self.folding = folding.Folding(self)
+        self.schedule_update()
+
+    def set_long_line_mode(self, enabled):
+        """Turn long-line mode on or off. Tk lays out each display line as a
+        whole, so very long lines are wrapped into many short display lines,
+        and highlighting stops at the long_line_column_limit setting."""
+        self.long_lines = enabled
+        if enabled:
+            self.config(wrap="char")
+            self.highlight_column_limit = settings.get()["performance"]["long_line_column_limit"]
+        else:
+            self.config(wrap="none")
+            self.highlight_column_limit = None
+        self.schedule_update()
+
+    def set_settings(self, settings, changed):
+        """Use the CHANGED settings from SETTINGS."""
+        if "font" in changed or any(name.startswith("colors.") for name in changed):
+            try:
+                self.config(**self._get_style(settings))
+            except tkinter.TclError as e:
+                print("Can't use the font and colors from the settings: %s" % e)
+            self.multi_cursor.update_colors()
+        if "tab_width" in changed and self.tab_width_from_settings:
+            self.tabwidth = settings["tab_width"]
+        if "performance.undo_memory_limit" in changed:
+            self.history.set_limit(settings["performance"]["undo_memory_limit"])
+        if self.long_lines and "performance.long_line_column_limit" in changed:
+            self.set_long_line_mode(True)
+
+    def set_tab_width(self, width, from_settings=False):
+        """Set the tab width to WIDTH. FROM_SETTINGS tells whether it's the
+        tab_width setting, which is then followed when it changes."""
         self.tabwidth = width
+        self.tab_width_from_settings = from_settings
 
     def update_accessories(self, event=None):
-        """Update the syntax highlighting."""
+        """Update the syntax highlighting, and the bracket matching and
+        indentation guides, which use it's lexer states."""
         self.line_numbers.redraw()
-        self.syntax.update()
+        if self.syntax is not None:
+            self.syntax.update()
+        self.brackets.update()
         self.update_accessories_func()
 
     # Placeholders for unbound methods
@@ -772,6 +1408,16 @@ class TextLineNumbers(tkinter.Canvas):
         tkinter.Canvas.__init__(self, *args, **kwargs, highlightthickness=0)
         self.textwidget = None
 
+        # Clicking a fold marker folds or unfolds it's lines
+        self.bind("<Button-1>", self._on_click)
+
+    def _on_click(self, event):
+        """Toggle the fold region of the line that was clicked."""
+        folding = self.textwidget.folding
+        if folding is not None:
+            line = int(self.textwidget.index("@0,%s" % event.y).split(".")[0])
+            folding.toggle(line)
+
     def attach(self, text_widget):
         self.textwidget = text_widget
 
@@ -779,12 +1425,30 @@ class TextLineNumbers(tkinter.Canvas):
         """Redraw the line numbers."""
         self.delete(ALL)
 
+        # Step through the display lines, so that folded lines are skipped.
+        # The middle of a wrapped line gets no number.
+        folding = self.textwidget.folding
         i = self.textwidget.index("@0,0")
+        linenum = i.split(".")[0]
+        numbers = []
         while True:
             dline = self.textwidget.dlineinfo(i)
             if dline is None: break
             y = dline[1]
-            linenum = str(i).split(".")[0]
-            self.create_text(2, y, anchor="nw", text=linenum)
-            i = self.textwidget.index("%s+1line" % i)
-            self.config(width=len(linenum) * 10)
\ No newline at end of file
+            linenum, column = str(i).split(".")
+            if column == "0":
+                numbers.append((int(linenum), y))
+                self.create_text(2, y, anchor="nw", text=linenum)
+            next_i = self.textwidget.index("%s+1display lines display linestart" % i)
+            if next_i == i: break
+            i = next_i
+        width = len(linenum) * 10
+
+        # The markers of the fold regions
+        if folding is not None and numbers != []:
+            for line, y in numbers:
+                if folding.get_fold_end(line) is not None:
+                    marker = "+" if folding.is_folded(line) else "-"
+                    self.create_text(width, y, anchor="nw", text=marker)
+            width += 12
+        self.config(width=width)
\ No newline at end of file
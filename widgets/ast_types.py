@@ -21,7 +21,6 @@
 """A dictionary of ast types and their corresponding keywords."""
 
 import ast
-print(ast.keyword("if True: pass")._attributes)
 
 DICT = {
     type(ast.And): "and",
@@ -0,0 +1,186 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Matching bracket highlighting and indentation guides, worked out from the
+text's cached line information."""
+
+from tkinter.constants import *
+
+from . import lineinfo
+
+# How many lines away from the cursor to look for a matching bracket
+MATCH_SCAN_LINES = 5000
+
+# The pairs of brackets
+PAIRS = {"(": ")", "[": "]", "{": "}", ")": "(", "]": "[", "}": "{"}
+
+class Brackets:
+    """Highlight the bracket at TEXT's cursor and it's match, and draw
+    indentation guides on the visible lines.
+
+    Finding a match scans the cached brackets of each line from the cursor
+    on, and skips the lines whose lowest bracket depth shows that they can't
+    hold the match, so it never relexes or rescans the text. The guides are
+    only redrawn when the visible lines or the text change."""
+
+    def __init__(self, text):
+        self.text = text
+        self.line_info = text.line_info
+
+        self.text.tag_configure("bracket_match", background="#404040")
+        self.text.tag_configure("bracket_mismatch", background="#802020")
+        self.text.tag_configure("indent_guide", background="#202020")
+        for tag in ("bracket_match", "bracket_mismatch", "indent_guide"):
+            self.text.tag_lower(tag, SEL)
+
+        # The bracket positions highlighted now, and the visible lines,
+        # text version and tab width that the guides were drawn for
+        self.highlighted = ()
+        self.guides_key = None
+
+    def _get_cursor_bracket(self):
+        """Return the (line, column, bracket) of the code bracket after the
+        cursor, or else before it, or None."""
+        line, column = map(int, self.text.index(INSERT).split("."))
+        info = self.line_info.get(line)
+        found = None
+        for bracket_column, bracket in info.brackets:
+            if bracket_column == column:
+                return line, bracket_column, bracket
+            if bracket_column == column - 1:
+                found = (line, bracket_column, bracket)
+        return found
+
+    def find_closing(self, line, column):
+        """Return the (line, column) of the closing bracket matching the
+        opening bracket at LINE, COLUMN, or None."""
+        info = self.line_info.get(line)
+        depth = 0
+        for bracket_column, bracket in info.brackets:
+            if bracket_column <= column:
+                continue
+            depth += 1 if bracket in lineinfo.OPENING else -1
+            if depth < 0:
+                return line, bracket_column
+
+        last = min(self.line_info.get_line_count(), line + MATCH_SCAN_LINES)
+        for number in range(line + 1, last + 1):
+            if (number - line) % lineinfo.FILL_CHUNK_LINES == 1:
+                self.line_info.fill(number, number + lineinfo.FILL_CHUNK_LINES - 1)
+            info = self.line_info.lines[number - 1]
+            if depth + info.min_prefix >= 0:
+                depth += info.net
+                continue
+            for bracket_column, bracket in info.brackets:
+                depth += 1 if bracket in lineinfo.OPENING else -1
+                if depth < 0:
+                    return number, bracket_column
+        return None
+
+    def find_opening(self, line, column):
+        """Return the (line, column) of the opening bracket matching the
+        closing bracket at LINE, COLUMN, or None."""
+        info = self.line_info.get(line)
+        depth = 0
+        for bracket_column, bracket in reversed(info.brackets):
+            if bracket_column >= column:
+                continue
+            depth += 1 if bracket in lineinfo.CLOSING else -1
+            if depth < 0:
+                return line, bracket_column
+
+        for number in range(line - 1, max(0, line - MATCH_SCAN_LINES), -1):
+            if (line - number) % lineinfo.FILL_CHUNK_LINES == 1:
+                self.line_info.fill(number - lineinfo.FILL_CHUNK_LINES + 1, number)
+            info = self.line_info.lines[number - 1]
+            if depth + info.min_suffix >= 0:
+                depth -= info.net
+                continue
+            for bracket_column, bracket in reversed(info.brackets):
+                depth += 1 if bracket in lineinfo.CLOSING else -1
+                if depth < 0:
+                    return number, bracket_column
+        return None
+
+    def update(self):
+        """Highlight the brackets for the cursor's new place, and redraw the
+        guides if the visible lines changed."""
+        self.update_match()
+        self.update_guides()
+
+    def update_guides(self):
+        """Mark the whitespace at each indentation level of the visible lines
+        with the indent_guide tag."""
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index("@0,%s" % self.text.winfo_height()).split(".")[0])
+        key = (first, last, self.line_info.version, self.text.tabwidth)
+        if key == self.guides_key:
+            return
+        self.guides_key = key
+
+        self.line_info.fill(first, last)
+        tabwidth = self.text.tabwidth
+        indexes = []
+        for number in range(first, last + 1):
+            info = self.line_info.lines[number - 1]
+            if info is None or info.blank:
+                continue
+            width = 0
+            for column, char in enumerate(info.leading):
+                if width % tabwidth == 0:
+                    indexes.extend(("%s.%s" % (number, column), "%s.%s" % (number, column + 1)))
+                width += tabwidth - width % tabwidth if char == "\t" else 1
+        self.text.tk.call(
+            "::tkeditor::highlight",
+            self.text._w,
+            "%s.0" % first,
+            "%s.end" % last,
+            ("indent_guide",),
+            ("indent_guide", tuple(indexes)) if indexes else ()
+        )
+
+    def update_match(self):
+        """Highlight the bracket at the cursor and it's match, or mark it as
+        mismatched if the match is the wrong kind of bracket."""
+        if self.highlighted:
+            for tag in ("bracket_match", "bracket_mismatch"):
+                self.text.tk.call(self.text._w, "tag", "remove", tag, *self.highlighted)
+        self.highlighted = ()
+
+        found = self._get_cursor_bracket()
+        if found is None:
+            return
+        line, column, bracket = found
+        if bracket in lineinfo.OPENING:
+            match = self.find_closing(line, column)
+        else:
+            match = self.find_opening(line, column)
+        if match is None:
+            return
+
+        match_line, match_column = match
+        match_bracket = self.line_info.lines[match_line - 1].brackets
+        match_bracket = dict(match_bracket)[match_column]
+        tag = "bracket_match" if PAIRS[bracket] == match_bracket else "bracket_mismatch"
+        self.highlighted = (
+            "%s.%s" % (line, column), "%s.%s" % (line, column + 1),
+            "%s.%s" % (match_line, match_column), "%s.%s" % (match_line, match_column + 1),
+        )
+        self.text.tag_add(tag, *self.highlighted)
@@ -0,0 +1,352 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Word completion, from an index of the words of each text that is kept up to
+date from the text's edits."""
+
+import bisect
+import re
+import tkinter
+import weakref
+from tkinter.constants import *
+
+# The words that are indexed and completed
+WORD_REGEX = re.compile(r"[^\W\d]\w{2,}")
+
+# The most completions to show
+MAX_COMPLETIONS = 20
+
+# How many matches to look at when picking the most used ones
+MAX_CANDIDATES = 500
+
+# Whether to complete words from the other open texts too
+COMPLETE_FROM_ALL_TEXTS = True
+
+# The indexes that have been built, for completing from all the texts
+_indexes = weakref.WeakSet()
+
+# The completion popup of each Tk root
+_popups = weakref.WeakKeyDictionary()
+
+class TokenIndex:
+    """The words of TEXT, with how often each is used, and a sorted array of
+    them for prefix lookups. The index is built the first time it's used, and
+    after that it's updated from the text's edits by rescanning only the
+    changed lines."""
+
+    def __init__(self, text):
+        self.text = text
+        self.built = False
+
+        # The words of each line, the number of times each word is used, and
+        # the sorted list of the words
+        self.line_words = []
+        self.counts = {}
+        self.words = []
+
+        self.text.add_edit_listener(self._on_edits)
+
+    def _add(self, words):
+        counts = self.counts
+        for word in words:
+            count = counts.get(word, 0)
+            if count == 0:
+                bisect.insort(self.words, word)
+            counts[word] = count + 1
+
+    def _on_edits(self, edits):
+        """Forget the words of the lines changed by EDITS and rescan them."""
+        if not self.built:
+            return
+
+        # Splice the line list first, since each edit's line is counted after
+        # the edits before it, and rescan the changed lines once the text has
+        # all of them
+        first = None
+        last = 0
+        for edit in edits:
+            line = edit.line
+            for words in self.line_words[line - 1:line + edit.lines_removed]:
+                if words is not None:
+                    self._remove(words)
+            self.line_words[line - 1:line + edit.lines_removed] = (
+                [None] * (edit.lines_added + 1)
+            )
+
+            if first is None or line < first:
+                first = line
+            end = line + edit.lines_added
+            if last >= line:
+                last = max(last + edit.lines_added - edit.lines_removed, end)
+            else:
+                last = end
+
+        if first is None:
+            return
+        lines = self.text.get("%s.0" % first, "%s.end" % last).split("\n")
+        for number, content in enumerate(lines, first):
+            if self.line_words[number - 1] is None:
+                words = WORD_REGEX.findall(content)
+                self._add(words)
+                self.line_words[number - 1] = words
+
+    def _remove(self, words):
+        counts = self.counts
+        for word in words:
+            count = counts[word] - 1
+            if count == 0:
+                del counts[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+            else:
+                counts[word] = count
+
+    def build(self):
+        """Index all the text."""
+        self.line_words = [
+            WORD_REGEX.findall(content)
+            for content in self.text.get(1.0, "end-1c").split("\n")
+        ]
+        counts = {}
+        for words in self.line_words:
+            for word in words:
+                counts[word] = counts.get(word, 0) + 1
+        self.counts = counts
+        self.words = sorted(counts)
+        self.built = True
+        _indexes.add(self)
+
+    def close(self):
+        """Stop following the text's edits."""
+        if self._on_edits in self.text.edit_listeners:
+            self.text.edit_listeners.remove(self._on_edits)
+        _indexes.discard(self)
+        self.built = False
+
+    def find(self, prefix, limit=MAX_CANDIDATES):
+        """Return up to LIMIT of the words starting with PREFIX, in order."""
+        if not self.built:
+            self.build()
+        found = []
+        i = bisect.bisect_left(self.words, prefix)
+        while i < len(self.words) and len(found) < limit:
+            word = self.words[i]
+            if not word.startswith(prefix):
+                break
+            found.append(word)
+            i += 1
+        return found
+
+def get_completions(index, prefix):
+    """Return the most used words starting with PREFIX, but not PREFIX itself,
+    from INDEX and, if COMPLETE_FROM_ALL_TEXTS is set, the other built
+    indexes."""
+    indexes = [index]
+    if COMPLETE_FROM_ALL_TEXTS:
+        indexes.extend(other for other in list(_indexes) if other is not index)
+
+    counts = {}
+    for other in indexes:
+        for word in other.find(prefix):
+            if word != prefix:
+                counts[word] = counts.get(word, 0) + other.counts.get(word, 0)
+
+    # The current text's words come first
+    return sorted(
+        counts,
+        key=lambda word: (word not in index.counts, -counts[word], word)
+    )[:MAX_COMPLETIONS]
+
+class CompletionPopup(tkinter.Toplevel):
+    """The list of completions shown under the cursor. Each Tk root has a
+    single popup, which is hidden and shown again instead of being recreated
+    for every keystroke."""
+
+    def __init__(self, *args, **kwargs):
+        tkinter.Toplevel.__init__(self, *args, **kwargs)
+        self.wm_overrideredirect(True)
+        self.withdraw()
+
+        self.listbox = tkinter.Listbox(
+            self,
+            height=8,
+            width=30,
+            activestyle=NONE,
+            exportselection=False,
+            takefocus=False
+        )
+        self.listbox.pack(expand=True, fill=BOTH)
+        self.listbox.bind("<Button-1>", self._on_click)
+
+        # The Completer the popup is showing completions for
+        self.completer = None
+
+    def _on_click(self, event):
+        """Complete with the clicked completion, without taking the focus
+        from the text."""
+        if self.completer is not None:
+            row = self.listbox.nearest(event.y)
+            self.listbox.selection_clear(0, END)
+            self.listbox.selection_set(row)
+            self.completer.accept()
+        return "break"
+
+    def get_selection(self):
+        """Return the selected completion."""
+        selection = self.listbox.curselection()
+        if selection == ():
+            return None
+        return self.listbox.get(selection[0])
+
+    def hide(self):
+        """Hide the popup."""
+        self.withdraw()
+        self.completer = None
+
+    def is_shown(self):
+        return self.completer is not None
+
+    def move(self, offset):
+        """Select the completion OFFSET rows down from the selected one."""
+        selection = self.listbox.curselection()
+        size = self.listbox.size()
+        if size == 0:
+            return
+        row = (selection[0] + offset) % size if selection != () else 0
+        self.listbox.selection_clear(0, END)
+        self.listbox.selection_set(row)
+        self.listbox.see(row)
+
+    def show(self, completer, completions, x, y):
+        """Show COMPLETIONS for COMPLETER at the screen coordinates X, Y."""
+        self.completer = completer
+        self.listbox.delete(0, END)
+        self.listbox.insert(END, *completions)
+        self.listbox.config(height=min(len(completions), 8))
+        self.listbox.selection_set(0)
+        self.wm_geometry("+%s+%s" % (x, y))
+        self.deiconify()
+        self.lift()
+
+def get_popup(widget):
+    """Return the completion popup of WIDGET's Tk root, creating it the first
+    time."""
+    root = widget._root()
+    if root not in _popups:
+        _popups[root] = CompletionPopup(root)
+    return _popups[root]
+
+class Completer:
+    """Word completion for TEXT. Ctrl+Space shows the completions of the word
+    before the cursor, and they are shown by themselves after typing a few
+    letters of a word.
+
+    The keys are bound to a bind tag of our own in front of the text's, so
+    that while the popup is shown they move in it instead of running the
+    text's bindings."""
+
+    # How many letters of a word to type before completions are shown by
+    # themselves
+    AUTO_PREFIX_LENGTH = 3
+
+    def __init__(self, text):
+        self.text = text
+        self.index = TokenIndex(text)
+
+        self.bind_tag = "%s.completion" % text._w
+        self.text.bindtags((self.bind_tag,) + self.text.bindtags())
+        for sequence, func in (
+            ("<Control-space>", self._on_control_space),
+            ("<Down>", lambda event: self._on_popup_key(lambda: self._move(1))),
+            ("<Escape>", lambda event: self._on_popup_key(self.hide)),
+            ("<FocusOut>", lambda event: self.hide()),
+            ("<KeyRelease>", self._on_key_release),
+            ("<Return>", lambda event: self._on_popup_key(self.accept)),
+            ("<Tab>", lambda event: self._on_popup_key(self.accept)),
+            ("<Up>", lambda event: self._on_popup_key(lambda: self._move(-1))),
+        ):
+            self.text.bind_class(self.bind_tag, sequence, func)
+
+    def _get_prefix(self):
+        """Return the part of the word before the cursor."""
+        before = self.text.get("insert linestart", INSERT)
+        match = re.search(r"[^\W\d]\w*$", before)
+        return "" if match is None else match.group()
+
+    def _move(self, offset):
+        get_popup(self.text).move(offset)
+
+    def _on_control_space(self, event=None):
+        self.show(self._get_prefix())
+        return "break"
+
+    def _on_key_release(self, event):
+        """Show or update the completions while a word is typed."""
+        if event.keysym in ("Down", "Escape", "Return", "Tab", "Up"):
+            return
+        prefix = self._get_prefix()
+        typed = event.char != "" and (event.char.isalnum() or event.char == "_")
+        if self.is_shown() or (typed and len(prefix) >= self.AUTO_PREFIX_LENGTH):
+            self.show(prefix)
+
+    def _on_popup_key(self, func):
+        """Run FUNC and stop the key there if the popup is shown, or let the
+        text handle the key otherwise."""
+        if not self.is_shown():
+            return None
+        func()
+        return "break"
+
+    def accept(self):
+        """Complete the word before the cursor with the selected completion."""
+        completion = get_popup(self.text).get_selection()
+        prefix = self._get_prefix()
+        self.hide()
+        if completion is not None and completion.startswith(prefix):
+            self.text.insert(INSERT, completion[len(prefix):])
+            self.text.see(INSERT)
+
+    def close(self):
+        """Stop completing, before the text is destroyed."""
+        self.hide()
+        self.index.close()
+
+    def hide(self):
+        """Hide the popup if it shows our completions."""
+        if self.is_shown():
+            get_popup(self.text).hide()
+
+    def is_shown(self):
+        return get_popup(self.text).completer is self
+
+    def show(self, prefix):
+        """Show the completions of PREFIX under the cursor, or hide the popup
+        if there are none."""
+        completions = get_completions(self.index, prefix) if prefix != "" else []
+        bbox = self.text.bbox(INSERT)
+        if completions == [] or bbox is None:
+            self.hide()
+            return
+        x, y, width, height = bbox
+        get_popup(self.text).show(
+            self,
+            completions,
+            self.text.winfo_rootx() + x,
+            self.text.winfo_rooty() + y + height
+        )
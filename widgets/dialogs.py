@@ -20,10 +20,15 @@
 
 """Application-specific dialogs."""
 
-import json
+import os
+import re
 import tkinter
+from tkinter import ttk
 from tkinter.constants import *
 
+from . import search
+import config
+import filesearch
 from constants import *
 
 class AboutDialog(tkinter.Toplevel):
@@ -37,7 +42,7 @@ class AboutDialog(tkinter.Toplevel):
         self.wm_resizable(False, False)
 
         # The app info
-        self.appinfo = json.load(open(JSON_APPINFO))
+        self.appinfo = config.get().appinfo
 
         # The label for the icon
         self.icon = tkinter.PhotoImage(master=self, file=IMAGE_APPLICATION)
@@ -65,6 +70,181 @@ class AboutDialog(tkinter.Toplevel):
         """Show the dialog."""
         self.mainloop()
 
+class FindInFilesDialog(tkinter.Toplevel):
+    """A dialog for searching all the files in a directory tree."""
+
+    def __init__(self, *args, initialdir=None, className=None, **kwargs):
+        kwargs["class"] = className
+        tkinter.Toplevel.__init__(self, *args, **kwargs)
+        self.wm_geometry("800x500")
+        self.wm_title("Find in Files")
+        self.wm_protocol("WM_DELETE_WINDOW", self.close)
+
+        # The running search, and the number of results listed
+        self.search = None
+        self.result_count = 0
+
+        # The search options
+        self.regex = tkinter.BooleanVar(self, False)
+        self.case = tkinter.BooleanVar(self, False)
+        self.word = tkinter.BooleanVar(self, False)
+
+        if initialdir is None:
+            initialdir = os.getcwd()
+        self._create_window(initialdir)
+
+    def _create_window(self, initialdir):
+        """Create the dialog's widgets."""
+
+        # The options frame
+        self.options_frame = tkinter.Frame(self)
+        self.options_frame.grid(row=0, column=0, columnspan=2, sticky=EW)
+
+        tkinter.Label(self.options_frame, text="Find:").grid(row=0, column=0, sticky=W)
+        self.pattern_entry = tkinter.Entry(self.options_frame)
+        self.pattern_entry.bind("<Return>", self.start)
+        self.pattern_entry.grid(row=0, column=1, columnspan=3, sticky=EW)
+
+        tkinter.Label(self.options_frame, text="In:").grid(row=1, column=0, sticky=W)
+        self.dir_entry = tkinter.Entry(self.options_frame)
+        self.dir_entry.insert(0, initialdir)
+        self.dir_entry.bind("<Return>", self.start)
+        self.dir_entry.grid(row=1, column=1, columnspan=3, sticky=EW)
+
+        for column, (label, variable) in enumerate((
+            ("Regex", self.regex),
+            ("Case", self.case),
+            ("Word", self.word)
+        )):
+            tkinter.Checkbutton(
+                self.options_frame,
+                text=label,
+                variable=variable
+            ).grid(row=2, column=1 + column, sticky=W)
+
+        self.search_button = tkinter.Button(self.options_frame, text="Search", command=self.start)
+        self.search_button.grid(row=0, column=4, sticky=EW)
+        self.stop_button = tkinter.Button(self.options_frame, text="Stop", command=self.stop)
+        self.stop_button.grid(row=1, column=4, sticky=EW)
+
+        self.options_frame.columnconfigure(3, weight=1)
+
+        # The results
+        self.scrollbar = tkinter.Scrollbar(self)
+        self.scrollbar.grid(row=1, column=1, sticky=NS)
+        self.results_tree = ttk.Treeview(
+            self,
+            columns=("line", "text", "path"),
+            displaycolumns=("line", "text"),
+            yscrollcommand=self.scrollbar.set
+        )
+        self.results_tree.heading("#0", text="File")
+        self.results_tree.column("#0", anchor=W, minwidth=200)
+        self.results_tree.heading("line", text="Line")
+        self.results_tree.column("line", anchor=W, width=60, stretch=False)
+        self.results_tree.heading("text", text="Text")
+        self.results_tree.column("text", anchor=W, minwidth=300)
+        self.results_tree.bind("<Double-Button-1>", self._on_result_click)
+        self.results_tree.bind("<Return>", self._on_result_click)
+        self.results_tree.grid(row=1, column=0, sticky=NSEW)
+        self.scrollbar.config(command=self.results_tree.yview)
+
+        # The status label
+        self.status_label = tkinter.Label(self, text="", anchor=W)
+        self.status_label.grid(row=2, column=0, columnspan=2, sticky=EW)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        self.pattern_entry.focus_set()
+
+    def _on_result_click(self, event=None):
+        """Open the file of the selected result at the result's line."""
+        selection = self.results_tree.selection()
+        if selection == ():
+            return
+        item = self.results_tree.item(selection[0])
+        self.open_func(str(item["values"][2]), int(item["values"][0]))
+
+    def _poll(self):
+        """Add the new results to the list and update the status."""
+        if self.search is None:
+            return
+        for path, line, text in self.search.poll():
+            self.results_tree.insert(
+                "",
+                END,
+                text=os.path.relpath(path, self.search.root),
+                values=(line, text, path)
+            )
+            self.result_count += 1
+
+        count = self.result_count
+        if self.search.done:
+            self.status_label.config(
+                text="%s matches in %s files" % (count, self.search.files_searched)
+            )
+            self.search = None
+        else:
+            self.status_label.config(
+                text="%s matches, searched %s of %s files..." % (
+                    count,
+                    self.search.files_searched,
+                    self.search.files_found
+                )
+            )
+            self.after(50, self._poll)
+
+    def bind_open(self, func):
+        """Bind the opening of a result to a call of FUNC with the result's file
+        and line number."""
+        self.open_func = func
+
+    def close(self, event=None):
+        """Stop searching and close the dialog."""
+        self.stop()
+        self.destroy()
+
+    def start(self, event=None):
+        """Start a new search."""
+        self.stop()
+        self.results_tree.delete(*self.results_tree.get_children())
+        self.result_count = 0
+
+        pattern = self.pattern_entry.get()
+        root = os.path.expanduser(self.dir_entry.get())
+        if pattern == "" or not os.path.isdir(root):
+            self.status_label.config(text="Enter a pattern and an existing directory.")
+            return
+        try:
+            regex = search.compile_pattern(
+                pattern,
+                regex=self.regex.get(),
+                case=self.case.get(),
+                word=self.word.get()
+            )
+        except re.error as e:
+            self.status_label.config(text="Invalid pattern: %s" % e)
+            return
+
+        self.search = filesearch.FileSearch(
+            root,
+            regex,
+            literal=not self.regex.get() and not self.word.get()
+        )
+        self._poll()
+
+    def stop(self, event=None):
+        """Cancel the running search."""
+        if self.search is not None:
+            self.search.cancel()
+            self.search = None
+            self.status_label.config(text="Stopped.")
+
+    # Placeholders for unbound methods
+    def open_func(self, file, line):
+        pass
+
 if __name__ == "__main__":
     __name__ = 2
     w = tkinter.Tk()
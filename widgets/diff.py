@@ -0,0 +1,107 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Line diffs between a text widget's contents and a new version of them."""
+
+import difflib
+
+# Changed regions with more lines than this are replaced as a whole instead of
+# being diffed, since difflib gets slow on them
+MAX_DIFF_LINES = 20000
+
+class LineDiff:
+    """The line-level differences between the strings OLD and NEW."""
+
+    def __init__(self, old, new):
+        self.old_lines = old.split("\n")
+        self.new_lines = new.split("\n")
+        old_count = len(self.old_lines)
+        new_count = len(self.new_lines)
+
+        # Skip the common lines at the start and end, which is usually almost
+        # all of them
+        prefix = 0
+        limit = min(old_count, new_count)
+        while prefix < limit and self.old_lines[prefix] == self.new_lines[prefix]:
+            prefix += 1
+        suffix = 0
+        limit -= prefix
+        while (suffix < limit and
+            self.old_lines[old_count - suffix - 1] == self.new_lines[new_count - suffix - 1]):
+            suffix += 1
+
+        # The (old start, old end, new start, new end) line ranges, counted
+        # from 0, of the changed regions
+        self.hunks = []
+        old_end = old_count - suffix
+        new_end = new_count - suffix
+        if prefix == old_end and prefix == new_end:
+            return
+        if max(old_end, new_end) - prefix > MAX_DIFF_LINES:
+            self.hunks.append((prefix, old_end, prefix, new_end))
+            return
+        matcher = difflib.SequenceMatcher(
+            None,
+            self.old_lines[prefix:old_end],
+            self.new_lines[prefix:new_end],
+            autojunk=False
+        )
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != "equal":
+                self.hunks.append((prefix + i1, prefix + i2, prefix + j1, prefix + j2))
+
+    def get_edits(self):
+        """Return the list of (start, end, chars) edits, for Text.apply_edits,
+        that turn the old text into the new one, from the end backwards."""
+        old_count = len(self.old_lines)
+        edits = []
+        for i1, i2, j1, j2 in reversed(self.hunks):
+            lines = "\n".join(self.new_lines[j1:j2])
+            if i1 == i2:
+                # Inserted lines
+                if i1 < old_count:
+                    edits.append(("%s.0" % (i1 + 1), None, lines + "\n"))
+                else:
+                    edits.append(("%s.end" % old_count, None, "\n" + lines))
+            elif j1 == j2:
+                # Deleted lines, with the newline after them, or before them
+                # at the end of the text
+                if i2 < old_count:
+                    edits.append(("%s.0" % (i1 + 1), "%s.0" % (i2 + 1), ""))
+                elif i1 > 0:
+                    edits.append(("%s.end" % i1, "%s.end" % i2, ""))
+                else:
+                    edits.append(("1.0", "%s.end" % i2, ""))
+            else:
+                edits.append(("%s.0" % (i1 + 1), "%s.end" % i2, lines))
+        return edits
+
+    def map_line(self, line):
+        """Return the line of the new text where the old LINE, counted from 1,
+        ended up."""
+        offset = 0
+        for i1, i2, j1, j2 in self.hunks:
+            if line - 1 < i1:
+                break
+            if line - 1 < i2:
+                # The line was changed, so stay in the same place in the hunk
+                return min(j1 + line - 1 - i1, max(j1, j2 - 1)) + 1
+            offset += (j2 - j1) - (i2 - i1)
+        return line + offset
@@ -0,0 +1,484 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Code folding for Python, from the positions of the statements that span
+several lines."""
+
+import ast
+import re
+import time
+import tkinter
+from tkinter.constants import *
+
+import settings
+
+# How long to wait after an edit before reparsing the text, in milliseconds
+FOLD_DELAY = 500
+
+# About how many lines to parse at a time, and the most lines to parse at
+# once when a part of the text has syntax errors and is widened to parse it
+# with the code around it
+PARSE_CHUNK_LINES = 200
+PARSE_MAX_LINES = 5000
+
+# How many lines to get from the text at a time while looking for the start
+# of a top-level statement
+BOUNDARY_SCAN_LINES = 200
+
+# A line that may start a top-level statement: code at the first column that
+# doesn't continue the statement before it
+BOUNDARY_REGEX = re.compile(r"(?!(?:else|elif|except|finally)\b)[^\s#)\]}]")
+
+class IntervalTree:
+    """A centered interval tree of (start, end) line intervals, answering which
+    intervals contain a line or overlap a range of lines without looking at
+    all of them."""
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(set(intervals))
+
+        # The largest end of the intervals starting on each line
+        self.starts = {}
+        for start, end in self.intervals:
+            self.starts[start] = max(end, self.starts.get(start, end))
+
+        self.root = self._build(self.intervals)
+
+    def _build(self, intervals):
+        """Return the (center, intervals by start, intervals by end, left,
+        right) node of INTERVALS, which are sorted by start."""
+        if intervals == []:
+            return None
+        center = intervals[len(intervals) // 2][0]
+        left = []
+        right = []
+        here = []
+        for interval in intervals:
+            if interval[1] < center:
+                left.append(interval)
+            elif interval[0] > center:
+                right.append(interval)
+            else:
+                here.append(interval)
+        return (
+            center,
+            here,
+            sorted(here, key=lambda interval: interval[1], reverse=True),
+            self._build(left),
+            self._build(right)
+        )
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def at(self, line):
+        """Return the list of intervals containing LINE."""
+        found = []
+        node = self.root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if line < center:
+                for interval in by_start:
+                    if interval[0] > line:
+                        break
+                    found.append(interval)
+                node = left
+            elif line > center:
+                for interval in by_end:
+                    if interval[1] < line:
+                        break
+                    found.append(interval)
+                node = right
+            else:
+                found.extend(by_start)
+                break
+        return found
+
+    def overlapping(self, first, last):
+        """Return the list of intervals overlapping the lines FIRST to LAST."""
+        found = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            center, by_start, by_end, left, right = node
+            for interval in by_start:
+                if interval[0] > last:
+                    break
+                if interval[1] >= first:
+                    found.append(interval)
+            if first < center:
+                stack.append(left)
+            if last > center:
+                stack.append(right)
+        return found
+
+    def shifted(self, line, removed, added):
+        """Return a new tree with the intervals moved for an edit on LINE that
+        removed REMOVED lines after it and added ADDED lines."""
+        def move(position):
+            if position <= line:
+                return position
+            if position > line + removed:
+                return position + added - removed
+            return line
+        intervals = []
+        for start, end in self.intervals:
+            start = move(start)
+            end = move(end)
+            if end > start:
+                intervals.append((start, end))
+        return IntervalTree(intervals)
+
+def get_fold_ranges(source):
+    """Return the (first line, last line) ranges of the statements of the
+    Python SOURCE that span several lines. Raise SyntaxError or ValueError if
+    it can't be parsed."""
+    ranges = []
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.stmt) and node.end_lineno > node.lineno:
+            ranges.append((node.lineno, node.end_lineno))
+    return ranges
+
+def get_blocks(source, offset=0):
+    """Return the [first line, last line, tree] blocks of the top-level
+    statements of the Python SOURCE, whose first line is line OFFSET + 1 of
+    the text. The tree is an IntervalTree of the statement's fold regions,
+    counted from its first line, or None if it has none. Raise SyntaxError
+    or ValueError if SOURCE can't be parsed."""
+    blocks = []
+    for statement in ast.parse(source).body:
+        first = statement.lineno
+        for decorator in getattr(statement, "decorator_list", ()):
+            first = min(first, decorator.lineno)
+        ranges = [
+            (node.lineno - first, node.end_lineno - first)
+            for node in ast.walk(statement)
+            if isinstance(node, ast.stmt) and node.end_lineno > node.lineno
+        ]
+        blocks.append([
+            first + offset,
+            statement.end_lineno + offset,
+            IntervalTree(ranges) if ranges != [] else None
+        ])
+    return blocks
+
+class Folding:
+    """The fold regions of the Python code in TEXT, with folded lines hidden
+    with the elided "folded" tag.
+
+    The regions are kept in a block for each top-level statement, in an
+    IntervalTree counted from the block's first line, so that edits only
+    move the blocks after them. Those moves are kept as a single pending
+    shift of all the blocks from one on, which is only applied to the blocks
+    between it and the next edit. Once the user stops typing, only the
+    top-level statements around the edited lines are parsed again, a
+    time-limited chunk at a time. While they have syntax errors, their old
+    regions are kept."""
+
+    def __init__(self, text):
+        self.text = text
+
+        # The [first line, last line, tree] blocks of the top-level
+        # statements in order, and the number of lines to add to the lines
+        # of the blocks from SHIFT_FROM on
+        self.blocks = []
+        self.shift = 0
+        self.shift_from = 0
+
+        # The first and last lines to parse, or None
+        self.dirty = (1, self._get_line_count())
+        self._after = None
+
+        self.text.tag_config("folded", elide=True)
+        self.text.add_edit_listener(self._on_edits)
+        self._after = self.text.after_idle(self._run_parse)
+
+    def _bisect(self, line):
+        """Return the number of blocks starting on or before LINE."""
+        low = 0
+        high = len(self.blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if self._get_first(middle) <= line:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find_boundary(self, line):
+        """Return the first line from LINE on that may start a top-level
+        statement, or the line after the last one if there is none."""
+        last_line = self._get_line_count()
+        while line <= last_line:
+            end = min(line + BOUNDARY_SCAN_LINES - 1, last_line)
+            contents = self.text.get("%s.0" % line, "%s.end" % end).split("\n")
+            for number, content in enumerate(contents, line):
+                if BOUNDARY_REGEX.match(content):
+                    return number
+            line = end + 1
+        return last_line + 1
+
+    def _get_block(self, line):
+        """Return the first line and the tree of the block containing LINE,
+        or None."""
+        i = self._bisect(line) - 1
+        if i < 0 or self._get_last(i) < line:
+            return None
+        return self._get_first(i), self.blocks[i][2]
+
+    def _get_first(self, i):
+        """Return the first line of the block number I."""
+        if i >= self.shift_from:
+            return self.blocks[i][0] + self.shift
+        return self.blocks[i][0]
+
+    def _get_last(self, i):
+        """Return the last line of the block number I."""
+        if i >= self.shift_from:
+            return self.blocks[i][1] + self.shift
+        return self.blocks[i][1]
+
+    def _get_line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _get_region_start(self, line):
+        """Return the first line of the block containing LINE, or LINE if it
+        is between blocks."""
+        i = self._bisect(line) - 1
+        if i >= 0 and self._get_last(i) >= line:
+            return self._get_first(i)
+        return line
+
+    def _move_shift(self, index):
+        """Make the pending shift start at the block number INDEX, applying
+        it to the blocks between its old start and INDEX."""
+        if self.shift != 0:
+            if index > self.shift_from:
+                for block in self.blocks[self.shift_from:index]:
+                    block[0] += self.shift
+                    block[1] += self.shift
+            else:
+                for block in self.blocks[index:self.shift_from]:
+                    block[0] -= self.shift
+                    block[1] -= self.shift
+        self.shift_from = index
+
+    def _on_edits(self, edits):
+        """Move the blocks after EDITS, and mark their lines for parsing."""
+        for edit in edits:
+            line = edit.line
+            removed = edit.lines_removed
+            added = edit.lines_added
+            end = line + added
+
+            if removed != 0 or added != 0:
+                # Drop the blocks that started on removed lines, parsing the
+                # rest of their lines again, and shift the ones after the
+                # edit
+                i = self._bisect(line)
+                j = self._bisect(line + removed)
+                if j > i:
+                    end = max(end, self._get_last(j - 1) + added - removed)
+                self._move_shift(i)
+                del self.blocks[i:j]
+                self.shift += added - removed
+
+                # Move the regions of the block containing the edit
+                if i > 0 and self.blocks[i - 1][1] >= line:
+                    block = self.blocks[i - 1]
+                    if block[1] > line + removed:
+                        block[1] += added - removed
+                    else:
+                        block[1] = max(line, block[1] - removed + added)
+                    if block[2] is not None:
+                        block[2] = block[2].shifted(
+                            line - block[0],
+                            removed,
+                            added
+                        )
+
+            # Keep the lines to parse in one range, moved by the edits after
+            # it
+            if self.dirty is None:
+                self.dirty = (line, end)
+            else:
+                first, last = self.dirty
+                if last >= line:
+                    last = max(last + added - removed, end)
+                else:
+                    last = end
+                self.dirty = (min(first, line), last)
+
+        # Parse once the user stops typing
+        if self._after is not None:
+            self.text.after_cancel(self._after)
+        self._after = self.text.after(FOLD_DELAY, self._run_parse)
+
+    def _parse(self, budget):
+        """Parse the dirty lines for about BUDGET seconds. Return True if
+        they are all parsed, or can't be parsed until the next edit."""
+        deadline = time.perf_counter() + budget
+        blocks = []
+        while self.dirty is not None:
+            first, last = self.dirty
+            last_line = self._get_line_count()
+            start = self._get_region_start(first)
+            if start > last_line:
+                self.dirty = None
+                break
+
+            # Parse from the start of the first dirty statement to the start
+            # of a statement after the dirty lines, or a chunk of them,
+            # widening the part on syntax errors since the statements may
+            # only be complete with the code around them
+            target = min(last, start + PARSE_CHUNK_LINES - 1)
+            while True:
+                end = self._find_boundary(max(target, start) + 1) - 1
+                try:
+                    blocks = get_blocks(
+                        self.text.get("%s.0" % start, "%s.end" % end),
+                        start - 1
+                    )
+                    break
+                except (SyntaxError, ValueError):
+                    blocks = None
+                if end - start >= PARSE_MAX_LINES:
+                    break
+                if start == 1 and end >= last_line:
+                    break
+                i = self._bisect(start - 1) - 1
+                start = self._get_first(i) if i >= 0 else 1
+                target = end + max(PARSE_CHUNK_LINES, end - start)
+
+            # Keep the old blocks if the lines can't be parsed, and try
+            # again with the lines of the next edit
+            if blocks is None:
+                break
+
+            # Put the new blocks in the place of the old ones, and parse the
+            # rest of an old block that went past them
+            i = self._bisect(start - 1)
+            j = self._bisect(end)
+            if j > i:
+                last = max(last, self._get_last(j - 1))
+            self._move_shift(j)
+            self.blocks[i:j] = blocks
+            self.shift_from += len(blocks) - (j - i)
+            if end >= last:
+                self.dirty = None
+            else:
+                self.dirty = (end + 1, last)
+            if time.perf_counter() > deadline:
+                break
+        return self.dirty is None or blocks is None
+
+    def _run_parse(self):
+        self._after = None
+        try:
+            if not self._parse(settings.get()["performance"]["fold_budget"]):
+                self._after = self.text.after(1, self._run_parse)
+            self.text.line_numbers.redraw()
+        except tkinter.TclError:
+            # The text was destroyed
+            pass
+
+    def fold(self, line):
+        """Hide the lines of the fold region starting on LINE, except for the
+        first one."""
+        last = self.get_fold_end(line)
+        if last is None:
+            return
+        start = "%s.0" % (line + 1)
+        end = "%s.0" % (last + 1)
+        self.text.tag_add("folded", start, end)
+
+        # Keep the cursor out of the hidden lines
+        if self.text.compare(INSERT, ">=", start) and self.text.compare(INSERT, "<", end):
+            self.text.mark_set(INSERT, "%s.end" % line)
+        self.text.line_numbers.redraw()
+
+    def fold_at(self, line):
+        """Fold the innermost fold region containing LINE."""
+        regions = self.get_regions_at(line)
+        if regions != []:
+            self.fold(max(regions)[0])
+
+    def get_fold_end(self, line):
+        """Return the last line of the fold region starting on LINE, or None
+        if no region starts on it."""
+        block = self._get_block(line)
+        if block is None or block[1] is None:
+            return None
+        first, tree = block
+        end = tree.starts.get(line - first)
+        if end is None:
+            return None
+        return first + end
+
+    def get_regions_at(self, line):
+        """Return the list of the (first line, last line) fold regions
+        containing LINE."""
+        block = self._get_block(line)
+        if block is None or block[1] is None:
+            return []
+        first, tree = block
+        return [
+            (first + start, first + end)
+            for start, end in tree.at(line - first)
+        ]
+
+    def is_folded(self, line):
+        """Return True if the fold region starting on LINE is folded."""
+        return "folded" in self.text.tag_names("%s.0" % (line + 1))
+
+    def stop(self):
+        """Stop folding, and show all the folded lines."""
+        if self._after is not None:
+            self.text.after_cancel(self._after)
+            self._after = None
+        self.text.edit_listeners.remove(self._on_edits)
+        self.text.tag_remove("folded", 1.0, END)
+
+    def toggle(self, line):
+        """Fold or unfold the fold region starting on LINE."""
+        if self.is_folded(line):
+            self.unfold(line)
+        else:
+            self.fold(line)
+
+    def unfold(self, line):
+        """Show the lines of the fold region starting on LINE."""
+        last = self.get_fold_end(line)
+        if last is None:
+            return
+        self.text.tag_remove(
+            "folded",
+            "%s.0" % (line + 1),
+            "%s.0" % (last + 1)
+        )
+        self.text.line_numbers.redraw()
+
+    def unfold_at(self, line):
+        """Unfold the fold regions starting on or containing LINE."""
+        for start, end in self.get_regions_at(line):
+            if self.is_folded(start):
+                self.unfold(start)
@@ -0,0 +1,155 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Automatic indentation of new lines, and detecting the indentation width a
+file uses, both worked out from the text's cached line information."""
+
+import collections
+import re
+
+from . import lineinfo
+from . import syntax_highlighting
+
+# The Python keywords that end a block, so that the line after them is
+# dedented
+DEDENT_KEYWORDS = frozenset(("break", "continue", "pass", "raise", "return"))
+
+# The first word of a line
+WORD_REGEX = re.compile(r"[^\W\d]\w*")
+
+# How many parts of the text are sampled to detect it's indentation, and how
+# many lines each part has
+DETECT_SAMPLES = 4
+DETECT_SAMPLE_LINES = 250
+
+# The indentation widths that can be detected
+DETECT_WIDTHS = range(2, 9)
+
+def _make_indent(width, tabwidth, tabs):
+    """Return the whitespace for an indentation WIDTH columns wide, with tabs
+    TABWIDTH wide if TABS is True."""
+    width = max(0, width)
+    if tabs:
+        return "\t" * (width // tabwidth) + " " * (width % tabwidth)
+    return " " * width
+
+def _get_code(text, line, content):
+    """Return CONTENT, the start of LINE, without it's comment if text is
+    highlighted as Python."""
+    syntax = text.syntax
+    if text.language != "python" or syntax is None or len(syntax.states) < line:
+        return content
+    state = syntax.states[line - 1]
+    if state is syntax_highlighting.UNKNOWN:
+        state = syntax.lexer.initial_state
+    tokens, state = syntax.lexer.tokenize(content, state)
+    for start, end, kind in tokens:
+        if kind == "comment":
+            return content[:start]
+    return content
+
+def get_new_line_indent(text, line, column):
+    """Return the whitespace to start a line split off LINE of TEXT at COLUMN
+    with.
+
+    The indentation of the line is kept, or the one of the line with the
+    opening bracket if the line closes brackets opened before it. Lines in
+    open brackets, and after a colon in Python, get one more level, and lines
+    after a Python statement ending a block get one less."""
+    info = text.line_info.get(line)
+    tabwidth = text.tabwidth
+    leading = info.leading[:column]
+    tabs = "\t" in leading
+
+    # The depth of the brackets before the cursor, and the closing bracket
+    # that matches the earliest opening one before the line
+    depth = 0
+    lowest = 0
+    unmatched = None
+    for bracket_column, bracket in info.brackets:
+        if bracket_column >= column:
+            break
+        depth += 1 if bracket in lineinfo.OPENING else -1
+        if depth < lowest:
+            lowest = depth
+            unmatched = bracket_column
+    if unmatched is not None:
+        match = text.brackets.find_opening(line, unmatched)
+        if match is not None:
+            leading = text.line_info.get(match[0]).leading
+    width = lineinfo.get_indent_width(leading, tabwidth)
+
+    if depth > lowest:
+        return _make_indent(width + tabwidth, tabwidth, tabs)
+    if text.language == "python" and column > len(info.leading):
+        content = text.get("%s.0" % line, "%s.%s" % (line, column))
+        code = _get_code(text, line, content).strip()
+        if code.endswith(":"):
+            width += tabwidth
+        else:
+            word = WORD_REGEX.match(code)
+            if word is not None and word.group() in DEDENT_KEYWORDS:
+                width -= tabwidth
+    return _make_indent(width, tabwidth, tabs)
+
+def detect_indent_width(text):
+    """Return the indentation width that most indented lines of TEXT step up
+    by, or None if it is indented with tabs or can't be told.
+
+    Only DETECT_SAMPLES parts of DETECT_SAMPLE_LINES lines, spread over the
+    text, are looked at, so that big files are as quick as small ones."""
+    line_info = text.line_info
+    line_count = line_info.get_line_count()
+    if line_count <= DETECT_SAMPLES * DETECT_SAMPLE_LINES:
+        starts = [1]
+        sample_lines = line_count
+    else:
+        step = line_count // DETECT_SAMPLES
+        starts = [1 + step * i for i in range(DETECT_SAMPLES)]
+        sample_lines = DETECT_SAMPLE_LINES
+
+    steps = collections.Counter()
+    tab_lines = 0
+    space_lines = 0
+    for first in starts:
+        last = min(first + sample_lines - 1, line_count)
+        line_info.fill(first, last)
+
+        # Count the widths by which each line is indented more than the one
+        # before it, leaving out the blank lines and the lines in brackets
+        previous = 0
+        depth = 0
+        for info in line_info.lines[first - 1:last]:
+            if info.blank:
+                continue
+            if info.leading.startswith("\t"):
+                tab_lines += 1
+            elif info.leading != "":
+                space_lines += 1
+            if depth <= 0:
+                width = len(info.leading)
+                if width - previous in DETECT_WIDTHS and "\t" not in info.leading:
+                    steps[width - previous] += 1
+                previous = width
+            depth = max(0, depth + info.net)
+
+    if tab_lines > space_lines or steps == {}:
+        return None
+    return steps.most_common(1)[0][0]
@@ -0,0 +1,168 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The registry of the lexers used for syntax highlighting, chosen by a file's
+extension or shebang. Each lexer lives in it's own module of this package,
+which is only imported once a file in it's language is opened. Plain text has
+no lexer, so it isn't highlighted at all."""
+
+import importlib
+import os
+import re
+
+# The lexer module of each file extension, None meaning plain text
+EXTENSIONS = {
+    ".py": "python",
+    ".pyw": "python",
+    ".json": "json",
+    ".tcl": "tcl",
+    ".tk": "tcl",
+    ".sh": "shell",
+    ".bash": "shell",
+    ".txt": None,
+    ".log": None,
+    ".md": None,
+}
+
+# The lexer module of each interpreter named in a shebang
+SHEBANGS = {
+    "python": "python",
+    "python3": "python",
+    "tclsh": "tcl",
+    "wish": "tcl",
+    "sh": "shell",
+    "bash": "shell",
+    "dash": "shell",
+    "zsh": "shell",
+}
+
+# The version at the end of an interpreter's name, like in python3.11
+VERSION_REGEX = re.compile(r"[\d.]+$")
+
+# The lexer instances, created the first time they are needed
+_lexers = {}
+
+class RegexLexer:
+    """A lexer splitting lines into tokens with regular expressions.
+
+    RULES is a list of (kind, start pattern, end pattern) tuples, tried in
+    order at each position. The patterns must not have capturing groups. A
+    rule with an end pattern starts a token that may span several lines: the
+    end pattern is matched right after the start, and if it doesn't match
+    before the end of the line, the token goes on on the next line. The lexer
+    state of a line is then the number of that rule, and None otherwise.
+    Tokens of the kind "name" are looked up in KEYWORDS and BUILTINS."""
+
+    rules = ()
+    keywords = frozenset()
+    builtins = frozenset()
+
+    # The state at the start of the text
+    initial_state = None
+
+    def __init__(self):
+        self.regex = re.compile("|".join("(%s)" % start for kind, start, end in self.rules))
+        self.ends = [
+            None if end is None else re.compile(end) for kind, start, end in self.rules
+        ]
+
+    def classify(self, word):
+        """Return the kind of the name WORD, or None if it isn't highlighted."""
+        if word in self.keywords:
+            return "keyword"
+        if word in self.builtins:
+            return "builtin"
+        return None
+
+    def tokenize(self, line, state):
+        """Return the list of (start column, end column, kind) tokens of LINE,
+        which starts in STATE, and the state at the end of it."""
+        tokens = []
+        position = 0
+
+        # Finish the token left unfinished by the previous line
+        if state is not None:
+            kind = self.rules[state][0]
+            match = self.ends[state].match(line)
+            if match is None:
+                if line != "":
+                    tokens.append((0, len(line), kind))
+                return tokens, state
+            tokens.append((0, match.end(), kind))
+            position = match.end()
+
+        while True:
+            match = self.regex.search(line, position)
+            if match is None:
+                return tokens, None
+            rule = match.lastindex - 1
+            kind = self.rules[rule][0]
+            start, end = match.span()
+
+            # Tokens that may span several lines
+            if self.ends[rule] is not None:
+                end_match = self.ends[rule].match(line, end)
+                if end_match is None:
+                    tokens.append((start, len(line), kind))
+                    return tokens, rule
+                end = end_match.end()
+
+            if kind == "name":
+                kind = self.classify(line[start:end])
+            if kind is not None:
+                tokens.append((start, end, kind))
+            position = max(end, start + 1)
+
+def get_language(file, first_line=""):
+    """Return the name of the lexer for FILE, whose first line is FIRST_LINE,
+    or None if it is plain text."""
+    extension = os.path.splitext(file)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+
+    # Use the interpreter of a "#!/usr/bin/env python3" style shebang
+    if first_line.startswith("#!"):
+        words = first_line[2:].split()
+        if words != [] and os.path.basename(words[0]) == "env":
+            words = [w for w in words[1:] if not w.startswith("-")]
+        if words != []:
+            name = os.path.basename(words[0])
+            if name in SHEBANGS:
+                return SHEBANGS[name]
+            return SHEBANGS.get(VERSION_REGEX.sub("", name))
+    return None
+
+def get_lexer(language):
+    """Return the shared lexer of LANGUAGE, importing it if needed, or None
+    if LANGUAGE is None."""
+    if language is None:
+        return None
+    if language not in _lexers:
+        module = importlib.import_module("." + language, __name__)
+        _lexers[language] = module.Lexer()
+    return _lexers[language]
+
+def register(language, extensions=(), shebangs=()):
+    """Use the lexer module LANGUAGE of this package for files with
+    EXTENSIONS and for scripts run by the SHEBANGS interpreters."""
+    for extension in extensions:
+        EXTENSIONS[extension] = language
+    for shebang in shebangs:
+        SHEBANGS[shebang] = language
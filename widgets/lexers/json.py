@@ -0,0 +1,34 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The JSON lexer."""
+
+from . import RegexLexer
+
+class Lexer(RegexLexer):
+    """JSON documents."""
+
+    rules = (
+        ("key", r'"(?:\\.|[^"\\])*"(?=\s*:)', None),
+        ("string", r'"(?:\\.|[^"\\])*"?', None),
+        ("number", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?", None),
+        ("name", r"[A-Za-z_]\w*", None),
+    )
+    keywords = frozenset(("true", "false", "null"))
@@ -0,0 +1,44 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The Python lexer."""
+
+import builtins
+import keyword
+
+from . import RegexLexer
+
+class Lexer(RegexLexer):
+    """Python 3 source code."""
+
+    rules = (
+        ("comment", r"#.*", None),
+        ("string", r'(?i:[rbuf]{0,2})"""', r'(?:\\.|[^\\])*?"""'),
+        ("string", r"(?i:[rbuf]{0,2})'''", r"(?:\\.|[^\\])*?'''"),
+        ("string", r'(?i:[rbuf]{0,2})"(?:\\.|[^"\\])*"?', None),
+        ("string", r"(?i:[rbuf]{0,2})'(?:\\.|[^'\\])*'?", None),
+        ("decorator", r"@[^\W\d][\w.]*", None),
+        ("number", r"\b(?:0[xX][\da-fA-F_]+|0[bB][01_]+|0[oO][0-7_]+|\d[\d_]*\.?[\d_]*(?:[eE][+-]?\d+)?[jJ]?)|(?<![\w.])\.\d[\d_]*(?:[eE][+-]?\d+)?[jJ]?", None),
+        ("name", r"[^\W\d]\w*", None),
+    )
+    keywords = frozenset(keyword.kwlist)
+    builtins = frozenset(
+        name for name in dir(builtins) if not name.startswith("_")
+    ) - keywords
@@ -0,0 +1,165 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""A cache of what the features working on lines need to know about each line:
+it's indentation and the brackets in it's code."""
+
+import collections
+import re
+
+from . import syntax_highlighting
+
+# The opening and closing brackets
+OPENING = "([{"
+CLOSING = ")]}"
+BRACKETS_REGEX = re.compile(r"[()\[\]{}]")
+
+# The kinds of tokens that brackets in don't count
+IGNORED_KINDS = ("comment", "string")
+
+# How many lines to get from the text widget at a time
+FILL_CHUNK_LINES = 200
+
+class Line(collections.namedtuple("Line", (
+    "state", "leading", "blank", "brackets", "net", "min_prefix", "min_suffix"
+))):
+    """What is known about a line: the lexer STATE it was worked out with, the
+    whitespace LEADING it, whether it is BLANK, the (column, bracket) of it's
+    BRACKETS, the NET change in bracket depth over it, and the lowest changes
+    in depth from it's start forwards, MIN_PREFIX, and from it's end
+    backwards with the brackets swapped, MIN_SUFFIX. The last two let bracket
+    matching skip the lines that can't have the match."""
+
+    __slots__ = ()
+
+def get_indent_width(leading, tabwidth):
+    """Return the width in columns of the whitespace LEADING, with tabs
+    TABWIDTH wide."""
+    width = 0
+    for char in leading:
+        if char == "\t":
+            width += tabwidth - width % tabwidth
+        else:
+            width += 1
+    return width
+
+def _make_line(content, state, lexer):
+    """Return the Line of CONTENT, lexed with LEXER from STATE if LEXER isn't
+    None."""
+    stripped = content.lstrip(" \t")
+    leading = content[:len(content) - len(stripped)]
+
+    brackets = []
+    if "(" in content or ")" in content or "[" in content or "]" in content or "{" in content or "}" in content:
+        ignored = []
+        if lexer is not None:
+            tokens, end_state = lexer.tokenize(content, state)
+            ignored = [(start, end) for start, end, kind in tokens if kind in IGNORED_KINDS]
+        for match in BRACKETS_REGEX.finditer(content):
+            column = match.start()
+            if not any(start <= column < end for start, end in ignored):
+                brackets.append((column, match.group()))
+
+    depth = 0
+    min_prefix = 0
+    for column, bracket in brackets:
+        depth += 1 if bracket in OPENING else -1
+        min_prefix = min(min_prefix, depth)
+    suffix = 0
+    min_suffix = 0
+    for column, bracket in reversed(brackets):
+        suffix += 1 if bracket in CLOSING else -1
+        min_suffix = min(min_suffix, suffix)
+    return Line(state, leading, stripped == "", tuple(brackets), depth, min_prefix, min_suffix)
+
+class LineInfo:
+    """The Line of each line of TEXT, worked out when it's first needed and
+    kept until an edit changes the line, or the highlighter finds that it
+    starts in a different lexer state."""
+
+    def __init__(self, text):
+        self.text = text
+        self.lines = []
+
+        # A count of the edits, to tell when the lines may have changed
+        self.version = 0
+
+        self._reset()
+        self.text.add_edit_listener(self._on_edits)
+
+    def _get_line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _get_state(self, line):
+        """Return the lexer state at the start of LINE and the lexer, or
+        (None, None) if the text isn't highlighted."""
+        syntax = self.text.syntax
+        if syntax is None or len(syntax.states) != len(self.lines):
+            return None, None
+        return syntax.states[line - 1], syntax.lexer
+
+    def _on_edits(self, edits):
+        """Forget the lines changed by EDITS."""
+        for edit in edits:
+            line = edit.line
+            del self.lines[line:line + edit.lines_removed]
+            self.lines[line:line] = [None] * edit.lines_added
+            if line <= len(self.lines):
+                self.lines[line - 1] = None
+        self.version += 1
+
+    def _reset(self):
+        self.lines = [None] * self._get_line_count()
+
+    def fill(self, first, last):
+        """Work out the lines FIRST to LAST that aren't known, getting their
+        text in chunks instead of a line at a time."""
+        if len(self.lines) != self._get_line_count():
+            self._reset()
+        first = max(1, first)
+        last = min(last, len(self.lines))
+        while first <= last:
+            chunk_end = min(first + FILL_CHUNK_LINES - 1, last)
+            stale = []
+            for line in range(first, chunk_end + 1):
+                state, lexer = self._get_state(line)
+                known = self.lines[line - 1]
+                if known is None or known.state != state:
+                    stale.append(line)
+            if stale != []:
+                contents = self.text.get("%s.0" % stale[0], "%s.end" % stale[-1]).split("\n")
+                limit = self.text.highlight_column_limit
+                for line in stale:
+                    content = contents[line - stale[0]]
+                    if limit is not None:
+                        content = content[:limit]
+                    state, lexer = self._get_state(line)
+                    if state is syntax_highlighting.UNKNOWN:
+                        lexer = None
+                    self.lines[line - 1] = _make_line(content, state, lexer)
+            first = chunk_end + 1
+
+    def get(self, line):
+        """Return the Line of LINE, counted from 1."""
+        self.fill(line, line)
+        return self.lines[line - 1]
+
+    def get_line_count(self):
+        return len(self.lines)
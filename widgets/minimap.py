@@ -0,0 +1,234 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The minimap, a scaled down overview of the whole text beside it."""
+
+import math
+import tkinter
+from tkinter.constants import *
+
+from . import themes
+
+# The width of the minimap in pixels, and the number of columns shown across
+# it
+MINIMAP_WIDTH = 80
+MINIMAP_COLUMNS = 120
+
+# How long to wait after changes before redrawing, in milliseconds
+MINIMAP_DELAY = 200
+
+# The color of lines that aren't highlighted, and of the visible part's frame
+MINIMAP_TEXT_COLOR = "#707070"
+MINIMAP_VIEW_COLOR = "#a0a0a0"
+
+class Minimap(tkinter.Canvas):
+    """An overview of TEXT, drawn into an image with a pixel row for each
+    line, or for each group of lines in long texts.
+
+    The length and main color of each line are cached. Edits only forget the
+    lengths of the lines they change, and the highlighter passes on the
+    colors of the lines it highlights, so redrawing after typing in a line
+    only measures that line and repaints it's row. Only edits that add or
+    remove lines redraw everything."""
+
+    def __init__(self, master, text, **kwargs):
+        kwargs.setdefault("width", MINIMAP_WIDTH)
+        kwargs.setdefault("highlightthickness", 0)
+        kwargs.setdefault("background", text.cget("background"))
+        tkinter.Canvas.__init__(self, master, **kwargs)
+        self.text = text
+
+        # The length of each line, or None if it needs measuring, and the
+        # highlight color covering most of it, or None
+        self.lengths = []
+        self.colors = []
+
+        # The lines to repaint, whether everything needs redrawing, and the
+        # pending redraw
+        self.dirty_lines = set()
+        self.full_redraw = True
+        self._after = None
+
+        # The number of lines in each pixel row, and the height in pixels of
+        # each row
+        self.lines_per_row = 1
+        self.row_height = 1
+
+        # The image of the lines, and the frame around the visible part
+        self.image = tkinter.PhotoImage(master=self, width=MINIMAP_WIDTH, height=1)
+        self.create_image(0, 0, anchor=NW, image=self.image)
+        self.view_item = self.create_rectangle(0, 0, 0, 0, outline=MINIMAP_VIEW_COLOR)
+
+        self.bind("<Button-1>", self._on_drag)
+        self.bind("<B1-Motion>", self._on_drag)
+        self.bind("<Configure>", self._on_configure)
+        self.bind("<Map>", lambda event: self._schedule())
+
+        self._reset()
+        self.text.add_edit_listener(self._on_edits)
+        self.text.add_highlight_listener(self._on_highlight)
+
+    def _get_line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _get_row_color(self, first, last):
+        """Return the color of the row of the lines FIRST to LAST, counted
+        from 0: the most common main color of them."""
+        counts = {}
+        for color in self.colors[first:last]:
+            if color is not None:
+                counts[color] = counts.get(color, 0) + 1
+        if counts == {}:
+            return MINIMAP_TEXT_COLOR
+        return themes.get().colors.get(max(counts, key=counts.get), MINIMAP_TEXT_COLOR)
+
+    def _measure(self, lines):
+        """Find the lengths of LINES, counted from 0."""
+        if len(lines) > 1000:
+            lengths = [len(content) for content in self.text.get(1.0, "end-1c").split("\n")]
+            for line in lines:
+                self.lengths[line] = lengths[line]
+            return
+        for line in lines:
+            self.lengths[line] = int(self.text.index("%s.end" % (line + 1)).split(".")[1])
+
+    def _on_configure(self, event=None):
+        self.full_redraw = True
+        self._schedule()
+
+    def _on_drag(self, event):
+        """Scroll the text so that the clicked line is in the middle."""
+        line = event.y // self.row_height * self.lines_per_row + 1
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index("@0,%s" % self.text.winfo_height()).split(".")[0])
+        self.text.yview("%s.0" % max(1, line - (last - first) // 2))
+        self.text.update_accessories()
+
+    def _on_edits(self, edits):
+        """Forget the lengths of the lines changed by EDITS."""
+        for edit in edits:
+            line = edit.line
+            if edit.lines_removed != 0 or edit.lines_added != 0:
+                del self.lengths[line:line + edit.lines_removed]
+                del self.colors[line:line + edit.lines_removed]
+                self.lengths[line:line] = [None] * edit.lines_added
+                self.colors[line:line] = [None] * edit.lines_added
+                self.full_redraw = True
+            if line <= len(self.lengths):
+                self.lengths[line - 1] = None
+                self.dirty_lines.add(line - 1)
+        self._schedule()
+
+    def _on_highlight(self, first, colors):
+        """Take in the main COLORS of the lines from FIRST on."""
+        if first - 1 + len(colors) > len(self.colors):
+            return
+        for line, color in enumerate(colors, first - 1):
+            if self.colors[line] != color:
+                self.colors[line] = color
+                self.dirty_lines.add(line)
+        self._schedule()
+
+    def _paint_row(self, row, background):
+        """Paint the pixel row ROW from the cached lines."""
+        first = row * self.lines_per_row
+        last = min(first + self.lines_per_row, len(self.lengths))
+        length = max(self.lengths[first:last], default=0)
+        y = row * self.row_height
+        self.image.put(background, to=(0, y, MINIMAP_WIDTH, y + self.row_height))
+        if length > 0:
+            width = max(1, min(MINIMAP_WIDTH, length * MINIMAP_WIDTH // MINIMAP_COLUMNS))
+            self.image.put(
+                self._get_row_color(first, last),
+                to=(0, y, width, y + self.row_height)
+            )
+
+    def _reset(self):
+        """Forget everything cached, so that it's all measured again."""
+        count = self._get_line_count()
+        self.lengths = [None] * count
+        self.colors = [None] * count
+        self.dirty_lines.clear()
+        self.full_redraw = True
+
+    def _schedule(self):
+        if self._after is None:
+            self._after = self.after(MINIMAP_DELAY, self.redraw)
+
+    def destroy(self):
+        """Stop following the text before destroying the minimap."""
+        if self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+        if self._on_edits in self.text.edit_listeners:
+            self.text.edit_listeners.remove(self._on_edits)
+        if self._on_highlight in self.text.highlight_listeners:
+            self.text.highlight_listeners.remove(self._on_highlight)
+        tkinter.Canvas.destroy(self)
+
+    def redraw(self):
+        """Repaint the rows of the changed lines, or everything if lines were
+        added or removed. Nothing is drawn while the minimap is hidden."""
+        self._after = None
+        if not self.winfo_ismapped():
+            return
+        if len(self.lengths) != self._get_line_count():
+            self._reset()
+        background = self.cget("background")
+
+        if self.full_redraw:
+            self.full_redraw = False
+            self.dirty_lines.clear()
+            self._measure([line for line, length in enumerate(self.lengths) if length is None])
+
+            # Give each line two pixel rows if they all fit, and put several
+            # lines in each row otherwise
+            count = len(self.lengths)
+            height = max(1, self.winfo_height())
+            if count * 2 <= height:
+                self.lines_per_row = 1
+                self.row_height = 2
+            else:
+                self.lines_per_row = math.ceil(count / height)
+                self.row_height = 1
+            rows = math.ceil(count / self.lines_per_row)
+            self.image.blank()
+            self.image.config(width=MINIMAP_WIDTH, height=rows * self.row_height)
+            for row in range(rows):
+                self._paint_row(row, background)
+        else:
+            lines = [line for line in self.dirty_lines if line < len(self.lengths)]
+            self.dirty_lines.clear()
+            self._measure([line for line in lines if self.lengths[line] is None])
+            for row in {line // self.lines_per_row for line in lines}:
+                self._paint_row(row, background)
+        self.update_view()
+
+    def update_view(self):
+        """Move the frame to the visible part of the text."""
+        first = int(self.text.index("@0,0").split(".")[0])
+        last = int(self.text.index("@0,%s" % self.text.winfo_height()).split(".")[0])
+        self.coords(
+            self.view_item,
+            0,
+            (first - 1) // self.lines_per_row * self.row_height,
+            MINIMAP_WIDTH - 1,
+            ((last - 1) // self.lines_per_row + 1) * self.row_height
+        )
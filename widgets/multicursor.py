@@ -0,0 +1,191 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Editing at several cursors at once, and rectangular selections.
+
+The cursors are pairs of text marks, which Tk keeps in place through edits.
+Every keystroke is applied at all of them by a single call of a Tcl
+procedure, as one undo step, so typing stays fast with a thousand cursors."""
+
+from tkinter.constants import *
+
+# The state bit of the Control key in key events
+CONTROL_MASK = 0x4
+
+# The index modifiers that the movement keys apply to every cursor
+MOVES = {
+    "Left": "-1 chars",
+    "Right": "+1 chars",
+    "Up": "-1 lines",
+    "Down": "+1 lines",
+    "Home": "linestart",
+    "End": "lineend",
+}
+
+# The modifier keys, which don't end multi-cursor editing by themselves
+MODIFIER_KEYS = (
+    "Alt_L", "Alt_R", "Caps_Lock", "Control_L", "Control_R", "Meta_L",
+    "Meta_R", "Shift_L", "Shift_R", "Super_L", "Super_R",
+)
+
+class MultiCursor:
+    """Extra cursors and rectangular selections for TEXT.
+
+    Ctrl+Click adds a cursor, Ctrl+Alt+Up and Ctrl+Alt+Down add one above or
+    below the last one, and Alt+Drag selects a rectangle with a cursor on
+    each of it's lines. Escape, a plain click or any key we don't handle go
+    back to the single cursor."""
+
+    def __init__(self, text):
+        self.text = text
+
+        # The flat list of the (anchor, cursor) mark names of the cursors,
+        # the number of the next marks, and where the rectangle being
+        # selected started
+        self.cursors = ()
+        self._next = 0
+        self._rectangle_start = None
+
+        self.update_colors()
+        self.text.tag_configure("tkeditor_selection", background="#404060")
+
+        self.bind_tag = "%s.multicursor" % text._w
+        self.text.bindtags((self.bind_tag,) + self.text.bindtags())
+        for sequence, func in (
+            ("<Alt-B1-Motion>", self._on_alt_drag),
+            ("<Alt-Button-1>", self._on_alt_click),
+            ("<Button-1>", lambda event: self.clear()),
+            ("<Control-Alt-Down>", lambda event: self._add_line_cursor("+1 lines")),
+            ("<Control-Alt-Up>", lambda event: self._add_line_cursor("-1 lines")),
+            ("<Control-Button-1>", self._on_control_click),
+            ("<KeyPress>", self._on_key_press),
+            ("<KeyRelease>", lambda event: "break" if self.is_active() else None),
+        ):
+            self.text.bind_class(self.bind_tag, sequence, func)
+
+    def _add_line_cursor(self, offset):
+        """Add a cursor at "last cursor OFFSET"."""
+        last = self.cursors[-1] if self.cursors else INSERT
+        self.add_cursor(self.text.index("%s %s" % (last, offset)))
+        return "break"
+
+    def _call(self, proc, *args):
+        """Call the Tcl procedure PROC for our cursors and take in the
+        remaining cursors it returns."""
+        self.cursors = self.text.tk.splitlist(
+            self.text.tk.call(proc, self.text._w, self.cursors, *args)
+        )
+        self.text.see(INSERT)
+
+        # Our bindings stop the key events before the text's own handler, so
+        # run it here to update the accessories and to time the keystroke in
+        # the latency tracer
+        self.text._on_key_press()
+
+    def _on_alt_click(self, event):
+        self._rectangle_start = self.text.index("@%s,%s" % (event.x, event.y))
+        self.set_cursors([(self._rectangle_start, self._rectangle_start)])
+        return "break"
+
+    def _on_alt_drag(self, event):
+        """Select the rectangle from where the drag started to the mouse."""
+        if self._rectangle_start is None:
+            return "break"
+        start_line, start_column = map(int, self._rectangle_start.split("."))
+        end_line, end_column = map(int, self.text.index("@%s,%s" % (event.x, event.y)).split("."))
+        positions = []
+        step = 1 if end_line >= start_line else -1
+        for line in range(start_line, end_line + step, step):
+            positions.append(("%s.%s" % (line, start_column), "%s.%s" % (line, end_column)))
+        self.set_cursors(positions)
+        return "break"
+
+    def _on_control_click(self, event):
+        self.add_cursor(self.text.index("@%s,%s" % (event.x, event.y)))
+        return "break"
+
+    def _on_key_press(self, event):
+        """Apply the key to all the cursors, if there are several."""
+        if not self.is_active():
+            return None
+        keysym = event.keysym
+        if keysym in MODIFIER_KEYS:
+            return None
+        if keysym == "Escape":
+            self.clear()
+        elif keysym in MOVES:
+            self._call("::tkeditor::multi_move", MOVES[keysym])
+        elif keysym == "BackSpace":
+            self._call("::tkeditor::multi_edit", "", "-1 chars")
+        elif keysym == "Delete":
+            self._call("::tkeditor::multi_edit", "", "+1 chars")
+        elif keysym == "Return":
+            self._call("::tkeditor::multi_edit", "\n", "")
+        elif keysym == "Tab":
+            self._call("::tkeditor::multi_edit", " " * self.text.tabwidth, "")
+        elif event.char != "" and event.char.isprintable() and not event.state & CONTROL_MASK:
+            self._call("::tkeditor::multi_edit", event.char, "")
+        else:
+            # Let the text handle other keys with it's single cursor
+            self.clear()
+            return None
+        return "break"
+
+    def add_cursor(self, index):
+        """Add a cursor at INDEX, starting with one at the insert cursor if we
+        had none."""
+        if not self.is_active():
+            self.text.tag_remove(SEL, 1.0, END)
+            self.set_cursors([(INSERT, INSERT), (index, index)])
+            return
+        anchor = "tkeditor_anchor%s" % self._next
+        cursor = "tkeditor_cursor%s" % self._next
+        self._next += 1
+        self.text.mark_set(anchor, index)
+        self.text.mark_set(cursor, index)
+        self.cursors = tuple(self.cursors) + (anchor, cursor)
+        self._call("::tkeditor::show_cursors")
+
+    def clear(self):
+        """Go back to the single insert cursor."""
+        if self.is_active():
+            self.set_cursors([])
+
+    def is_active(self):
+        return len(self.cursors) > 0
+
+    def set_cursors(self, positions):
+        """Replace the cursors with ones at the (anchor, cursor) indexes in
+        POSITIONS."""
+        flat = []
+        for anchor, cursor in positions:
+            flat.extend((str(anchor), str(cursor)))
+        self.cursors = self.text.tk.splitlist(
+            self.text.tk.call("::tkeditor::set_cursors", self.text._w, tuple(flat), self._next)
+        )
+        self._next += len(positions)
+
+    def update_colors(self):
+        """Draw the extra cursors in the text's cursor color."""
+        self.text.tag_configure(
+            "tkeditor_cursor",
+            background=self.text.cget("insertbackground"),
+            foreground=self.text.cget("background")
+        )
@@ -0,0 +1,141 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The outline panel, listing the classes and functions of the current
+file."""
+
+import tkinter
+from tkinter import ttk
+from tkinter.constants import *
+
+import symbols
+
+# How often to check the current page for changes, in milliseconds
+OUTLINE_INTERVAL = 500
+
+class Outline(tkinter.Frame):
+    """A panel listing the classes and functions of the current page, if it's
+    Python. Clicking one moves the cursor to it."""
+
+    def __init__(self, *args, **kwargs):
+        tkinter.Frame.__init__(self, *args, **kwargs)
+
+        # The title label
+        self.label = tkinter.Label(self, text="Outline", anchor=W)
+        self.label.grid(row=0, column=0, columnspan=2, sticky=EW)
+
+        # The tree of symbols
+        self.scrollbar = tkinter.Scrollbar(self, orient=VERTICAL)
+        self.scrollbar.grid(row=1, column=1, sticky=NS)
+        self.tree = ttk.Treeview(
+            self,
+            show="tree",
+            selectmode=BROWSE,
+            columns=("line",),
+            displaycolumns=(),
+            yscrollcommand=self.scrollbar.set
+        )
+        self.scrollbar.config(command=self.tree.yview)
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.grid(row=1, column=0, sticky=NSEW)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(1, weight=1)
+
+        # The page shown, and it's version when it was last shown
+        self.page = None
+        self.version = None
+
+        # The parse of the page's text running in a worker process, and the
+        # page it's for
+        self._future = None
+        self._future_page = None
+
+        self._poll()
+
+    def _on_select(self, event=None):
+        """Move the page's cursor to the selected symbol."""
+        selection = self.tree.selection()
+        if selection == () or self.page is None:
+            return
+        self.page.goto_line(int(self.tree.set(selection[0], "line")))
+
+    def _poll(self):
+        """Show the symbols of a finished parse, and parse the current page
+        again if it changed since last time, while the outline is shown."""
+        if self._future is not None and self._future.done():
+            future = self._future
+            self._future = None
+            if self._future_page is self.page:
+                self._show_symbols(future)
+        if self.winfo_ismapped():
+            page = self.get_page_func()
+            if page is not self.page or (page is not None and page.version != self.version):
+                self.refresh(page)
+        self.after(OUTLINE_INTERVAL, self._poll)
+
+    def _show_symbols(self, future):
+        """Show the symbols found by FUTURE. The old ones stay if the page had
+        syntax errors."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.tree.delete(*self.tree.get_children())
+        items = {"": ""}
+        for name, kind, line, column, container in future.result():
+            label = "%s %s" % ("class" if kind == "class" else "def", name)
+            item = self.tree.insert(
+                items.get(container, ""),
+                END,
+                text=label,
+                values=(line,),
+                open=True
+            )
+            items[name if container == "" else "%s.%s" % (container, name)] = item
+
+    def bind_get_page(self, func):
+        """Bind the outline to the page returned by FUNC, which may be None."""
+        self.get_page_func = func
+
+    def refresh(self, page):
+        """Start finding the symbols of PAGE in a worker process, unless they
+        are already being found. The old ones stay while PAGE has syntax
+        errors."""
+        if page is not self.page:
+            self.tree.delete(*self.tree.get_children())
+            if self._future is not None:
+                self._future.cancel()
+                self._future = None
+        elif self._future is not None:
+            # Parse the newer text once this parse is done
+            return
+        self.page = page
+        if page is None or page.text.language != "python":
+            self.version = None if page is None else page.version
+            self.label.config(text="Outline")
+            return
+        self.version = page.version
+        self.label.config(text="Outline: %s" % page.title)
+
+        self._future = symbols.extract_symbols_later(page.text.get(1.0, "end-1c"))
+        self._future_page = page
+
+    # Placeholders for unbound methods
+    def get_page_func(self):
+        return None
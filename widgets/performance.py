@@ -0,0 +1,132 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The Performance window, showing how long the timed methods and keystrokes
+take."""
+
+import tkinter
+from tkinter import ttk
+from tkinter.constants import *
+
+import perf
+from constants import *
+
+# How often to update the timings, in milliseconds
+PERFORMANCE_INTERVAL = 1000
+
+class PerformanceWindow(tkinter.Toplevel):
+    """A window with the call count and the median and 99th percentile
+    durations of each timed method and of the keystroke latency, the latency
+    histogram and the latest slow frames. Timing is on while it is open."""
+
+    def __init__(self, *args, **kwargs):
+        tkinter.Toplevel.__init__(self, *args, **kwargs)
+        self.wm_title("Performance")
+        self.wm_geometry("560x480")
+        self.wm_protocol("WM_DELETE_WINDOW", self.close)
+
+        # The table of timings
+        columns = ("count", "p50", "p99", "max")
+        self.tree = ttk.Treeview(self, columns=columns, selectmode=NONE)
+        self.tree.heading("#0", text="Method")
+        self.tree.column("#0", width=240)
+        for column, heading in zip(columns, ("Calls", "p50 (ms)", "p99 (ms)", "Max (ms)")):
+            self.tree.heading(column, text=heading)
+            self.tree.column(column, width=70, anchor=E)
+        self.tree.grid(row=0, column=0, columnspan=2, sticky=NSEW)
+
+        # The keystroke latency histogram, and the slow frames with the
+        # methods that ran in them
+        self.histogram_label = tkinter.Label(self, anchor=W, justify=LEFT)
+        self.histogram_label.grid(row=1, column=0, columnspan=2, sticky=EW)
+        self.slow_frames_list = tkinter.Listbox(self, height=8)
+        self.slow_frames_list.grid(row=2, column=0, columnspan=2, sticky=NSEW)
+
+        # The buttons
+        self.reset_button = ttk.Button(self, text="Reset", command=self.reset)
+        self.reset_button.grid(row=3, column=0, sticky=W)
+        self.close_button = ttk.Button(self, text="Close", command=self.close)
+        self.close_button.grid(row=3, column=1, sticky=E)
+
+        self.columnconfigure(0, weight=1)
+        self.rowconfigure(0, weight=1)
+        self.rowconfigure(2, weight=1)
+
+        # Time while we exist, however we are destroyed
+        perf.enable()
+        self.bind("<Destroy>", self._on_destroy)
+        self._after = None
+        self.refresh()
+
+    def _on_destroy(self, event):
+        """Stop timing once the window is destroyed, by close() or with it's
+        parent."""
+        if event.widget is not self:
+            return
+        if self._after is not None:
+            self.after_cancel(self._after)
+            self._after = None
+        perf.disable()
+
+    def _refresh_latency(self):
+        """Show the keystroke latency histogram and the slow frames."""
+        buckets = ["<%s ms" % limit for limit in LATENCY_BUCKETS]
+        buckets.append(">%s ms" % LATENCY_BUCKETS[-1])
+        self.histogram_label.config(
+            text="Keystroke latency:  " + "  ".join(
+                "%s: %s" % (bucket, count)
+                for bucket, count in zip(buckets, perf.tracer.histogram)
+            )
+        )
+
+        self.slow_frames_list.delete(0, END)
+        for latency, handlers in reversed(perf.tracer.slow_frames):
+            self.slow_frames_list.insert(END, "%.1f ms: %s" % (
+                latency * 1000,
+                ", ".join("%s %.1f ms" % (name, seconds * 1000) for name, seconds in handlers)
+            ))
+
+    def close(self, event=None):
+        """Close the window, which stops timing."""
+        self.destroy()
+
+    def refresh(self):
+        """Show the latest timings, and schedule the next refresh."""
+        timers = perf.get_timers() + [("Keystroke latency", perf.tracer.timer)]
+        for name, timer in timers:
+            values = (
+                timer.count,
+                "%.2f" % (timer.get_percentile(50) * 1000),
+                "%.2f" % (timer.get_percentile(99) * 1000),
+                "%.2f" % (max(timer.samples, default=0.0) * 1000),
+            )
+            if self.tree.exists(name):
+                self.tree.item(name, values=values)
+            else:
+                self.tree.insert("", END, name, text=name, values=values)
+        self._refresh_latency()
+        self._after = self.after(PERFORMANCE_INTERVAL, self.refresh)
+
+    def reset(self):
+        """Forget the timings so far."""
+        perf.reset()
+        if self._after is not None:
+            self.after_cancel(self._after)
+        self.refresh()
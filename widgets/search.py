@@ -0,0 +1,561 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Find and replace for the Text widget."""
+
+import bisect
+import re
+import threading
+import time
+import tkinter
+from tkinter.constants import *
+
+def compile_pattern(pattern, regex=False, case=False, word=False):
+    """Return a compiled regular expression searching for PATTERN. PATTERN is
+    a literal string unless REGEX is True, CASE makes the search case-sensitive
+    and WORD only matches whole words. Raise re.error for bad expressions."""
+    if not regex:
+        pattern = re.escape(pattern)
+    if word:
+        pattern = r"\b(?:%s)\b" % pattern
+    flags = re.MULTILINE
+    if not case:
+        flags |= re.IGNORECASE
+    return re.compile(pattern, flags)
+
+def get_line_starts(contents):
+    """Return a list of the offsets in CONTENTS where each line starts."""
+    starts = [0]
+    starts.extend(m.end() for m in re.finditer("\n", contents))
+    return starts
+
+def index_to_offset(line_starts, index):
+    """Convert the text index "line.column" INDEX to an offset."""
+    line, column = str(index).split(".")
+    return line_starts[int(line) - 1] + int(column)
+
+def offset_to_index(line_starts, offset):
+    """Convert OFFSET to a text index "line.column"."""
+    line = bisect.bisect_right(line_starts, offset)
+    return "%s.%s" % (line, offset - line_starts[line - 1])
+
+class Search:
+    """Find all the matches of a compiled REGEX in CONTENTS in a background
+    thread. The UI thread can read how many matches have been found so far at
+    any time.
+
+    The contents are searched CHUNK_SIZE characters at a time, so that no
+    single call holds the GIL for long and the UI stays responsive. Matches
+    may run up to OVERLAP characters past the end of a chunk, and the overlap
+    is widened for a match that starts a chunk and doesn't fit in it.
+
+    LITERAL is the pattern as a plain string, if it is one. Literal patterns
+    are found with str.find, which is much faster than a regular expression,
+    lowering each chunk first if FOLD_CASE is True."""
+
+    # How many characters to search at a time, and how far past the end of
+    # a chunk a match may go
+    CHUNK_SIZE = 1024 * 1024
+    OVERLAP = 64 * 1024
+
+    def __init__(self, regex, contents, literal=None, fold_case=False):
+        self.regex = regex
+        self.contents = contents
+        self.literal = literal
+        self.fold_case = fold_case
+
+        # The start and end offsets of the matches found so far. Only the
+        # search thread appends to these.
+        self.starts = []
+        self.ends = []
+
+        # Whether all the matches have been found, and the line start offsets
+        # needed to convert them to text indexes, which are found afterwards
+        self.counted = False
+        self.line_starts = None
+        self.done = False
+
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _find_literal(self, start, chunk_end):
+        """Return the (start, end) offsets of the matches of our literal
+        string that start from START up to CHUNK_END, and the offset to go on
+        from."""
+        literal = self.literal
+        length = len(literal)
+        chunk = self.contents[start:chunk_end + length - 1]
+
+        # Lowering some characters changes their length, which would make the
+        # offsets wrong, so use the regular expression for those chunks
+        if self.fold_case:
+            lowered = chunk.lower()
+            if len(lowered) != len(chunk):
+                return self._find_regex(start, chunk_end)
+            chunk = lowered
+
+        matches = []
+        limit = chunk_end - start
+        found = chunk.find(literal)
+        while found != -1 and found < limit:
+            matches.append((start + found, start + found + length))
+            found = chunk.find(literal, found + length)
+        if matches == []:
+            return matches, chunk_end
+        return matches, max(chunk_end, matches[-1][1])
+
+    def _find_regex(self, start, chunk_end):
+        """Return the (start, end) offsets of the matches of our regular
+        expression that start from START up to CHUNK_END, and the offset to go
+        on from."""
+        length = len(self.contents)
+        overlap = self.OVERLAP
+        while True:
+            window = min(chunk_end + overlap, length)
+            matches = []
+            resume = chunk_end
+            for match in self.regex.finditer(self.contents, start, window):
+                match_start, match_end = match.span()
+                if match_start >= chunk_end:
+                    break
+
+                # The match may be cut short by the end of the window, so
+                # find it again in the next chunk
+                if match_end >= window and window < length:
+                    resume = match_start
+                    break
+                matches.append((match_start, match_end))
+                resume = max(chunk_end, match_end)
+
+            # Widen the window for a match too long for it
+            if resume > start or window == length:
+                return matches, resume
+            overlap *= 2
+
+    def _run(self):
+        """Find the matches a chunk at a time, then the line starts."""
+        length = len(self.contents)
+        start = 0
+        while True:
+            # The last chunk also has the empty matches at the very end
+            chunk_end = start + self.CHUNK_SIZE
+            if chunk_end >= length:
+                chunk_end = length + 1
+            if self.literal:
+                matches, start = self._find_literal(start, chunk_end)
+            else:
+                matches, start = self._find_regex(start, chunk_end)
+            self.starts.extend(match[0] for match in matches)
+            self.ends.extend(match[1] for match in matches)
+            if self._cancelled.is_set():
+                return
+            if chunk_end > length:
+                break
+
+            # Let the UI thread run between the chunks
+            time.sleep(0)
+        self.counted = True
+
+        self.line_starts = get_line_starts(self.contents)
+        self.done = True
+
+    def cancel(self):
+        """Stop searching."""
+        self._cancelled.set()
+
+    def find(self, offset, backwards=False):
+        """Return the number of the first match starting after OFFSET, or of the
+        last match starting before it if BACKWARDS, wrapping around."""
+        if backwards:
+            i = bisect.bisect_left(self.starts, offset) - 1
+        else:
+            i = bisect.bisect_left(self.starts, offset)
+
+            # Don't get stuck on an empty match at OFFSET
+            if i < len(self.starts) and self.starts[i] == self.ends[i] == offset:
+                i += 1
+        return i % len(self.starts)
+
+    def get_count(self):
+        """Return the number of matches found so far."""
+        return len(self.starts)
+
+    def replaced(self, i, chars):
+        """Forget the match number I, which was replaced with CHARS, and move
+        the matches and line starts after it, instead of searching the edited
+        text again. Only call this once the search is done."""
+        start = self.starts[i]
+        end = self.ends[i]
+        offset = len(chars) - (end - start)
+        del self.starts[i]
+        del self.ends[i]
+        self.starts[i:] = [match_start + offset for match_start in self.starts[i:]]
+        self.ends[i:] = [match_end + offset for match_end in self.ends[i:]]
+
+        # Replace the line starts inside the match with those in CHARS
+        first = bisect.bisect_right(self.line_starts, start)
+        last = bisect.bisect_right(self.line_starts, end)
+        self.line_starts[first:] = (
+            [start + m.end() for m in re.finditer("\n", chars)] +
+            [line_start + offset for line_start in self.line_starts[last:]]
+        )
+
+class FindBar(tkinter.Frame):
+    """The find and replace bar for a Page's text."""
+
+    # Milliseconds to wait after the pattern is typed before searching
+    SEARCH_DELAY = 150
+
+    def __init__(self, *args, text, **kwargs):
+        kwargs["relief"] = RAISED
+        tkinter.Frame.__init__(self, *args, **kwargs)
+
+        # The text widget we search in
+        self.text = text
+        self.text.tag_config("search", background="#5f5f00")
+        self.text.tag_config("search_current", background="#cf926c")
+        self.text.tag_raise("sel")
+
+        # The current search, the text version it was made for, and the
+        # move to make once it's done (1, -1 or None)
+        self.search = None
+        self.search_version = None
+        self.pending_move = None
+
+        # A count of the edits of the text, to tell when a search is out of
+        # date
+        self.version = 0
+        self.text.add_edit_listener(self._on_edits)
+
+        self._search_after = None
+
+        # The search options
+        self.regex = tkinter.BooleanVar(self, False)
+        self.case = tkinter.BooleanVar(self, False)
+        self.word = tkinter.BooleanVar(self, False)
+
+        self._create_window()
+
+        # Re-highlight the visible matches when the text is scrolled
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.text.bind(sequence, self._on_scroll, add="+")
+
+    def _create_window(self):
+        """Create the bar's widgets."""
+
+        # The find row
+        tkinter.Label(self, text="Find:").grid(row=0, column=0, sticky=W)
+        self.find_entry = tkinter.Entry(self)
+        self.find_entry.bind("<KeyRelease>", self._on_pattern_change)
+        self.find_entry.bind("<Return>", self.find_next)
+        self.find_entry.bind("<Shift-Return>", self.find_previous)
+        self.find_entry.bind("<Escape>", self.hide)
+        self.find_entry.grid(row=0, column=1, sticky=EW)
+
+        for column, (label, variable) in enumerate((
+            ("Regex", self.regex),
+            ("Case", self.case),
+            ("Word", self.word)
+        )):
+            tkinter.Checkbutton(
+                self,
+                text=label,
+                variable=variable,
+                command=self.start_search
+            ).grid(row=0, column=2 + column)
+
+        tkinter.Button(self, text="<", relief=FLAT, command=self.find_previous).grid(row=0, column=5)
+        tkinter.Button(self, text=">", relief=FLAT, command=self.find_next).grid(row=0, column=6)
+
+        self.count_label = tkinter.Label(self, text="", width=16)
+        self.count_label.grid(row=0, column=7)
+
+        tkinter.Button(self, text="X", relief=FLAT, command=self.hide).grid(row=0, column=8)
+
+        # The replace row
+        self.replace_label = tkinter.Label(self, text="Replace:")
+        self.replace_entry = tkinter.Entry(self)
+        self.replace_entry.bind("<Return>", self.replace)
+        self.replace_entry.bind("<Escape>", self.hide)
+        self.replace_button = tkinter.Button(self, text="Replace", relief=FLAT, command=self.replace)
+        self.replace_all_button = tkinter.Button(self, text="Replace All", relief=FLAT, command=self.replace_all)
+
+        self.columnconfigure(1, weight=1)
+
+    def _move(self, direction):
+        """Select the next match (DIRECTION 1) or the previous one (-1)."""
+        if self.search is None or self.search_version != self.version:
+            self.start_search()
+        if self.search is None:
+            return
+        if not self.search.done:
+            self.pending_move = direction
+            return
+        if self.search.starts == []:
+            return
+
+        # Find the match after the cursor, or before the selection
+        line_starts = self.search.line_starts
+        if direction == 1:
+            offset = index_to_offset(line_starts, self.text.index(INSERT))
+            i = self.search.find(offset)
+        else:
+            try: first = self.text.index("sel.first")
+            except tkinter.TclError:
+                first = self.text.index(INSERT)
+            i = self.search.find(index_to_offset(line_starts, first), backwards=True)
+
+        # Select it
+        start = offset_to_index(line_starts, self.search.starts[i])
+        end = offset_to_index(line_starts, self.search.ends[i])
+        self.text.tag_remove("sel", 1.0, END)
+        self.text.tag_remove("search_current", 1.0, END)
+        self.text.tag_add("sel", start, end)
+        self.text.tag_add("search_current", start, end)
+        self.text.mark_set(INSERT, end)
+        self.text.see(start)
+        self.count_label.config(text="%s of %s" % (i + 1, len(self.search.starts)))
+        self.tag_viewport()
+        self.text.update_accessories()
+
+    def _on_edits(self, edits):
+        self.version += 1
+
+    def _on_pattern_change(self, event=None):
+        """Search for the new pattern once the user stops typing."""
+        if event is not None and event.keysym in ("Return", "Escape"):
+            return
+        if self._search_after is not None:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(self.SEARCH_DELAY, self.start_search)
+
+    def _on_scroll(self, event=None):
+        if self.search is not None:
+            self.after_idle(self.tag_viewport)
+
+    def _poll(self):
+        """Collect the background search's results and show the match count."""
+        if self.search is None:
+            return
+        if self.search.counted:
+            self.count_label.config(text="%s matches" % self.search.get_count())
+        else:
+            self.count_label.config(text="%s+ matches" % self.search.get_count())
+
+        if self.search.done:
+            if self.pending_move is not None:
+                direction = self.pending_move
+                self.pending_move = None
+                self._move(direction)
+        else:
+            self.after(20, self._poll)
+
+    def compile(self):
+        """Return the compiled pattern, or None if there is no valid pattern."""
+        pattern = self.find_entry.get()
+        if pattern == "":
+            return None
+        try:
+            return compile_pattern(
+                pattern,
+                regex=self.regex.get(),
+                case=self.case.get(),
+                word=self.word.get()
+            )
+        except re.error:
+            self.count_label.config(text="Invalid pattern")
+            return None
+
+    def find_next(self, event=None):
+        """Select the next match."""
+        self._move(1)
+        return "break"
+
+    def find_previous(self, event=None):
+        """Select the previous match."""
+        self._move(-1)
+        return "break"
+
+    def hide(self, event=None):
+        """Hide the bar and remove the highlighting of the matches."""
+        self.stop_search()
+        self.grid_remove()
+        self.text.focus_set()
+        return "break"
+
+    def replace(self, event=None):
+        """Replace the selected match and select the next one."""
+        if self.search is None or not self.search.done or self.search_version != self.version:
+            self._move(1)
+            return "break"
+
+        try:
+            first = self.text.index("sel.first")
+            last = self.text.index("sel.last")
+        except tkinter.TclError:
+            self._move(1)
+            return "break"
+
+        # Only replace the selection if it is exactly one of the matches,
+        # checked on it's lines so that anchors and lookarounds still work
+        start = index_to_offset(self.search.line_starts, first)
+        end = index_to_offset(self.search.line_starts, last)
+        i = bisect.bisect_left(self.search.starts, start)
+        if i == len(self.search.starts) or self.search.starts[i] != start:
+            self._move(1)
+            return "break"
+        lines = self.text.get("%s linestart" % first, "%s lineend" % last)
+        column = int(first.split(".")[1])
+        match = self.search.regex.match(lines, column)
+        if match is not None and match.end() - column == end - start:
+            if self.regex.get():
+                replacement = match.expand(self.replace_entry.get())
+            else:
+                replacement = self.replace_entry.get()
+            self.text.apply_edits([(first, last, replacement)])
+            self.text.mark_set(INSERT, "%s+%sc" % (first, len(replacement)))
+
+            # Move the other matches instead of searching the text again
+            self.search.replaced(i, replacement)
+            self.search_version = self.version
+            if self.search.starts == []:
+                self.count_label.config(text="0 matches")
+                self.text.tag_remove("sel", 1.0, END)
+                self.tag_viewport()
+                return "break"
+        self._move(1)
+        return "break"
+
+    def replace_all(self, event=None):
+        """Replace all the matches as one undoable edit."""
+        regex = self.compile()
+        if regex is None:
+            return
+
+        contents = self.text.get(1.0, "end-1c")
+        line_starts = get_line_starts(contents)
+        replacement = self.replace_entry.get()
+
+        # Make the edits from the end of the text backwards, so that the
+        # indexes of the earlier matches stay valid
+        edits = []
+        for match in regex.finditer(contents):
+            if self.regex.get():
+                chars = match.expand(replacement)
+            else:
+                chars = replacement
+            edits.append((
+                offset_to_index(line_starts, match.start()),
+                offset_to_index(line_starts, match.end()),
+                chars
+            ))
+        edits.reverse()
+        if edits != []:
+            self.text.apply_edits(edits)
+            self.text.update_accessories()
+        self.start_search()
+        self.count_label.config(text="Replaced %s" % len(edits))
+
+    def show(self, replace=False):
+        """Show the bar, with the replace row if REPLACE is True."""
+        if replace:
+            self.replace_label.grid(row=1, column=0, sticky=W)
+            self.replace_entry.grid(row=1, column=1, sticky=EW)
+            self.replace_button.grid(row=1, column=2, columnspan=2, sticky=EW)
+            self.replace_all_button.grid(row=1, column=4, columnspan=3, sticky=EW)
+        else:
+            self.replace_label.grid_remove()
+            self.replace_entry.grid_remove()
+            self.replace_button.grid_remove()
+            self.replace_all_button.grid_remove()
+        self.grid()
+
+        # Start with the selected text as the pattern
+        try:
+            selected = self.text.get("sel.first", "sel.last")
+        except tkinter.TclError:
+            selected = ""
+        if selected != "" and "\n" not in selected:
+            self.find_entry.delete(0, END)
+            self.find_entry.insert(0, selected)
+        self.find_entry.select_range(0, END)
+        self.find_entry.focus_set()
+        self.start_search()
+
+    def start_search(self):
+        """Start searching the text for the pattern, highlighting the visible
+        matches right away and counting all of them in the background."""
+        self._search_after = None
+        self.stop_search()
+
+        regex = self.compile()
+        if regex is None:
+            return
+
+        # Plain patterns can be found without the regular expression
+        literal = None
+        if not self.regex.get() and not self.word.get():
+            literal = self.find_entry.get()
+            if not self.case.get():
+                literal = literal.lower()
+
+        self.tag_viewport(regex)
+        self.search = Search(
+            regex,
+            self.text.get(1.0, "end-1c"),
+            literal=literal,
+            fold_case=not self.case.get()
+        )
+        self.search_version = self.version
+        self._poll()
+
+    def stop_search(self):
+        """Cancel the current search and remove the highlighting."""
+        if self.search is not None:
+            self.search.cancel()
+            self.search = None
+        self.pending_move = None
+        self.count_label.config(text="")
+        self.text.tag_remove("search", 1.0, END)
+        self.text.tag_remove("search_current", 1.0, END)
+
+    def tag_viewport(self, regex=None):
+        """Highlight the matches in the visible part of the text."""
+        if regex is None:
+            if self.search is None:
+                return
+            regex = self.search.regex
+
+        first = self.text.index("@0,0 linestart")
+        last = self.text.index("@0,%s lineend" % self.text.winfo_height())
+        visible = self.text.get(first, last)
+        line_starts = get_line_starts(visible)
+
+        # Add all the ranges with a single tag call
+        first_line = int(first.split(".")[0]) - 1
+        ranges = []
+        for match in regex.finditer(visible):
+            for offset in match.span():
+                line, column = offset_to_index(line_starts, offset).split(".")
+                ranges.append("%s.%s" % (int(line) + first_line, column))
+        self.text.tag_remove("search", first, last)
+        if ranges != []:
+            self.text.tag_add("search", *ranges)
@@ -0,0 +1,129 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Line, word and character counts of a text widget, kept up to date from
+it's edits instead of being recounted."""
+
+import time
+
+# How many lines to get from the text widget at a time when counting words
+COUNT_CHUNK_LINES = 2000
+
+class Statistics:
+    """The numbers of lines, words and characters of TEXT.
+
+    The characters are counted from the text each edit adds and removes, and
+    the words of each line are counted once and kept until an edit changes
+    the line, so that nothing is recounted after typing. Lines that aren't
+    counted yet, like all those of a newly loaded file, are counted a
+    time-limited chunk at a time by count()."""
+
+    def __init__(self, text):
+        self.text = text
+
+        # The words of each line, or None if they aren't counted, the total
+        # of the counted lines, and the number of characters
+        self.line_words = []
+        self.words = 0
+        self.characters = 0
+
+        # The first and last lines that may not be counted, or None
+        self.dirty = None
+
+        self._reset()
+        self.text.add_edit_listener(self._on_edits)
+
+    def _get_line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _on_edits(self, edits):
+        """Forget the words of the lines changed by EDITS, and count their
+        characters."""
+        for edit in edits:
+            line = edit.line
+            end = line + edit.lines_removed
+            self.words -= sum(
+                words for words in self.line_words[line - 1:end] if words is not None
+            )
+            self.line_words[line - 1:end] = [None] * (edit.lines_added + 1)
+            self.characters += len(edit.inserted) - len(edit.deleted)
+
+            # Keep the dirty lines in one range, moved by the edits after it
+            end = line + edit.lines_added
+            if self.dirty is None:
+                self.dirty = (line, end)
+            else:
+                first, last = self.dirty
+                if last >= line:
+                    last = max(last + edit.lines_added - edit.lines_removed, end)
+                else:
+                    last = end
+                self.dirty = (min(first, line), last)
+
+    def _reset(self):
+        """Forget all the counts, and count the characters again."""
+        self.line_words = [None] * self._get_line_count()
+        self.words = 0
+        self.characters = int(
+            self.text.tk.call(self.text._w, "count", "-chars", "1.0", "end-1c")
+        )
+        self.dirty = (1, len(self.line_words))
+
+    def count(self, budget):
+        """Count the words of the lines that aren't counted for about BUDGET
+        seconds. Return True if all the lines are counted."""
+        if len(self.line_words) != self._get_line_count():
+            self._reset()
+        if self.dirty is None:
+            return True
+
+        deadline = time.perf_counter() + budget
+        first, last = self.dirty
+        last = min(last, len(self.line_words))
+        line = first
+        while line <= last:
+            chunk_end = min(line + COUNT_CHUNK_LINES - 1, last)
+            if None in self.line_words[line - 1:chunk_end]:
+                contents = self.text.get("%s.0" % line, "%s.end" % chunk_end).split("\n")
+                for number, content in enumerate(contents, line):
+                    if self.line_words[number - 1] is None:
+                        words = len(content.split())
+                        self.line_words[number - 1] = words
+                        self.words += words
+            line = chunk_end + 1
+
+            # Count the rest at the next update, so that the text stays
+            # responsive
+            if line <= last and time.perf_counter() > deadline:
+                self.dirty = (line, last)
+                return False
+        self.dirty = None
+        return True
+
+    def get_line_count(self):
+        return len(self.line_words)
+
+    def get_selected_characters(self):
+        """Return the number of selected characters."""
+        if self.text.tag_ranges("sel") == ():
+            return 0
+        return int(
+            self.text.tk.call(self.text._w, "count", "-chars", "sel.first", "sel.last")
+        )
@@ -18,53 +18,206 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
 # or see <http://www.gnu.org/licenses/>
 
-import ast
-import json
+"""The incremental syntax highlighting engine shared by all the lexers."""
+
+import time
 import tkinter
 from tkinter.constants import *
 
+import settings
 from constants import *
+from . import themes
 
-"""A class for syntax highlighting in a text widget."""
-
-class Python:
-    """Syntax highlighting for Python 3.X syntax."""
-
-    def __init__(self, text):
-        
-        # Our text widget
-        self.text = text
-
-        # Load the syntax file
-        self.syntax = json.load(open(JSON_COLORS))
-        self.colors = self.syntax["colors"]
-
-        # Set the tags for the text widget
-        for color in self.colors:
-            self.text.tag_config(color, foreground=self.colors[color])
+# The state of lines that haven't been lexed since they changed. It doesn't
+# equal any lexer state.
+UNKNOWN = object()
 
-    def _highlight_body(self, unit):
-        """Highlight all the items in the body of UNIT."""
-        
-        for i in unit.body:
+class Highlighter:
+    """Incremental syntax highlighting of TEXT with LEXER, a lexers.Lexer.
 
-            # Set the text indexes for this body
-            start_index = "%s.%s" % (i.lineno, i.col_offset)
-            end_index = "%s.%s" % (i.end_lineno, i.end_col_offset)
+    The lexer state at the start of every line is cached. After an edit, lexing
+    restarts at the first edited line and stops as soon as a line after the
+    edits starts in the same state as before, so typing only relexes a line or
+    two. Big changes are highlighted in time-limited chunks in the
+    background."""
 
-            # Check if the unit has a "body" attribute, and if so, call this
-            # method with that body
-            if "body" in i.__dict__:
-                self._highlight_body(i)
-            # Otherwise, highlight the unit
+    def __init__(self, text, lexer):
+        self.text = text
+        self.lexer = lexer
+
+        # The shared theme, with all it's tags configured in one call
+        self.theme = themes.get()
+        self.theme.configure(self.text)
+        themes.subscribe(self)
+
+        # The lexer state at the start of each line, the first line that needs
+        # lexing or None, and the last line changed by the edits since then
+        self.states = []
+        self.dirty_from = None
+        self.changed_until = 0
+        self._after = None
+        self._reset()
+
+        self.text.add_edit_listener(self._on_edits)
+
+    def _apply(self, first, last, ranges):
+        """Replace the color tags of the lines FIRST to LAST with RANGES, a
+        dictionary of each color's list of indexes, in a single Tcl call."""
+        flat = []
+        for color, indexes in ranges.items():
+            flat.extend((color, tuple(indexes)))
+        self.text.tk.call(
+            "::tkeditor::highlight",
+            self.text._w,
+            "%s.0" % first,
+            "%s.end" % last,
+            tuple(self.theme.colors),
+            tuple(flat)
+        )
+
+    def _continue(self):
+        self._after = None
+        try:
+            self._run(settings.get()["performance"]["highlight_background_budget"])
+        except tkinter.TclError:
+            # The text was destroyed
+            pass
+
+    def _get_line_count(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _on_edits(self, edits):
+        """Update the cached states for EDITS, and mark their lines dirty."""
+        for edit in edits:
+            line = edit.line
+            del self.states[line:line + edit.lines_removed]
+            self.states[line:line] = [UNKNOWN] * edit.lines_added
+
+            if self.dirty_from is None or line < self.dirty_from:
+                self.dirty_from = line
+            end = line + edit.lines_added
+            if self.changed_until >= line:
+                self.changed_until = max(
+                    self.changed_until + edit.lines_added - edit.lines_removed,
+                    end
+                )
             else:
-                print((i.lineno, i.col_offset), (i.end_lineno, i.end_col_offset))
+                self.changed_until = end
+
+    def _reset(self):
+        """Forget all the cached states and relex everything."""
+        self.states = [self.lexer.initial_state] + [UNKNOWN] * (self._get_line_count() - 1)
+        self.dirty_from = 1
+        self.changed_until = len(self.states)
+
+    def _run(self, budget):
+        """Lex and tag the dirty lines for about BUDGET seconds, in chunks of
+        the highlight_chunk_lines setting, scheduling the rest for later."""
+        if self.dirty_from is None:
+            return
+
+        # Start over if the states got out of step with the text
+        last = self._get_line_count()
+        if len(self.states) != last:
+            self._reset()
+
+        deadline = time.perf_counter() + budget
+        chunk_lines = settings.get()["performance"]["highlight_chunk_lines"]
+        token_colors = self.theme.token_colors
+        keyword_colors = self.theme.keyword_colors
+        limit = self.text.highlight_column_limit
+        tokenize = self.lexer.tokenize
+        listeners = self.text.highlight_listeners
+        line = min(self.dirty_from, last)
+        state = self.states[line - 1]
+
+        while line <= last:
+            chunk_end = min(line + chunk_lines - 1, last)
+            lines = self.text.get("%s.0" % line, "%s.end" % chunk_end).split("\n")
+            ranges = {}
+            converged = False
+
+            # The color covering most of each line, only worked out if
+            # anything listens for it
+            line_colors = []
+            weights = None
+
+            number = line
+            for content in lines:
+                if limit is not None:
+                    content = content[:limit]
+                tokens, state = tokenize(content, state)
+                if listeners:
+                    weights = {}
+                for start, end, kind in tokens:
+                    if kind == "keyword":
+                        color = keyword_colors.get(content[start:end], token_colors.get(kind))
+                    else:
+                        color = token_colors.get(kind)
+                    if color is not None:
+                        ranges.setdefault(color, []).extend(
+                            ("%s.%s" % (number, start), "%s.%s" % (number, end))
+                        )
+                        if weights is not None:
+                            weights[color] = weights.get(color, 0) + end - start
+                if weights is not None:
+                    line_colors.append(max(weights, key=weights.get) if weights else None)
+
+                # Stop once a line after the edits starts in the same state
+                # as it did before them
+                if number < last:
+                    old = self.states[number]
+                    self.states[number] = state
+                    if number >= self.changed_until and old == state:
+                        converged = True
+                        break
+                number += 1
+
+            self._apply(line, min(number, chunk_end), ranges)
+            for func in listeners:
+                func(line, line_colors)
+            if converged or min(number, chunk_end) == last:
+                self.dirty_from = None
+                self.changed_until = 0
+                return
+            line = chunk_end + 1
+
+            # Do the rest later, so that the text stays responsive. The lines
+            # from here on still have the states of before, so lexing can't
+            # stop before reaching them.
+            if time.perf_counter() > deadline:
+                self.dirty_from = line
+                self.changed_until = max(self.changed_until, line)
+                if self._after is None:
+                    self._after = self.text.after(1, self._continue)
+                return
+        self.dirty_from = None
+        self.changed_until = 0
+
+    def set_theme(self, theme, old=None):
+        """Use THEME instead of the OLD theme, and rehighlight everything."""
+        self.theme = theme
+        theme.configure(self.text, old)
+        self._reset()
+        self.update()
+
+    def stop(self):
+        """Stop highlighting, and remove all the color tags."""
+        themes.unsubscribe(self)
+        if self._after is not None:
+            self.text.after_cancel(self._after)
+            self._after = None
+        self.text.edit_listeners.remove(self._on_edits)
+        for color in self.theme.colors:
+            self.text.tag_remove(color, 1.0, END)
+        for func in self.text.highlight_listeners:
+            func(1, [None] * self._get_line_count())
 
     def update(self):
-        """Update the highlighting."""
-        
-        # Get the list of grammar syntax
-        # module = ast.parse(self.text.get_all())
-
-        # Highlight the syntax
-        # self._highlight_body(module)
\ No newline at end of file
+        """Highlight the lines changed since the last update. Only the first
+        text.highlight_column_limit columns of each line are highlighted, if
+        it is set."""
+        if self._after is not None:
+            self.text.after_cancel(self._after)
+            self._after = None
+        self._run(settings.get()["performance"]["highlight_budget"])
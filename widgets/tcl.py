@@ -0,0 +1,269 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Tcl procedures that let the widgets do many operations in a single call from
+Python, instead of one Python->Tcl round-trip per operation."""
+
+SCRIPT = r"""
+namespace eval ::tkeditor {
+    # The Python callback of each proxied text widget
+    variable callbacks
+    array set callbacks {}
+}
+
+# Do the insert, delete or replace command ARGS with the real text widget
+# command ORIG, and return a {start deleted inserted} list describing the
+# change, or an empty list if nothing changed.
+proc ::tkeditor::edit {orig args} {
+    set op [lindex $args 0]
+    set start [$orig index [lindex $args 1]]
+    set deleted ""
+    set inserted ""
+
+    if {$op eq "insert"} {
+        set chars [lrange $args 2 end]
+    } else {
+        # Only the first range of a delete with several ranges is supported,
+        # which is all that Tk's bindings and TKEditor use
+        if {[llength $args] > 2} {
+            set stop [$orig index [lindex $args 2]]
+        } else {
+            set stop [$orig index "$start +1c"]
+        }
+        set chars [lrange $args 3 end]
+
+        # The final newline can't be deleted, so Tk deletes the newline before
+        # the range instead when a range of whole lines reaches the end
+        if {[$orig compare $stop == end]} {
+            set stop [$orig index end-1c]
+            if {[lindex [split $start .] 1] == 0 && [$orig compare $start != 1.0]} {
+                set start [$orig index "$start -1c"]
+            }
+        }
+        if {[$orig compare $start < $stop]} {
+            set deleted [$orig get $start $stop]
+            $orig delete $start $stop
+        }
+    }
+
+    # Text inserted at the end goes before the final newline
+    if {[$orig compare $start == end]} {
+        set start [$orig index end-1c]
+    }
+    if {[llength $chars] > 0} {
+        foreach {text tags} $chars {
+            append inserted $text
+        }
+        $orig insert $start {*}$chars
+    }
+
+    if {$deleted eq "" && $inserted eq ""} {
+        return {}
+    }
+    return [list $start $deleted $inserted]
+}
+
+# The command that replaces a proxied text widget's own command. Edits are
+# done with ::tkeditor::edit and reported to CALLBACK, and so are the undo
+# commands, since the undo history is kept in Python.
+proc ::tkeditor::proxy {orig callback args} {
+    switch -- [lindex $args 0] {
+        insert - delete - replace {
+            set record [::tkeditor::edit $orig {*}$args]
+            if {$record ne ""} {
+                $callback edits {*}$record
+            }
+            return ""
+        }
+        edit {
+            switch -- [lindex $args 1] {
+                undo - redo - separator - reset - canundo - canredo {
+                    return [$callback {*}$args]
+                }
+            }
+        }
+    }
+    return [$orig {*}$args]
+}
+
+# Replace the command of the text widget W with the proxy, reporting it's
+# edits to CALLBACK.
+proc ::tkeditor::install_proxy {w callback} {
+    variable callbacks
+    rename $w ${w}_orig
+    set callbacks($w) $callback
+    interp alias {} $w {} ::tkeditor::proxy ${w}_orig $callback
+}
+
+# Give the text widget W it's own command back.
+proc ::tkeditor::remove_proxy {w} {
+    variable callbacks
+    if {[info exists callbacks($w)]} {
+        unset callbacks($w)
+        interp alias {} $w {}
+        rename ${w}_orig $w
+    }
+}
+
+# Apply the flat list of {start end chars} EDITS to the proxied text widget W
+# and report them to it's callback together, as one undo step. An empty END
+# inserts CHARS at START, and empty CHARS deletes from START to END.
+proc ::tkeditor::apply_edits {w edits} {
+    variable callbacks
+    set records {}
+    foreach {start end chars} $edits {
+        if {$end eq ""} {
+            set record [::tkeditor::edit ${w}_orig insert $start $chars]
+        } elseif {$chars eq ""} {
+            set record [::tkeditor::edit ${w}_orig delete $start $end]
+        } else {
+            set record [::tkeditor::edit ${w}_orig replace $start $end $chars]
+        }
+        lappend records {*}$record
+    }
+    if {[llength $records] > 0} {
+        $callbacks($w) group {*}$records
+    }
+}
+
+# Show the cursors in the flat list of {anchor cursor} mark names CURSORS of
+# the text widget W with the tkeditor_cursor and tkeditor_selection tags, and
+# put the insert mark at the last one. Cursors at the same place as an earlier
+# one are removed, and the list of the remaining ones is returned.
+proc ::tkeditor::show_cursors {w cursors} {
+    $w tag remove tkeditor_cursor 1.0 end
+    $w tag remove tkeditor_selection 1.0 end
+    set kept {}
+    array set seen {}
+    foreach {anchor cursor} $cursors {
+        set index [$w index $cursor]
+        if {[info exists seen($index)]} {
+            $w mark unset $anchor $cursor
+            continue
+        }
+        set seen($index) 1
+        lappend kept $anchor $cursor
+        $w tag add tkeditor_cursor $cursor
+        if {[$w compare $anchor < $cursor]} {
+            $w tag add tkeditor_selection $anchor $cursor
+        } elseif {[$w compare $cursor < $anchor]} {
+            $w tag add tkeditor_selection $cursor $anchor
+        }
+    }
+    if {[llength $kept] > 0} {
+        $w mark set insert [lindex $kept end]
+    }
+    return $kept
+}
+
+# Replace the marks of the cursors of the text widget W with new ones at the
+# {anchor cursor} indexes in the flat list POSITIONS, numbered from FIRST, and
+# show them. Return the list of their mark names.
+proc ::tkeditor::set_cursors {w positions first} {
+    foreach mark [$w mark names] {
+        if {[string match tkeditor_anchor* $mark] || [string match tkeditor_cursor* $mark]} {
+            $w mark unset $mark
+        }
+    }
+    set cursors {}
+    set i $first
+    foreach {anchor cursor} $positions {
+        $w mark set tkeditor_anchor$i $anchor
+        $w mark set tkeditor_cursor$i $cursor
+        lappend cursors tkeditor_anchor$i tkeditor_cursor$i
+        incr i
+    }
+    return [::tkeditor::show_cursors $w $cursors]
+}
+
+# At each of the cursors in the flat list of {anchor cursor} mark names CURSORS
+# of the proxied text widget W, replace the selection with CHARS. If CHARS is
+# empty and there is no selection, delete from the cursor to "cursor OFFSET"
+# instead. All the edits are reported to the widget's callback together, as
+# one undo step, and the list of the remaining cursors is returned.
+proc ::tkeditor::multi_edit {w cursors chars offset} {
+    variable callbacks
+    set orig ${w}_orig
+    set records {}
+    foreach {anchor cursor} $cursors {
+        if {[$orig compare $anchor < $cursor]} {
+            set start [$orig index $anchor]
+            set stop [$orig index $cursor]
+        } else {
+            set start [$orig index $cursor]
+            set stop [$orig index $anchor]
+        }
+        if {$chars eq "" && [$orig compare $start == $stop]} {
+            set other [$orig index "$cursor $offset"]
+            if {[$orig compare $other < $start]} {
+                set start $other
+            } else {
+                set stop $other
+            }
+        }
+        if {[$orig compare $start < $stop]} {
+            lappend records {*}[::tkeditor::edit $orig delete $start $stop]
+        }
+        if {$chars ne ""} {
+            lappend records {*}[::tkeditor::edit $orig insert $cursor $chars]
+        }
+        $orig mark set $anchor $cursor
+    }
+    if {[llength $records] > 0} {
+        $callbacks($w) group {*}$records
+    }
+    return [::tkeditor::show_cursors $orig $cursors]
+}
+
+# Move each of the cursors in the flat list of {anchor cursor} mark names
+# CURSORS of the text widget W to "cursor OFFSET", dropping their selections,
+# and return the list of the remaining cursors.
+proc ::tkeditor::multi_move {w cursors offset} {
+    foreach {anchor cursor} $cursors {
+        $w mark set $cursor [$w index "$cursor $offset"]
+        $w mark set $anchor $cursor
+    }
+    return [::tkeditor::show_cursors $w $cursors]
+}
+
+# Remove the TAGS of the text widget W from START to END, and add the tags in
+# the flat list of {tag indexes} RANGES.
+proc ::tkeditor::highlight {w start end tags ranges} {
+    foreach tag $tags {
+        $w tag remove $tag $start $end
+    }
+    foreach {tag indexes} $ranges {
+        $w tag add $tag {*}$indexes
+    }
+}
+
+# Configure the tags of the text widget W from the flat list of {tag options}
+# TAGS.
+proc ::tkeditor::configure_tags {w tags} {
+    foreach {tag options} $tags {
+        $w tag configure $tag {*}$options
+    }
+}
+"""
+
+def install(widget):
+    """Define our procedures in WIDGET's Tcl interpreter, if they aren't yet."""
+    if widget.tk.call("info", "commands", "::tkeditor::install_proxy") == "":
+        widget.tk.eval(SCRIPT)
@@ -0,0 +1,91 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""The highlighting theme, compiled once from highlighting.json and shared by
+all the text widgets."""
+
+import weakref
+
+import config
+
+class Theme:
+    """The compiled form of the highlighting configuration HIGHLIGHTING."""
+
+    def __init__(self, highlighting):
+        self.colors = dict(highlighting["colors"])
+
+        # The color of each keyword
+        self.keyword_colors = dict(highlighting["keywords"])
+
+        # The color of each kind of token the lexers find
+        self.token_colors = dict(highlighting.get("tokens", {}))
+
+        # The {tag options} list of every color's tag, for configuring all the
+        # tags of a widget in a single Tcl call
+        self.tag_options = []
+        for color, foreground in self.colors.items():
+            self.tag_options.extend((color, ("-foreground", foreground)))
+        self.tag_options = tuple(self.tag_options)
+
+    def configure(self, widget, old=None):
+        """Configure the color tags of the text widget WIDGET, removing the
+        tags of the theme OLD that we don't have."""
+        widget.tk.call("::tkeditor::configure_tags", widget._w, self.tag_options)
+        if old is not None:
+            removed = [color for color in old.colors if color not in self.colors]
+            if removed != []:
+                widget.tag_delete(*removed)
+
+# The shared Theme, and the objects to tell when it changes
+_theme = None
+_subscribers = weakref.WeakSet()
+
+def get():
+    """Return the shared Theme, compiling it the first time."""
+    global _theme
+    if _theme is None:
+        _theme = Theme(config.get().highlighting)
+    return _theme
+
+def reload():
+    """Reload the theme from it's file and pass it to all the subscribers.
+    Return False and keep the old theme if the file is broken."""
+    global _theme
+    try:
+        config.get().reload_highlighting()
+        theme = Theme(config.get().highlighting)
+    except (OSError, ValueError, KeyError, config.ConfigError) as e:
+        print("Not reloading the highlighting theme: %s" % e)
+        return False
+
+    old = _theme
+    _theme = theme
+    for subscriber in list(_subscribers):
+        subscriber.set_theme(theme, old)
+    return True
+
+def subscribe(subscriber):
+    """Call SUBSCRIBER.set_theme(theme, old theme) whenever the theme is
+    reloaded. Only a weak reference to SUBSCRIBER is kept."""
+    _subscribers.add(subscriber)
+
+def unsubscribe(subscriber):
+    """Stop passing the reloaded theme to SUBSCRIBER."""
+    _subscribers.discard(subscriber)
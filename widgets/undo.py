@@ -0,0 +1,201 @@
+# TKEditor is a basic text editor
+# Copyright (C) 2021  Samuel Matzko
+
+# This file is part of TKEditor.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA
+# or see <http://www.gnu.org/licenses/>
+
+"""Edit records and the undo history of the Text widget."""
+
+import collections
+
+class Edit(collections.namedtuple("Edit", ("start", "deleted", "inserted"))):
+    """A single change of a text widget: DELETED was removed at the index
+    START, and INSERTED was put in it's place."""
+
+    __slots__ = ()
+
+    @property
+    def line(self):
+        """The number of the line the edit starts on."""
+        return int(self.start.split(".")[0])
+
+    @property
+    def column(self):
+        """The column the edit starts at."""
+        return int(self.start.split(".")[1])
+
+    @property
+    def lines_added(self):
+        """The number of lines the edit added."""
+        return self.inserted.count("\n")
+
+    @property
+    def lines_removed(self):
+        """The number of lines the edit removed."""
+        return self.deleted.count("\n")
+
+def _end_of(start, text):
+    """Return the index of the end of TEXT, if it were inserted at START."""
+    if text == "":
+        return None
+    return "%s+%sc" % (start, len(text))
+
+class UndoHistory:
+    """An undo history that stores edits as the text they removed and inserted
+    instead of copies of the whole text. Runs of typing or deleting are merged
+    into single steps, and the oldest steps are dropped when the history gets
+    bigger than LIMIT bytes. The newest step is always kept, even if it is
+    bigger than LIMIT on it's own, so that the last edit can be undone."""
+
+    # The estimated memory overhead of each edit, in bytes
+    EDIT_OVERHEAD = 120
+
+    def __init__(self, limit):
+        self.limit = limit
+
+        # The undo steps, oldest first, each being a list of edits in the order
+        # they were made, and the undone steps, most recently undone last
+        self.undo_stack = collections.deque()
+        self.redo_stack = collections.deque()
+
+        # The estimated size of all the steps, in bytes
+        self.size = 0
+
+        # Whether the next edit should start a new step
+        self._separated = True
+
+    def _get_edit_size(self, edit):
+        return len(edit.deleted) + len(edit.inserted) + self.EDIT_OVERHEAD
+
+    def _get_step_size(self, step):
+        return sum(self._get_edit_size(edit) for edit in step)
+
+    def _merge(self, previous, edit):
+        """Return a single edit doing both PREVIOUS and EDIT, or None if they
+        aren't part of the same run of typing or deleting."""
+
+        # Typing: single characters inserted one after another, stopping at
+        # the start of each new word and at newlines
+        if previous.deleted == "" and edit.deleted == "" and len(edit.inserted) == 1:
+            if edit.inserted == "\n" or "\n" in previous.inserted:
+                return None
+            if edit.inserted.isspace() != previous.inserted[-1].isspace() and not edit.inserted.isspace():
+                return None
+            if previous.line == edit.line and previous.column + len(previous.inserted) == edit.column:
+                return Edit(previous.start, "", previous.inserted + edit.inserted)
+
+        # Deleting: single characters removed with BackSpace or Delete
+        if previous.inserted == "" and edit.inserted == "" and len(edit.deleted) == 1:
+            if edit.deleted == "\n" or "\n" in previous.deleted:
+                return None
+            if previous.line == edit.line:
+                if edit.column + 1 == previous.column:
+                    return Edit(edit.start, edit.deleted + previous.deleted, "")
+                if edit.column == previous.column:
+                    return Edit(previous.start, previous.deleted + edit.deleted, "")
+        return None
+
+    def _trim(self):
+        """Drop the oldest steps until the history fits in it's limit."""
+        while self.size > self.limit and len(self.undo_stack) > 1:
+            self.size -= self._get_step_size(self.undo_stack.popleft())
+            self._separated = True
+        while self.size > self.limit and self.redo_stack:
+            self.size -= self._get_step_size(self.redo_stack.popleft())
+
+    def set_limit(self, limit):
+        """Change the most bytes the history may use to LIMIT, dropping the
+        oldest steps if it is now too big."""
+        self.limit = limit
+        self._trim()
+
+    def can_redo(self):
+        return len(self.redo_stack) != 0
+
+    def can_undo(self):
+        return len(self.undo_stack) != 0
+
+    def clear(self):
+        """Forget all the steps."""
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self._separated = True
+
+    def get_size(self):
+        """Return the estimated size of the history, in bytes."""
+        return self.size
+
+    def record(self, edits, group=False):
+        """Add EDITS to the history. If GROUP is True, they become a step of
+        their own, otherwise they may be merged with the previous edits."""
+
+        # New edits make the undone steps unreachable
+        for step in self.redo_stack:
+            self.size -= self._get_step_size(step)
+        self.redo_stack.clear()
+
+        if group:
+            self.undo_stack.append(list(edits))
+            self.size += self._get_step_size(edits)
+            self._separated = True
+        else:
+            for edit in edits:
+
+                # Merge the edit into the last one if it continues it
+                if not self._separated and self.undo_stack and len(self.undo_stack[-1]) == 1:
+                    step = self.undo_stack[-1]
+                    merged = self._merge(step[0], edit)
+                    if merged is not None:
+                        self.size += self._get_edit_size(merged) - self._get_edit_size(step[0])
+                        step[0] = merged
+                        continue
+
+                self.undo_stack.append([edit])
+                self.size += self._get_edit_size(edit)
+                self._separated = False
+        self._trim()
+
+    def redo(self):
+        """Return the list of (start, end, chars) edits redoing the last undone
+        step, or None if there is nothing to redo."""
+        if not self.redo_stack:
+            return None
+        step = self.redo_stack.pop()
+        self.undo_stack.append(step)
+        self._separated = True
+        return [
+            (edit.start, _end_of(edit.start, edit.deleted), edit.inserted)
+            for edit in step
+        ]
+
+    def separate(self):
+        """Make the next edit start a new step."""
+        self._separated = True
+
+    def undo(self):
+        """Return the list of (start, end, chars) edits undoing the last step,
+        or None if there is nothing to undo."""
+        if not self.undo_stack:
+            return None
+        step = self.undo_stack.pop()
+        self.redo_stack.append(step)
+        self._separated = True
+        return [
+            (edit.start, _end_of(edit.start, edit.inserted), edit.deleted)
+            for edit in reversed(step)
+        ]